@@ -0,0 +1,132 @@
+"""
+条件请求：强 ETag + If-None-Match，及按版本缓存的渲染结果
+
+任务列表、关键词结果只在任务状态变化或爬取完成时改变，存储为其维护版本号。
+ETag 由版本号与影响响应体的查询参数共同决定：
+客户端携带 If-None-Match 命中时直接返回 304，不读取、不序列化数据；
+未命中时优先复用同一 ETag 已渲染好的字节，轮询大量相同请求时只序列化一次。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+
+from app.api.responses import FastJSONResponse, dumps
+
+RENDER_CACHE_ENTRIES = int(os.getenv("RENDER_CACHE_ENTRIES", "256"))
+RENDER_CACHE_BYTES = int(os.getenv("RENDER_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+
+def make_etag(*parts) -> str:
+    """
+    由版本号与请求参数生成强 ETag（带引号）
+    """
+    digest = hashlib.sha1("\x1f".join("" if p is None else str(p) for p in parts).encode("utf-8"))
+    return f'"{digest.hexdigest()[:20]}"'
+
+
+def etag_matches(request: Request, etag: str, wildcard: bool = True) -> bool:
+    """
+    If-None-Match 是否命中：支持多个 ETag、``*`` 与 W/ 前缀（GET 使用弱比较）；
+    wildcard=False 时忽略 ``*``（``*`` 只在存在当前表示时命中，由调用方确认）
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            if wildcard:
+                return True
+            continue
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class RenderCache:
+    """
+    已渲染响应体的 LRU 缓存，以 ETag 为键；同时限制条数与总字节数
+    """
+
+    def __init__(self, max_entries: int = RENDER_CACHE_ENTRIES, max_bytes: int = RENDER_CACHE_BYTES) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def get(self, etag: str) -> Optional[bytes]:
+        body = self._items.get(etag)
+        if body is None:
+            self.stats["misses"] += 1
+            return None
+        self._items.move_to_end(etag)
+        self.stats["hits"] += 1
+        return body
+
+    def put(self, etag: str, body: bytes) -> None:
+        if self.max_entries <= 0 or len(body) > self.max_bytes:
+            return
+        old = self._items.pop(etag, None)
+        if old is not None:
+            self._size -= len(old)
+        self._items[etag] = body
+        self._size += len(body)
+        while len(self._items) > self.max_entries or self._size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self._size -= len(evicted)
+
+
+_cache = RenderCache()
+
+
+def get_render_cache() -> RenderCache:
+    return _cache
+
+
+async def conditional_response(
+    request: Request,
+    etag: str,
+    render: Callable[[], Awaitable[dict]],
+    cache: Optional[RenderCache] = None,
+) -> Response:
+    """
+    条件响应：命中 If-None-Match 返回 304；否则返回缓存或新渲染的 JSON，并附带 ETag
+
+    Args:
+        request: 当前请求
+        etag: 当前版本对应的 ETag（调用方须在读取数据之前取版本号）
+        render: 生成响应内容的协程函数，仅在缓存未命中时调用；可抛出 HTTPException
+        cache: 渲染缓存，默认使用进程内共享实例
+    """
+    cache = cache or _cache
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag, wildcard=False):
+        cache.stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    body = cache.get(etag)
+    if body is None:
+        # 没有当前表示时 render 抛出 404，If-None-Match: * 不会命中（RFC 9110 13.1.2）
+        body = dumps(await render())
+        cache.put(etag, body)
+    if etag_matches(request, etag):
+        cache.stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=FastJSONResponse.media_type, headers=headers)
+
+
+__all__ = [
+    "RenderCache",
+    "conditional_response",
+    "etag_matches",
+    "get_render_cache",
+    "make_etag",
+]
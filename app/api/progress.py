@@ -0,0 +1,146 @@
+"""
+WebSocket 任务进度推送
+
+推送任务状态变化（pending → running → success/failed，failed 附带 error）与执行中任务的计数
+（已抓页数、已接收笔记数、已抓评论数），替代轮询 /api/crawl/keywords。
+
+- 扇出：每个连接一个合并订阅，发布方只做字典写入，连接数多时不拖慢爬虫
+- 慢消费者：未送出的进度按任务合并为最新一条；积压超过上限时丢弃最旧条目，并对比存储重新同步状态
+- 多进程：任务在其他进程执行时本进程收不到事件，空闲时按存储版本号检测变化并补发状态
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+from loguru import logger
+
+from app.api.responses import dumps
+from app.task.async_scheduler import TaskScheduler
+from app.task.events import TERMINAL_STATUSES
+
+WS_POLL_INTERVAL = float(os.getenv("WS_POLL_INTERVAL", "5"))
+
+
+_STATUS_RANK = {"pending": 0, "running": 1, "success": 2, "failed": 2}
+
+
+def _advances(sent: Optional[str], status: str) -> bool:
+    """
+    状态只前进：对账结果可能先于队列中的旧事件送出，旧事件不应让客户端看到状态倒退；
+    已结束的任务重新入队（重爬）时允许回到 pending
+    """
+    if sent is None:
+        return True
+    if sent in TERMINAL_STATUSES and status == "pending":
+        return True
+    return _STATUS_RANK.get(status, 0) > _STATUS_RANK.get(sent, 0)
+
+
+def _status_event(task: dict) -> dict:
+    return {"event": "status", "keyword": task["keyword"], "status": task["status"], "error": task.get("error")}
+
+
+class ProgressChannel:
+    """
+    单个 WebSocket 连接的推送状态：记录已送出的各任务状态，用于去重和与存储对账
+    """
+
+    def __init__(self, websocket: WebSocket, scheduler: TaskScheduler, keyword: Optional[str]) -> None:
+        self.websocket = websocket
+        self.scheduler = scheduler
+        self.keyword = keyword
+        self.sent_status: Dict[str, str] = {}
+        self.version: Optional[str] = None
+
+    async def send(self, event: dict) -> None:
+        if event["event"] == "status":
+            if not _advances(self.sent_status.get(event["keyword"]), event["status"]):
+                return
+            self.sent_status[event["keyword"]] = event["status"]
+        await self.websocket.send_text(dumps(event).decode("utf-8"))
+
+    async def _load_tasks(self) -> List[dict]:
+        if self.keyword is None:
+            return await self.scheduler.list_tasks()
+        task = await self.scheduler.get_task(self.keyword)
+        return [task] if task is not None else []
+
+    async def sync(self, with_progress: bool = False) -> None:
+        """
+        与存储对账：补发状态发生变化的任务；版本号未变时不读取任务表
+        """
+        version = await self.scheduler.get_version(self.keyword)
+        if version == self.version:
+            return
+        # 先记版本再读数据：期间的变化会在下次对账时再次发现
+        self.version = version
+        for task in await self._load_tasks():
+            await self.send(_status_event(task))
+            if with_progress and task["status"] == "running":
+                progress = self.scheduler.events.progress(task["keyword"])
+                if progress is not None:
+                    await self.send(progress)
+
+    @property
+    def finished(self) -> bool:
+        return self.keyword is not None and self.sent_status.get(self.keyword) in TERMINAL_STATUSES
+
+
+async def _wait_disconnect(websocket: WebSocket) -> None:
+    # 客户端无需发送数据，这里只为及时感知断开
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+async def pump_progress(websocket: WebSocket, scheduler: TaskScheduler, keyword: Optional[str] = None) -> None:
+    """
+    向已接受的 WebSocket 连接推送进度，直到客户端断开；指定关键词时任务结束后关闭连接
+    """
+    hub = scheduler.events
+    # 先订阅再对账：对账期间发布的事件进入订阅队列，重复状态由 ProgressChannel 去重
+    sub = hub.subscribe(keyword, coalesce=True)
+    channel = ProgressChannel(websocket, scheduler, keyword)
+    disconnected = asyncio.create_task(_wait_disconnect(websocket))
+    try:
+        await channel.sync(with_progress=True)
+        if keyword is not None and keyword not in channel.sent_status:
+            await channel.send({"event": "error", "keyword": keyword, "error": "keyword not found"})
+            await websocket.close(code=1008)
+            return
+
+        dropped = 0
+        while not channel.finished:
+            getter = asyncio.create_task(sub.get())
+            done, _ = await asyncio.wait(
+                {getter, disconnected}, timeout=WS_POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                getter.cancel()
+                return
+            if getter not in done:
+                getter.cancel()
+                await channel.sync()
+                continue
+            await channel.send(getter.result())
+            if sub.dropped != dropped:
+                # 积压溢出丢弃过事件，按存储重新同步
+                dropped = sub.dropped
+                channel.version = None
+                await channel.sync(with_progress=True)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as exc:
+        logger.warning("progress websocket closed with error: {}", exc)
+    finally:
+        disconnected.cancel()
+        hub.unsubscribe(sub)
+
+
+__all__ = ["ProgressChannel", "pump_progress"]
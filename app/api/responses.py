@@ -0,0 +1,53 @@
+"""
+高速 JSON 响应
+
+接口返回的笔记列表体积大，默认路径（Pydantic 校验 + jsonable_encoder 逐层转换 + 标准库 json）
+开销明显；这里直接用 orjson 序列化 dict/list/datetime，未安装 orjson 时回退到标准库 json。
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """序列化为 UTF-8 JSON 字节"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    orjson 序列化的 JSON 响应；路由直接返回该对象时 FastAPI 不再做 response_model 校验
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def ok(data: Optional[dict] = None, msg: str = "success", **kwargs) -> FastJSONResponse:
+    """
+    构造成功响应（结构同 ResponseModel），跳过 Pydantic 校验直接序列化
+    """
+    return FastJSONResponse({"code": 200, "msg": msg, "data": data}, **kwargs)
+
+
+__all__ = ["FastJSONResponse", "dumps", "ok"]
@@ -2,55 +2,250 @@
 FastAPI 路由定义
 """
 
+import asyncio
+import os
+import time
+from datetime import datetime
 from typing import List, Optional
-
-from fastapi import APIRouter, Depends, HTTPException, Query
-from pydantic import BaseModel, Field
-
+from urllib.parse import quote
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.api.conditional import conditional_response, make_etag
+from app.api.progress import pump_progress
+from app.api.responses import FastJSONResponse, ok
+from app.api.streaming import MEDIA_TYPES, stream_task_events
+from app.schemas import (
+    ApiResponse,
+    CommentPageData,
+    CrawlTaskRequest,
+    NotePageData,
+    ResponseModel,
+    ResultPageData,
+    TaskCreatedData,
+    TaskListData,
+)
+from app.services.admission import AdmissionController, get_admission_controller
+from app.services.results import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, query_notes
+from app.storage import get_storage
+from app.storage.local import get_local_storage
 from app.task.async_scheduler import TaskScheduler, get_scheduler
 
-
-class CrawlTaskRequest(BaseModel):
-    keywords: List[str] = Field(..., description="关键词列表", min_length=1)
-    note_limit: int = Field(50, gt=0, le=200, description="每个关键词抓取数量")
+router = APIRouter(prefix="/api")
 
 
-class ResponseModel(BaseModel):
-    code: int = 200
-    msg: str = "success"
-    data: Optional[dict] = None
+def _too_many_requests(msg: str, retry_after: int, status: dict) -> FastJSONResponse:
+    return FastJSONResponse(
+        status_code=429,
+        content={"code": 429, "msg": msg, "data": {**status, "retry_after": retry_after}},
+        headers={"Retry-After": str(retry_after)},
+    )
 
 
-router = APIRouter(prefix="/api")
+async def _new_keywords(scheduler: TaskScheduler, keywords: List[str]) -> List[str]:
+    """
+    不在队列中（pending/running）的关键词：只有它们占用队列容量与客户端入队配额
+    """
+    keywords = list(dict.fromkeys(keywords))
+    tasks = await asyncio.gather(*(scheduler.get_task(kw) for kw in keywords))
+    return [kw for kw, task in zip(keywords, tasks) if task is None or task["status"] not in {"pending", "running"}]
 
 
-@router.post("/crawl/task", response_model=ResponseModel)
+@router.post("/crawl/task", response_model=ApiResponse[TaskCreatedData], responses={429: {"model": ResponseModel}})
 async def create_crawl_task(
     payload: CrawlTaskRequest,
+    request: Request,
     scheduler: TaskScheduler = Depends(get_scheduler),
+    admission: AdmissionController = Depends(get_admission_controller),
 ):
+    new = await _new_keywords(scheduler, payload.keywords)
+    status = await admission.queue_status(scheduler)
+    retry_after = admission.retry_after_for_queue(status, len(new))
+    if retry_after is not None:
+        return _too_many_requests("task queue is full", retry_after, status)
+    client = admission.client_id(request.client.host if request.client else None, request.headers)
+    retry_after = admission.check_client_rate(client, len(new))
+    if retry_after is not None:
+        return _too_many_requests("enqueue rate limit exceeded", retry_after, status)
+
     created, skipped = await scheduler.enqueue_keywords(payload.keywords, payload.note_limit)
-    return ResponseModel(
-        data={
+    # 检查与入队之间被其他请求抢先入队的关键词退还令牌
+    admission.refund(client, len(new) - len(created))
+    status = await admission.queue_status(scheduler)
+    return ok(
+        {
             "created": created,
             "skipped": skipped,
+            "queue_depth": status["queue_depth"],
+            "eta_seconds": status["eta_seconds"],
         }
     )
 
 
-@router.get("/crawl/keywords", response_model=ResponseModel)
-async def list_keywords(scheduler: TaskScheduler = Depends(get_scheduler)):
-    tasks = await scheduler.list_tasks()
-    return ResponseModel(data={"tasks": tasks})
+@router.get("/crawl/keywords", response_model=ApiResponse[TaskListData])
+async def list_keywords(request: Request, scheduler: TaskScheduler = Depends(get_scheduler)):
+    """
+    任务列表；支持 If-None-Match，列表未变化时返回 304
+    """
+    # 先取版本再取数据：数据若在两者之间变化，只会让缓存内容比 ETag 更新，不会返回旧数据
+    etag = make_etag("keywords", await scheduler.get_version())
+
+    async def render() -> dict:
+        return {"code": 200, "msg": "success", "data": {"tasks": await scheduler.list_tasks()}}
 
+    return await conditional_response(request, etag, render)
 
-@router.get("/crawl/result", response_model=ResponseModel)
+
+@router.get("/crawl/result", response_model=ApiResponse[ResultPageData])
 async def get_result(
+    request: Request,
     keyword: str = Query(..., description="关键词"),
+    cursor: Optional[str] = Query(None, description="分页游标，取上一页返回的 next_cursor"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=0, le=MAX_PAGE_SIZE, description="每页条数，0 返回全部笔记（兼容旧客户端）"),
+    fields: Optional[str] = Query(None, description="字段投影，如 title,liked 或 -comments,-images"),
+    sort: Optional[str] = Query(None, description="排序字段，- 前缀降序，如 -liked、publish_time"),
     scheduler: TaskScheduler = Depends(get_scheduler),
 ):
-    result = await scheduler.get_result(keyword)
-    if result is None:
+    """
+    关键词结果分页；支持 If-None-Match，任务未变化时返回 304
+    """
+    etag = make_etag("result", await scheduler.get_version(keyword), keyword, cursor, limit, fields, sort)
+
+    async def render() -> dict:
+        result = await scheduler.get_result(keyword)
+        if result is None:
+            raise HTTPException(status_code=404, detail="keyword not found")
+        orders = await scheduler.get_result_orders(keyword) if sort else None
+        try:
+            page = query_notes(result, cursor=cursor, limit=limit or None, fields=fields, sort=sort, orders=orders)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        # 结果页已是 dict，直接 orjson 序列化，跳过 response_model 的逐字段校验
+        return {"code": 200, "msg": "success", "data": {"keyword": keyword, **page}}
+
+    return await conditional_response(request, etag, render)
+
+
+@router.get("/crawl/stream")
+async def stream_result(
+    keyword: str = Query(..., description="关键词"),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$", description="推送格式：ndjson / sse"),
+    scheduler: TaskScheduler = Depends(get_scheduler),
+):
+    """
+    爬取过程中逐条推送笔记（及状态、进度事件），任务结束后关闭连接
+    """
+    if await scheduler.get_task(keyword) is None:
         raise HTTPException(status_code=404, detail="keyword not found")
-    return ResponseModel(data={"keyword": keyword, "notes": result})
+    return StreamingResponse(
+        stream_task_events(scheduler, keyword, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
+
+@router.get("/notes", response_model=ApiResponse[NotePageData])
+async def list_stored_notes(
+    keyword: Optional[str] = Query(None, description="关键词"),
+    author_id: Optional[str] = Query(None, description="作者ID"),
+    min_likes: Optional[int] = Query(None, ge=0, description="最小点赞数"),
+    start_time: Optional[datetime] = Query(None, description="发布时间下限（含）"),
+    end_time: Optional[datetime] = Query(None, description="发布时间上限（不含）"),
+    sort: str = Query("crawl_time", pattern="^(crawl_time|like_count|publish_time)$", description="降序排序字段"),
+    cursor: Optional[str] = Query(None, description="分页游标，取上一页返回的 next_cursor"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="每页条数"),
+):
+    """
+    查询已入库笔记（键集分页）
+    """
+    from app.services import notes as notes_service
+
+    try:
+        page = await notes_service.list_notes(
+            keyword=keyword,
+            author_id=author_id,
+            min_likes=min_likes,
+            start_time=start_time,
+            end_time=end_time,
+            sort=sort,
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except SQLAlchemyError as exc:
+        raise HTTPException(status_code=503, detail="database unavailable") from exc
+    return ok(page)
+
+
+@router.get("/notes/{note_id}/comments", response_model=ApiResponse[CommentPageData])
+async def list_stored_comments(
+    note_id: str,
+    sort: str = Query("like_count", pattern="^(like_count|id)$", description="降序排序字段，id 即抓取顺序"),
+    cursor: Optional[str] = Query(None, description="分页游标，取上一页返回的 next_cursor"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="每页条数"),
+):
+    """
+    查询笔记的已入库评论（键集分页）
+    """
+    from app.services import notes as notes_service
+
+    try:
+        page = await notes_service.list_comments(note_id, sort=sort, cursor=cursor, limit=limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except SQLAlchemyError as exc:
+        raise HTTPException(status_code=503, detail="database unavailable") from exc
+    if page is None:
+        raise HTTPException(status_code=404, detail="note not found")
+    return ok(page)
+
+
+@router.websocket("/crawl/ws")
+async def progress_ws(
+    websocket: WebSocket,
+    keyword: Optional[str] = Query(None, description="关键词，不传则推送全部任务"),
+    scheduler: TaskScheduler = Depends(get_scheduler),
+):
+    """
+    WebSocket 推送任务状态变化与进度计数；指定关键词时任务结束后服务端关闭连接
+    """
+    await websocket.accept()
+    await pump_progress(websocket, scheduler, keyword)
+
+
+@router.get("/storage/{object_name:path}", include_in_schema=False)
+async def serve_local_object(
+    object_name: str,
+    expires: int = Query(..., description="过期时间戳"),
+    signature: str = Query(..., description="HMAC 签名"),
+):
+    """
+    本地存储后端（STORAGE_BACKEND=local/writeback）的文件访问地址，由 get_file_url 生成；
+    配置 STORAGE_LOCAL_ACCEL_REDIRECT 时交给 nginx 直接发送文件；
+    写回缓存已淘汰的对象重定向到 MinIO 预签名 URL
+    """
+    storage = get_local_storage()
+    try:
+        path = storage.object_path(object_name)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if not storage.verify(object_name, expires, signature):
+        raise HTTPException(status_code=403, detail="invalid or expired signature")
+    if not await asyncio.to_thread(path.is_file):
+        if os.getenv("STORAGE_BACKEND", "minio").lower() == "writeback":
+            # 与媒体流水线共用同一写回缓存实例，不另建 MinIO 连接池
+            remote = get_storage().remote
+            url = await remote.get_file_url(object_name, max(1, expires - int(time.time())))
+            return RedirectResponse(url, status_code=307)
+        raise HTTPException(status_code=404, detail="object not found")
+    # 签名 URL 在有效期内内容不变，可放心缓存
+    headers = {"Cache-Control": f"private, max-age={max(0, expires - int(time.time()))}"}
+    accel = os.getenv("STORAGE_LOCAL_ACCEL_REDIRECT", "")
+    if accel:
+        relative = path.relative_to(storage.root).as_posix()
+        headers["X-Accel-Redirect"] = f"{accel.rstrip('/')}/{quote(relative)}"
+        return Response(headers=headers)
+    return FileResponse(path, headers=headers)
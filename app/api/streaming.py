@@ -0,0 +1,104 @@
+"""
+流式结果推送：NDJSON / Server-Sent Events
+
+爬虫每完成一条笔记即推送 note 事件，同时推送状态与进度事件；
+任务在订阅前已结束、或在其他进程执行（本进程收不到事件）时，从任务存储补发结果。
+"""
+
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Dict, Set
+
+from app.api.responses import dumps
+from app.task.async_scheduler import TaskScheduler
+from app.task.events import TERMINAL_STATUSES
+
+KEEPALIVE_INTERVAL = 15.0
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def encode_event(event: Dict[str, Any], fmt: str) -> str:
+    """
+    按格式编码单个事件：NDJSON 一行一个 JSON；SSE 使用 event/data 字段
+    """
+    data = dumps(event).decode("utf-8")
+    if fmt == "sse":
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+def encode_keepalive(fmt: str) -> str:
+    if fmt == "sse":
+        return ": keepalive\n\n"
+    return '{"event":"ping"}\n'
+
+
+async def stream_task_events(scheduler: TaskScheduler, keyword: str, fmt: str) -> AsyncIterator[str]:
+    """
+    生成关键词任务的事件流，任务结束（success/failed）后结束
+    """
+    hub = scheduler.events
+    # 先订阅再取快照：两者之间没有 await，事件不会遗漏或重复
+    sub = hub.subscribe(keyword)
+    try:
+        snapshot = hub.snapshot(keyword)
+        sent: Set[str] = set()
+
+        def note_event(note: Dict[str, Any]) -> str:
+            sent.add(note["note_id"])
+            return encode_event({"event": "note", "keyword": keyword, "note": note}, fmt)
+
+        task = await scheduler.get_task(keyword)
+        if task is None:
+            yield encode_event({"event": "error", "keyword": keyword, "error": "keyword not found"}, fmt)
+            return
+
+        if task["status"] not in TERMINAL_STATUSES:
+            yield encode_event({"event": "status", "keyword": keyword, "status": task["status"]}, fmt)
+            for note in snapshot:
+                yield note_event(note)
+            while True:
+                event = await sub.get(timeout=KEEPALIVE_INTERVAL)
+                if sub.lagged:
+                    yield encode_event(
+                        {
+                            "event": "error",
+                            "keyword": keyword,
+                            "error": "consumer lagged behind, fetch /api/crawl/result instead",
+                        },
+                        fmt,
+                    )
+                    return
+                if event is None:
+                    # 空闲：检查任务是否已在其他进程结束，否则发心跳
+                    task = await scheduler.get_task(keyword) or task
+                    if task["status"] in TERMINAL_STATUSES:
+                        break
+                    yield encode_keepalive(fmt)
+                    continue
+                if event["event"] == "note":
+                    if event["note"]["note_id"] not in sent:
+                        yield note_event(event["note"])
+                    continue
+                if event["event"] == "status" and event["status"] in TERMINAL_STATUSES:
+                    task = {**task, "status": event["status"], "error": event.get("error")}
+                    break
+                yield encode_event(event, fmt)
+
+        if task["status"] == "success":
+            for note in await scheduler.get_result(keyword) or []:
+                if note["note_id"] not in sent:
+                    yield note_event(note)
+        yield encode_event(
+            {"event": "status", "keyword": keyword, "status": task["status"], "error": task.get("error")},
+            fmt,
+        )
+    finally:
+        hub.unsubscribe(sub)
+
+
+__all__ = ["MEDIA_TYPES", "encode_event", "stream_task_events"]
@@ -3,6 +3,9 @@
 """
 
 from .xhs_spider import AsyncXhsCrawler
+from .coalesce import RequestCoalescer
+from .media import MediaPipeline
+from .downloader import ResumableDownloader
 from .utils import (
     build_headers,
     sanitize_text,
@@ -15,6 +18,9 @@ from .utils import (
 
 __all__ = [
     "AsyncXhsCrawler",
+    "RequestCoalescer",
+    "MediaPipeline",
+    "ResumableDownloader",
     "build_headers",
     "sanitize_text",
     "dedup_images",
@@ -0,0 +1,122 @@
+"""
+请求合并（singleflight）
+
+同一进程内多个任务并发请求同一 (接口, 参数) 时只发出一次真实请求，
+其余调用共享同一个 in-flight future；成功结果再短时缓存，覆盖“刚爬完又重新入队”的情况。
+共享请求跑在发起方的会话上：发起方结束或被取消导致其会话关闭、请求失败时，
+等待方改用自己的会话重新请求，不会被别人的会话拖累。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class RequestCoalescer:
+    """
+    请求合并器：in-flight 去重 + TTL 结果缓存
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 2048) -> None:
+        """
+        Args:
+            ttl: 成功结果缓存秒数，0 表示只合并并发请求、不缓存
+            max_entries: 结果缓存条目上限（LRU 淘汰）
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (共享请求, 发起方会话)
+        self._inflight: Dict[Hashable, Tuple[asyncio.Future, Any]] = {}
+        self._cache: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {"requests": 0, "executed": 0, "coalesced": 0, "cache_hits": 0, "reissued": 0}
+
+    @staticmethod
+    def make_key(url: str, params: Dict[str, Any], *extra: Hashable) -> Tuple:
+        return (url, tuple(sorted((k, str(v)) for k, v in params.items())), *extra)
+
+    @property
+    def duplicates_avoided(self) -> int:
+        """被合并或命中缓存、未发出真实请求的次数"""
+        return self.stats["coalesced"] + self.stats["cache_hits"]
+
+    def _get_cached(self, key: Hashable) -> Any:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return data
+
+    @staticmethod
+    def _orphaned(leader: Any, owner: Any) -> bool:
+        """发起方会话已关闭，而等待方自己的会话仍可用"""
+        return (
+            leader is not None
+            and leader is not owner
+            and getattr(leader, "closed", False)
+            and not getattr(owner, "closed", False)
+        )
+
+    def _on_done(self, key: Hashable, task: asyncio.Future) -> None:
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is task:
+            del self._inflight[key]
+        if self.ttl <= 0 or task.cancelled() or task.exception() is not None:
+            return
+        data = task.result()
+        if not data:  # 空结果代表请求失败，不缓存
+            return
+        self._cache[key] = (time.monotonic() + self.ttl, data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def run(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], owner: Optional[Any] = None) -> Any:
+        """
+        执行或合并请求。返回结果在调用方之间共享，调用方不应修改。
+
+        Args:
+            key: 请求键（make_key）
+            fetch: 发出真实请求的协程函数
+            owner: fetch 使用的会话（有 closed 属性），用于判断共享请求失败是否因发起方会话关闭
+        """
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        while True:
+            cached = self._get_cached(key)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+
+            entry = self._inflight.get(key)
+            if entry is None or entry[0].done() or entry[0].get_loop() is not loop:
+                break
+            task, leader = entry
+            self.stats["coalesced"] += 1
+            try:
+                # shield：某个等待方被取消不影响其他等待方
+                result = await asyncio.shield(task)
+            except Exception:  # pylint: disable=broad-except
+                if not self._orphaned(leader, owner):
+                    raise
+                result = None
+            if result or not self._orphaned(leader, owner):
+                return result
+            # 发起方会话已关闭导致失败：用自己的会话重新请求（可能与其他重新请求的等待方合并）
+            self.stats["coalesced"] -= 1
+            self.stats["reissued"] += 1
+
+        self.stats["executed"] += 1
+        task = asyncio.ensure_future(fetch())
+        self._inflight[key] = (task, owner)
+        task.add_done_callback(lambda t: self._on_done(key, t))
+        return await asyncio.shield(task)
+
+
+__all__ = ["RequestCoalescer"]
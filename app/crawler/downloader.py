@@ -0,0 +1,416 @@
+"""
+可续传的流式下载
+
+- 连接中断、读超时或响应体短于 Content-Length 时，带 Range（和 If-Range 校验器）从已收到的位置续传，
+  最多 MEDIA_RESUME_RETRIES 次；服务端不支持 Range（返回 200）时重新下载并丢弃已收到的前缀
+- 下载完成时校验总长度与 Content-Length（或 Content-Range 中的总长度）一致，不一致抛出 IncompleteDownload
+- 进程级在途字节上限（MEDIA_INFLIGHT_BYTES）：已从网络读出、尚未被下游（上传或落盘）取走的数据总量不超过上限，
+  需要整体留在内存的下载（如计算感知哈希）在整个下载期间占用其全部长度
+- 数据逐块交给下游：边下载边上传，或写入 .part 临时文件（fetch_to_file，进程重启后也能续传）；
+  .part 的校验器（ETag/Last-Modified）保存在旁边的 .part.meta 中，重启续传时作为 If-Range 发送，
+  内容已变化时服务端返回完整新内容，从头重新下载
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+from collections import deque
+from typing import AsyncIterator, Dict, Optional
+
+import aiohttp
+from loguru import logger
+
+CONTENT_RANGE_RE = re.compile(r"bytes\s+(?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+
+class IncompleteDownload(Exception):
+    """重试后仍未收到完整内容，或续传期间内容已变化"""
+
+
+class ByteBudget:
+    """
+    在途字节预算：超出上限的读取等待其他下载释放（先到先得）
+    """
+
+    def __init__(self, limit: Optional[int] = None) -> None:
+        """
+        Args:
+            limit: 字节上限，默认读取 MEDIA_INFLIGHT_BYTES（默认64MB）
+        """
+        self.limit = limit or int(os.getenv("MEDIA_INFLIGHT_BYTES", str(64 * 1024 * 1024)))
+        self.in_flight = 0
+        self._waiters: "deque[tuple[int, asyncio.Future]]" = deque()
+        self.stats = {"peak": 0, "waits": 0}
+
+    def report(self) -> Dict[str, int]:
+        return {"limit": self.limit, "in_flight": self.in_flight, **self.stats}
+
+    def _fits(self, size: int) -> bool:
+        # 单次请求超过上限时只要预算空闲即可通过，避免永远等待
+        return self.in_flight == 0 or self.in_flight + size <= self.limit
+
+    async def acquire(self, size: int) -> int:
+        """占用 size 字节，返回实际占用数（供 release 使用）"""
+        if self._waiters or not self._fits(size):
+            self.stats["waits"] += 1
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append((size, waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # 已分配到预算但被取消，归还
+                    self.release(size)
+                else:
+                    try:
+                        self._waiters.remove((size, waiter))
+                    except ValueError:
+                        pass
+                    self._wake()
+                raise
+        else:
+            self.in_flight += size
+        self.stats["peak"] = max(self.stats["peak"], self.in_flight)
+        return size
+
+    def release(self, size: int) -> None:
+        self.in_flight -= size
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            size, waiter = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if not self._fits(size):
+                break
+            self._waiters.popleft()
+            self.in_flight += size
+            waiter.set_result(None)
+
+
+class RemoteBody:
+    """
+    一次可续传的下载：length 为总长度（未知时为 None），chunks() 逐块产出数据
+    """
+
+    def __init__(
+        self,
+        downloader: "ResumableDownloader",
+        session: aiohttp.ClientSession,
+        url: str,
+        headers: Dict[str, str],
+        timeout: Optional[aiohttp.ClientTimeout],
+        offset: int = 0,
+        hold_limit: Optional[int] = None,
+        validator: Optional[str] = None,
+    ) -> None:
+        self.downloader = downloader
+        self.session = session
+        self.url = url
+        self.headers = headers
+        self.timeout = timeout
+        self.offset = offset
+        self.received = offset
+        self.hold_limit = hold_limit
+        self.length: Optional[int] = None
+        self.status = 0
+        self.resumes = 0
+        self._validator: Dict[str, str] = {"If-Range": validator} if validator else {}
+        self._resp: Optional[aiohttp.ClientResponse] = None
+        self._skip = 0
+        self._held = 0
+
+    # ---------- 请求 ----------
+
+    async def _request(self) -> None:
+        headers = dict(self.headers)
+        if self.received:
+            headers["Range"] = f"bytes={self.received}-"
+            if self._validator.get("If-Range"):
+                headers["If-Range"] = self._validator["If-Range"]
+        resp = await self.session.get(self.url, headers=headers, timeout=self.timeout)
+        try:
+            self._accept(resp)
+        except BaseException:
+            resp.release()
+            raise
+        self._resp = resp
+
+    def _accept(self, resp: aiohttp.ClientResponse) -> None:
+        """校验（续传）响应，确定总长度与需要丢弃的前缀"""
+        etag = resp.headers.get("ETag", "")
+        validator = etag if etag and not etag.startswith("W/") else resp.headers.get("Last-Modified", "")
+        if self._validator and validator and validator != self._validator.get("If-Range"):
+            if resp.status != 200 or self.status:
+                raise IncompleteDownload(f"content changed while resuming: {self.url}")
+            # 首个请求即发现已有部分已过期（If-Range 不匹配，服务端返回完整新内容）：从头下载
+            logger.debug("stale partial download discarded url={} offset={}", self.url, self.offset)
+            self.offset = self.received = 0
+            self._validator = {}
+        if resp.status == 416 and self.received:
+            # 已有的 .part 就是完整内容
+            match = CONTENT_RANGE_RE.match(resp.headers.get("Content-Range", ""))
+            if match and match.group(3) == str(self.received):
+                self.length = self.received
+                self.status = resp.status
+                return
+        resp.raise_for_status()
+        encoded = resp.headers.get("Content-Encoding", "identity") != "identity"
+        if resp.status == 206:
+            match = CONTENT_RANGE_RE.match(resp.headers.get("Content-Range", ""))
+            if match is None or match.group(1) is None or int(match.group(1)) != self.received:
+                raise IncompleteDownload(f"unexpected Content-Range {resp.headers.get('Content-Range')!r}: {self.url}")
+            total = None if match.group(3) == "*" else int(match.group(3))
+            self._skip = 0
+        else:
+            # 200：服务端忽略 Range，从头开始，已收到的部分丢弃
+            total = resp.content_length
+            self._skip = self.received
+            if self.received:
+                self.downloader.stats["restarted"] += 1
+        if self.length is None and not encoded:
+            self.length = total
+        if not self._validator:
+            self._validator = {"If-Range": validator}
+        self.status = resp.status
+
+    @property
+    def validator(self) -> Optional[str]:
+        """续传校验器（强 ETag，没有时为 Last-Modified），服务端未提供时为 None"""
+        return self._validator.get("If-Range") or None
+
+    # ---------- 数据 ----------
+
+    def _release_held(self) -> None:
+        if self._held:
+            self.downloader.budget.release(self._held)
+            self._held = 0
+
+    async def _read(self) -> bytes:
+        """读一块：未整体占用预算时按块占用，多余的立即归还"""
+        size = self.downloader.chunk_size
+        if self.hold_limit is None:
+            self._held = await self.downloader.budget.acquire(size)
+        chunk = await self._resp.content.read(size)
+        if self.hold_limit is None and len(chunk) < self._held:
+            self.downloader.budget.release(self._held - len(chunk))
+            self._held = len(chunk)
+        return chunk
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """产出剩余数据（offset 之后），中断时自动续传"""
+        if self.status == 416:
+            return
+        attempts = 0
+        resuming = False
+        while True:
+            try:
+                if resuming:
+                    await self._request()
+                while True:
+                    # 下游取下一块时上一块已交出，归还其预算
+                    if self.hold_limit is None:
+                        self._release_held()
+                    chunk = await self._read()
+                    if not chunk:
+                        break
+                    if self._skip:
+                        drop = min(self._skip, len(chunk))
+                        self._skip -= drop
+                        chunk = chunk[drop:]
+                        if not chunk:
+                            continue
+                    self.received += len(chunk)
+                    if self.length is not None and self.received > self.length:
+                        raise IncompleteDownload(f"body longer than Content-Length {self.length}: {self.url}")
+                    yield chunk
+                if self.length is None or self.received == self.length:
+                    return
+                raise aiohttp.ClientPayloadError(f"body ended at {self.received}/{self.length} bytes")
+            except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as exc:
+                if self.hold_limit is None:
+                    self._release_held()
+                if self._resp is not None:
+                    self._resp.release()
+                    self._resp = None
+                if attempts >= self.downloader.retries:
+                    self.downloader.stats["incomplete"] += 1
+                    raise IncompleteDownload(
+                        f"gave up after {attempts} resumes at {self.received}/{self.length} bytes: {exc!r}"
+                    ) from exc
+                attempts += 1
+                self.resumes += 1
+                self.downloader.stats["resumed"] += 1
+                logger.debug("resume download url={} from={} attempt={} err={!r}", self.url, self.received, attempts, exc)
+                await asyncio.sleep(min(0.5 * 2 ** (attempts - 1), 5.0))
+                resuming = True
+
+    async def __aenter__(self) -> "RemoteBody":
+        await self._request()
+        if self.hold_limit is not None:
+            try:
+                reserve = min(self.length or self.hold_limit, self.hold_limit)
+                self._held = await self.downloader.budget.acquire(reserve)
+            except BaseException:
+                self._resp.release()
+                raise
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._release_held()
+        if self._resp is not None:
+            self._resp.release()
+
+
+class ResumableDownloader:
+    """
+    可续传下载器，所有下载共享一个在途字节预算
+    """
+
+    def __init__(
+        self,
+        retries: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        budget: Optional[ByteBudget] = None,
+    ) -> None:
+        """
+        Args:
+            retries: 单个下载最多续传次数，默认读取 MEDIA_RESUME_RETRIES（默认3）
+            chunk_size: 每次读取的字节数，默认读取 MEDIA_CHUNK_SIZE（默认64KB）
+            budget: 在途字节预算，默认使用进程共享的 get_byte_budget()
+        """
+        self.retries = retries if retries is not None else int(os.getenv("MEDIA_RESUME_RETRIES", "3"))
+        self.chunk_size = chunk_size or int(os.getenv("MEDIA_CHUNK_SIZE", str(64 * 1024)))
+        self.budget = budget or get_byte_budget()
+        self.stats = {"resumed": 0, "restarted": 0, "incomplete": 0}
+
+    def report(self) -> Dict[str, object]:
+        return {**self.stats, "budget": self.budget.report()}
+
+    def open(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+        offset: int = 0,
+        hold_limit: Optional[int] = None,
+        validator: Optional[str] = None,
+    ) -> RemoteBody:
+        """
+        发起下载，配合 async with 使用
+
+        Args:
+            session: aiohttp 会话
+            url: 下载地址
+            headers: 请求头（Range/If-Range/Accept-Encoding 由下载器设置）
+            timeout: 单次请求超时，续传请求重新计时
+            offset: 从该字节开始下载（续传已有的部分文件）
+            hold_limit: 下游需要整体保留数据时传入单个下载的大小上限，
+                下载期间按 Content-Length（未知时为该上限）整体占用预算
+            validator: offset 处已有部分对应的 ETag/Last-Modified，随 Range 作为 If-Range 发送；
+                不匹配时服务端返回完整内容，offset 重置为 0（见 RemoteBody.offset）
+
+        Raises:
+            aiohttp.ClientResponseError: 响应状态码错误
+            IncompleteDownload: 续传响应与已下载内容不一致
+        """
+        # 压缩编码下 Content-Length 与 Range 都按编码后计算，统一要求原始内容
+        headers = {**(headers or {}), "Accept-Encoding": "identity"}
+        return RemoteBody(self, session, url, headers, timeout, offset, hold_limit, validator)
+
+    async def fetch_to_file(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+        max_bytes: Optional[int] = None,
+    ) -> int:
+        """
+        下载到本地文件：先写 path + ".part"，完整后原子重命名；已有 .part 时从其末尾续传，
+        并以 .part.meta 中保存的校验器作为 If-Range，没有校验器的 .part 无法确认仍然有效，从头下载
+
+        Returns:
+            int: 文件大小
+
+        Raises:
+            IncompleteDownload: 重试后仍不完整
+            ValueError: 超过 max_bytes
+        """
+        part = f"{path}.part"
+        meta_path = f"{part}.meta"
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        meta = _read_meta(meta_path) if offset else None
+        if meta is None or meta.get("url") != url or not meta.get("validator"):
+            offset = 0
+        validator = meta["validator"] if offset else None
+        entered = False
+        try:
+            async with self.open(session, url, headers, timeout, offset=offset, validator=validator) as remote:
+                entered = True
+                if max_bytes is not None and remote.length is not None and remote.length > max_bytes:
+                    raise ValueError(f"too large: {remote.length} bytes")
+                # 写入数据前先保存校验器，进程在任意时刻中断都能带 If-Range 续传
+                if remote.offset == 0:
+                    await asyncio.to_thread(_write_meta, meta_path, {"url": url, "validator": remote.validator})
+                # 服务端忽略 Range 时 chunks() 会丢弃已有前缀，文件仍从 offset 处追加
+                with open(part, "r+b" if remote.offset else "wb") as f:
+                    f.seek(remote.offset)
+                    f.truncate()
+                    async for chunk in remote.chunks():
+                        if max_bytes is not None and remote.received > max_bytes:
+                            raise ValueError(f"too large: over {max_bytes} bytes")
+                        await asyncio.to_thread(f.write, chunk)
+                size = remote.received
+        except IncompleteDownload:
+            if not entered:
+                # 已有部分与服务端不一致，下次从头下载
+                _remove(part, meta_path)
+            raise
+        os.replace(part, path)
+        _remove(meta_path)
+        return size
+
+
+def _read_meta(meta_path: str) -> Optional[dict]:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta_path: str, meta: dict) -> None:
+    tmp = f"{meta_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+
+def _remove(*paths: str) -> None:
+    for p in paths:
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+
+
+_byte_budget: Optional[ByteBudget] = None
+
+
+def get_byte_budget() -> ByteBudget:
+    """进程内共享的在途字节预算"""
+    global _byte_budget
+    if _byte_budget is None:
+        _byte_budget = ByteBudget()
+    return _byte_budget
+
+
+__all__ = ["ByteBudget", "IncompleteDownload", "RemoteBody", "ResumableDownloader", "get_byte_budget"]
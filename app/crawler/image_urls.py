@@ -0,0 +1,153 @@
+"""
+图片 URL 归一化：同一张图片在不同 CDN 域名、尺寸后缀（!nd_dft_wlteh_webp_3）、
+查询参数（?imageView2/2/w/1080/format/webp）下的 URL 映射为同一个规范键，并给出质量分用于择优
+
+规则（按顺序匹配，第一条命中的生效）：
+- name: 规则名，作为规范键前缀
+- host: 域名正则
+- key: 对路径匹配的正则，命名组 key 为图片标识
+- quality: [[正则, 分数], ...]，对完整 URL 依次匹配，第一条命中的分数即质量分；
+  分数写 "width" 时取正则命名组 width 的数值（按请求宽度择优）
+- default_quality: 都不命中时的质量分（无尺寸后缀/参数通常是原图，分数最高）
+
+MEDIA_URL_RULES 指向 JSON 文件（规则列表）时，其中的规则优先于内置规则
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {
+        # sns-webpic-qc.xhscdn.com/<时间>/<签名>/<id>!nd_dft_wlteh_webp_3
+        # sns-img-qc.xhscdn.com/<id>?imageView2/2/w/1080/format/webp
+        # ci.xiaohongshu.com/spectrum/<id>!nd_prv_wgth_jpg_3
+        "name": "xhs",
+        "host": r"(^|\.)(xhscdn\.com|xiaohongshu\.com)$",
+        "key": r"/(?P<key>[0-9A-Za-z_-]{16,})(![^/]*)?$",
+        "quality": [
+            [r"/w/(?P<width>\d+)", "width"],
+            [r"!nd_dft_", 4000],
+            [r"!nd_whlt", 2000],
+            [r"!nd_prv_", 1000],
+            [r"![^/]+$", 500],
+        ],
+        "default_quality": 100000,
+    },
+]
+
+
+class ImageUrlCanonicalizer:
+    """
+    按规则计算图片 URL 的规范键与质量分
+    """
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None) -> None:
+        """
+        Args:
+            rules: 规则列表，默认为 MEDIA_URL_RULES 中的规则 + 内置规则
+
+        Raises:
+            ValueError: 规则格式错误
+        """
+        if rules is None:
+            rules = load_rules(os.getenv("MEDIA_URL_RULES", "")) + DEFAULT_RULES
+        self.rules = [self._compile(rule) for rule in rules]
+
+    @staticmethod
+    def _compile(rule: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return {
+                "name": rule["name"],
+                "host": re.compile(rule["host"], re.IGNORECASE),
+                "key": re.compile(rule["key"]),
+                "quality": [(re.compile(pattern), score) for pattern, score in rule.get("quality", [])],
+                "default_quality": int(rule.get("default_quality", 0)),
+            }
+        except (KeyError, TypeError, ValueError, re.error) as exc:
+            raise ValueError(f"invalid image url rule {rule!r}: {exc}") from exc
+
+    def _match(self, url: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        parts = urlsplit(url)
+        host = parts.hostname or ""
+        for rule in self.rules:
+            if not rule["host"].search(host):
+                continue
+            m = rule["key"].search(parts.path)
+            if m:
+                return rule, f"{rule['name']}:{m.group('key')}"
+        return None, None
+
+    def canonical_key(self, url: str) -> str:
+        """规范键；没有规则命中时返回 URL 本身（只做精确去重）"""
+        _, key = self._match(url)
+        return key or url
+
+    def quality(self, url: str) -> int:
+        """质量分，越大越好"""
+        rule, _ = self._match(url)
+        return self._quality(rule, url)
+
+    @staticmethod
+    def _quality(rule: Optional[Dict[str, Any]], url: str) -> int:
+        if rule is None:
+            return 0
+        for pattern, score in rule["quality"]:
+            m = pattern.search(url)
+            if m:
+                return int(m.group("width")) if score == "width" else int(score)
+        return rule["default_quality"]
+
+    def dedup(self, urls: List[str]) -> List[str]:
+        """按规范键去重，保持首次出现的顺序，每组保留质量分最高的 URL（同分取先出现的）"""
+        best: Dict[str, Tuple[int, str]] = {}
+        for url in urls:
+            if not url:
+                continue
+            rule, key = self._match(url)
+            key = key or url
+            score = self._quality(rule, url)
+            current = best.get(key)
+            if current is None or score > current[0]:
+                best[key] = (score, url)
+        return [url for _, url in best.values()]
+
+
+def load_rules(path: str) -> List[Dict[str, Any]]:
+    """读取 JSON 规则文件；未配置或读取失败返回空列表"""
+    if not path:
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            rules = json.load(f)
+    except (OSError, ValueError) as exc:
+        logger.warning("failed to load MEDIA_URL_RULES {}: {}", path, exc)
+        return []
+    if not isinstance(rules, list):
+        logger.warning("MEDIA_URL_RULES {} must contain a list of rules", path)
+        return []
+    return rules
+
+
+_canonicalizer: Optional[ImageUrlCanonicalizer] = None
+
+
+def get_canonicalizer() -> ImageUrlCanonicalizer:
+    """进程级规则实例（首次使用时按环境变量构建）"""
+    global _canonicalizer
+    if _canonicalizer is None:
+        _canonicalizer = ImageUrlCanonicalizer()
+    return _canonicalizer
+
+
+def canonical_image_key(url: str) -> str:
+    return get_canonicalizer().canonical_key(url)
+
+
+__all__ = ["ImageUrlCanonicalizer", "DEFAULT_RULES", "canonical_image_key", "get_canonicalizer", "load_rules"]
@@ -0,0 +1,197 @@
+"""
+图片变体生成：解码、缩放到配置的尺寸并重新编码（WebP/JPEG），在进程池中执行，不阻塞事件循环
+
+- 变体配置 MEDIA_VARIANTS="thumb:320,medium:1080"（名称:最长边像素），只缩小不放大
+- 编码格式 MEDIA_VARIANT_FORMAT（webp/jpeg）与质量 MEDIA_VARIANT_QUALITY
+- 进程数 MEDIA_PROCESS_WORKERS（默认 CPU 核数）
+- 近重复检测所需的感知哈希（dHash）也在同一进程池中计算
+- 依赖 Pillow（可选）；未安装时该阶段自动关闭
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - 可选依赖
+    Image = None
+    ImageOps = None
+
+VARIANT_TYPES = {"webp": ("WEBP", "image/webp", ".webp"), "jpeg": ("JPEG", "image/jpeg", ".jpg")}
+
+
+def parse_variants(spec: str) -> List[Tuple[str, int]]:
+    """
+    解析变体配置 "thumb:320,medium:1080" -> [("thumb", 320), ("medium", 1080)]
+
+    Raises:
+        ValueError: 配置格式错误
+    """
+    variants = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, size = part.partition(":")
+        if not name or not size.isdigit() or int(size) <= 0:
+            raise ValueError(f"invalid media variant: {part!r}")
+        variants.append((name.strip(), int(size)))
+    return variants
+
+
+def render_variants(
+    data: bytes, variants: List[Tuple[str, int]], fmt: str, quality: int
+) -> Tuple[List[Tuple[str, bytes]], float]:
+    """
+    （在子进程中执行）生成全部变体，返回 ([(名称, 编码后数据)], 耗时毫秒)
+    """
+    started = time.perf_counter()
+    pil_format = VARIANT_TYPES[fmt][0]
+    with Image.open(io.BytesIO(data)) as img:
+        # JPEG 按最大目标尺寸降采样解码，大图解码量成倍减少
+        largest = max(size for _, size in variants)
+        img.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        if pil_format == "JPEG":
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+        elif img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if img.has_transparency_data else "RGB")
+        outputs = []
+        for name, size in variants:
+            resized = img.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            buf = io.BytesIO()
+            if pil_format == "WEBP":
+                resized.save(buf, "WEBP", quality=quality, method=4)
+            else:
+                resized.save(buf, "JPEG", quality=quality, optimize=True, progressive=True)
+            outputs.append((name, buf.getvalue()))
+    return outputs, (time.perf_counter() - started) * 1000
+
+
+def dhash(data: bytes, size: int = 8) -> int:
+    """
+    （在子进程中执行）差值哈希：缩到 (size+1)×size 灰度图，比较水平相邻像素，得到 size×size 位整数
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("L", (size + 1, size))
+        img = ImageOps.exif_transpose(img).convert("L").resize((size + 1, size), Image.LANCZOS)
+        pixels = img.tobytes()
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+class ImageProcessor:
+    """
+    变体生成器：进程池在首次使用时创建
+    """
+
+    def __init__(
+        self,
+        variants: Optional[List[Tuple[str, int]]] = None,
+        fmt: Optional[str] = None,
+        quality: Optional[int] = None,
+        workers: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            variants: [(名称, 最长边)]，默认读取 MEDIA_VARIANTS；空列表表示只计算感知哈希
+            fmt: 编码格式 webp/jpeg，默认读取 MEDIA_VARIANT_FORMAT（默认 webp）
+            quality: 编码质量，默认读取 MEDIA_VARIANT_QUALITY（默认80）
+            workers: 进程数，默认读取 MEDIA_PROCESS_WORKERS（默认 CPU 核数）
+        """
+        self.variants = variants if variants is not None else parse_variants(os.getenv("MEDIA_VARIANTS", "thumb:320,medium:1080"))
+        self.fmt = (fmt or os.getenv("MEDIA_VARIANT_FORMAT", "webp")).lower()
+        if self.fmt not in VARIANT_TYPES:
+            raise ValueError(f"unsupported MEDIA_VARIANT_FORMAT: {self.fmt}")
+        self.quality = quality or int(os.getenv("MEDIA_VARIANT_QUALITY", "80"))
+        self.workers = workers or int(os.getenv("MEDIA_PROCESS_WORKERS", "0")) or os.cpu_count() or 1
+        self.content_type = VARIANT_TYPES[self.fmt][1]
+        self.extension = VARIANT_TYPES[self.fmt][2]
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.stats = {"images": 0, "failed": 0, "process_ms": 0.0, "bytes_in": 0, "bytes_out": 0}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def variant_name(self, object_name: str, variant: str) -> str:
+        """变体对象名：与原图同目录，notes/n1/0.jpg -> notes/n1/0_thumb.webp"""
+        stem, dot, ext = object_name.rpartition(".")
+        if not dot or "/" in ext:
+            stem = object_name
+        return f"{stem}_{variant}{self.extension}"
+
+    async def process(self, data: bytes) -> List[Tuple[str, bytes]]:
+        """
+        生成变体，返回 [(名称, 编码后数据)]
+
+        Raises:
+            Exception: 图片无法解码或编码
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            outputs, elapsed_ms = await loop.run_in_executor(
+                self._executor(), render_variants, data, self.variants, self.fmt, self.quality
+            )
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        self.stats["images"] += 1
+        self.stats["process_ms"] += elapsed_ms
+        self.stats["bytes_in"] += len(data)
+        self.stats["bytes_out"] += sum(len(out) for _, out in outputs)
+        logger.debug("image variants rendered in {:.1f}ms: {}", elapsed_ms, [(n, len(b)) for n, b in outputs])
+        return outputs
+
+    async def hash(self, data: bytes) -> int:
+        """
+        计算 64 位感知哈希（dHash）
+
+        Raises:
+            Exception: 图片无法解码
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor(), dhash, data)
+
+    def report(self) -> Dict[str, float]:
+        images = self.stats["images"]
+        return {
+            **self.stats,
+            "process_ms": round(self.stats["process_ms"], 1),
+            "avg_ms": round(self.stats["process_ms"] / images, 1) if images else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+def create_image_processor(hashing: bool = False) -> Optional[ImageProcessor]:
+    """
+    MEDIA_PROCESSING=true（生成变体）或 hashing=True（只计算感知哈希）且已安装 Pillow 时创建
+    """
+    processing = os.getenv("MEDIA_PROCESSING", "false").lower() == "true"
+    if not processing and not hashing:
+        return None
+    if Image is None:
+        logger.warning("Pillow is not installed, skipping image variants and near-duplicate detection")
+        return None
+    return ImageProcessor(variants=None if processing else [])
+
+
+__all__ = ["ImageProcessor", "create_image_processor", "dhash", "parse_variants", "render_variants"]
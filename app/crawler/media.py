@@ -0,0 +1,378 @@
+"""
+笔记媒体入库：下载笔记图片并上传到 MinIO，对象名回写到笔记
+
+- 下载并发由全局信号量限制（MEDIA_CONCURRENCY），与爬虫的接口请求并发互不占用
+- 单文件大小上限（MEDIA_MAX_BYTES）：Content-Length 超限直接放弃，分块读取超限立即中断
+- 内容类型以文件头魔数为准（CDN 返回的 Content-Type 不可靠），只接受图片
+- 边下载边上传（upload_stream），不写临时文件，单个图片的内存占用不超过一个上传分片；
+  下载中断时用 Range 续传并校验 Content-Length，进程内在途字节受 MEDIA_INFLIGHT_BYTES 限制（见 downloader）
+- MINIO_CONTENT_ADDRESSED=true 时按内容摘要命名（media/ab/abcd...jpg），重复图片跳过上传
+- 图片 URL 先归一化为规范键（见 image_urls），同一张图片（跨笔记）只下载一次，后续直接复用对象名
+- MEDIA_PROCESSING=true 时在进程池中生成缩略图等变体（见 imaging），与原图同目录上传
+- MEDIA_PHASH=true 时先下载完整图片计算感知哈希，与已入库图片近重复（转发、轻微裁剪/压缩）的不再上传，
+  直接引用已有对象
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import aiohttp
+from loguru import logger
+
+from app.storage.mime import SNIFF_BYTES, sniff_mime
+from app.storage.phash import create_perceptual_index
+
+from .downloader import ResumableDownloader
+from .image_urls import canonical_image_key
+from .imaging import ImageProcessor, create_image_processor
+from .utils import build_headers
+
+MEDIA_REFERER = "https://www.xiaohongshu.com/"
+
+IMAGE_TYPES = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/avif": ".avif",
+    "image/heic": ".heic",
+}
+
+
+async def _peek(chunks: AsyncIterator[bytes], size: int) -> Tuple[bytes, AsyncIterator[bytes]]:
+    """
+    预读至少 size 字节，返回 (已读开头, 包含开头在内的完整数据流)
+    """
+    buffered: List[bytes] = []
+    total = 0
+    iterator = chunks.__aiter__()
+    while total < size:
+        try:
+            chunk = await iterator.__anext__()
+        except StopAsyncIteration:
+            break
+        buffered.append(chunk)
+        total += len(chunk)
+
+    async def replay() -> AsyncIterator[bytes]:
+        for chunk in buffered:
+            yield chunk
+        async for chunk in iterator:
+            yield chunk
+
+    return b"".join(buffered)[:size], replay()
+
+
+class MediaRejected(Exception):
+    """媒体不符合要求（超限、非图片），不重试"""
+
+
+class MediaPipeline:
+    """
+    笔记图片下载 + 上传
+    """
+
+    def __init__(
+        self,
+        storage=None,
+        concurrency: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        processor=None,
+        url_cache: Optional[int] = None,
+        phash=None,
+        downloader: Optional[ResumableDownloader] = None,
+    ) -> None:
+        """
+        Args:
+            storage: 存储后端（StorageBackend），默认使用进程内共享的 get_storage()
+            concurrency: 同时下载数，默认读取 MEDIA_CONCURRENCY
+            max_bytes: 单文件大小上限，默认读取 MEDIA_MAX_BYTES
+            timeout: 单文件下载超时（秒），默认读取 MEDIA_TIMEOUT
+            processor: 可选，图片变体生成器（ImageProcessor）；传入则原图上传后生成并上传变体
+            url_cache: 记住的已下载图片（规范键）数量上限，默认读取 MEDIA_URL_CACHE（默认100000）
+            phash: 可选，感知哈希近重复索引（PerceptualIndex）；传入则近重复图片不再上传
+            downloader: 可续传下载器，默认创建 ResumableDownloader（共享进程级在途字节预算）
+        """
+        if storage is None:
+            from app.storage import get_storage
+
+            storage = get_storage()
+        self.storage = storage
+        self.concurrency = concurrency or int(os.getenv("MEDIA_CONCURRENCY", "8"))
+        self.max_bytes = max_bytes or int(os.getenv("MEDIA_MAX_BYTES", str(20 * 1024 * 1024)))
+        self.timeout = timeout or float(os.getenv("MEDIA_TIMEOUT", "30"))
+        if phash is not None and processor is None:
+            processor = ImageProcessor(variants=[])
+        self.processor = processor
+        self.phash = phash
+        self.downloader = downloader or ResumableDownloader()
+        self.url_cache = url_cache or int(os.getenv("MEDIA_URL_CACHE", "100000"))
+        self.sem = asyncio.Semaphore(self.concurrency)
+        self.stats = {"downloaded": 0, "uploaded": 0, "bytes": 0, "rejected": 0, "failed": 0, "reused": 0, "near_duplicates": 0}
+        # 规范键 -> 下载结果（进行中为未完成的 Future），失败的不保留以便下次重试
+        self._fetched: "OrderedDict[str, asyncio.Future]" = OrderedDict()
+        self._bucket_ready: Optional[asyncio.Task] = None
+        # 内容寻址下同一对象可能被多条笔记同时下载，变体只生成一次
+        self._variants_inflight: Dict[str, asyncio.Future] = {}
+        # 正在上传、尚未登记到感知哈希索引的图片：哈希 -> 对象名（上传失败为 None）
+        self._phash_pending: Dict[int, asyncio.Future] = {}
+
+    async def _ensure_bucket(self) -> None:
+        # 多个笔记并发进入时只检查一次存储桶
+        if self._bucket_ready is None:
+            self._bucket_ready = asyncio.ensure_future(self.storage.check_and_create_bucket())
+        try:
+            await asyncio.shield(self._bucket_ready)
+        except Exception:
+            self._bucket_ready = None
+            raise
+
+    async def _limited(
+        self, chunks: AsyncIterator[bytes], counter: List[int], sink: Optional[bytearray] = None
+    ) -> AsyncIterator[bytes]:
+        # 分块计数，超过大小上限立即中断（上传随之中止）；需要生成变体或感知哈希时同时留一份原图
+        async for chunk in chunks:
+            counter[0] += len(chunk)
+            if counter[0] > self.max_bytes:
+                raise MediaRejected(f"too large: over {self.max_bytes} bytes")
+            if sink is not None:
+                sink += chunk
+            yield chunk
+
+    async def fetch_and_store(self, session: aiohttp.ClientSession, url: str, object_name: str) -> Optional[str]:
+        """
+        下载并上传单个图片（边下载边上传），返回对象名（扩展名按实际类型补全）；失败返回 None
+        """
+        object_name, _ = await self._fetch_once(session, url, object_name)
+        return object_name
+
+    async def _fetch_once(
+        self, session: aiohttp.ClientSession, url: str, object_name: str
+    ) -> Tuple[Optional[str], Optional[Dict[str, str]]]:
+        """
+        按规范键合并下载：同一张图片已下载（或正在下载）时直接复用其结果
+        """
+        key = canonical_image_key(url)
+        pending = self._fetched.get(key)
+        if pending is not None:
+            self._fetched.move_to_end(key)
+            result = await asyncio.shield(pending)
+            if result[0] is not None:
+                self.stats["reused"] += 1
+            return result
+        pending = asyncio.ensure_future(self._fetch(session, url, object_name))
+        self._fetched[key] = pending
+        while len(self._fetched) > self.url_cache:
+            self._fetched.popitem(last=False)
+        result = await asyncio.shield(pending)
+        if result[0] is None and self._fetched.get(key) is pending:
+            del self._fetched[key]
+        return result
+
+    async def _fetch(
+        self, session: aiohttp.ClientSession, url: str, object_name: str
+    ) -> Tuple[Optional[str], Optional[Dict[str, str]]]:
+        """
+        下载并上传单个图片，返回 (对象名, {变体名: 对象名})；未启用变体或变体生成失败时后者为 None
+        """
+        headers = build_headers({"Accept": "image/avif,image/webp,image/*,*/*;q=0.8", "Referer": MEDIA_REFERER})
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        counter = [0]
+        sink = bytearray() if self.processor is not None else None
+        try:
+            async with self.sem:
+                # 需要整张图片留在内存（变体、感知哈希）时整体占用在途字节预算，否则按块占用
+                hold_limit = self.max_bytes if sink is not None else None
+                async with self.downloader.open(session, url, headers, timeout, hold_limit=hold_limit) as remote:
+                    length = remote.length
+                    if length is not None and length > self.max_bytes:
+                        raise MediaRejected(f"too large: {length} bytes")
+                    head, body = await _peek(self._limited(remote.chunks(), counter, sink), SNIFF_BYTES)
+                    mime = sniff_mime(head)
+                    if mime not in IMAGE_TYPES:
+                        raise MediaRejected(f"not an image: {mime or 'unknown'}")
+                    if self.phash is not None:
+                        # 需要完整内容计算感知哈希后才能决定是否上传
+                        async for _ in body:
+                            pass
+                    else:
+                        await self._ensure_bucket()
+                        object_name = await self._upload(body, object_name, mime, length)
+            linked = False
+            if self.phash is not None:
+                object_name, linked = await self._store_unique(bytes(sink), object_name, mime)
+        except MediaRejected as exc:
+            self.stats["rejected"] += 1
+            logger.warning("skip media url={} reason={}", url, exc)
+            return None, None
+        except Exception as exc:  # pylint: disable=broad-except
+            self.stats["failed"] += 1
+            logger.error("media failed url={} err={}", url, exc)
+            return None, None
+        self.stats["downloaded"] += 1
+        if not linked:
+            self.stats["uploaded"] += 1
+        self.stats["bytes"] += counter[0]
+        variants = None
+        if sink is not None and self.processor.variants:
+            # 下载名额已释放，变体生成（CPU）不占用下载并发
+            variants = await self._store_variants(bytes(sink), object_name, linked)
+        return object_name, variants
+
+    async def _upload(self, body, object_name: str, mime: str, length: Optional[int] = None) -> str:
+        """上传原图（数据流或 bytes），返回最终对象名"""
+        if getattr(self.storage, "content_addressed", False):
+            # 内容寻址：相同图片（转发的封面、同一作者的头像）只存一份
+            return await self.storage.upload_content(body, prefix="media", content_type=mime)
+        object_name = f"{object_name}{IMAGE_TYPES[mime]}"
+        if isinstance(body, (bytes, bytearray)):
+            await self.storage.upload_bytes(body, object_name, content_type=mime)
+        else:
+            await self.storage.upload_stream(body, object_name, content_type=mime, length=length)
+        return object_name
+
+    async def _store_unique(self, data: bytes, object_name: str, mime: str) -> Tuple[str, bool]:
+        """
+        近重复检测后上传，返回 (对象名, 是否引用了已有对象)；哈希计算失败时照常上传
+        """
+        try:
+            value: Optional[int] = await self.processor.hash(data)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("perceptual hash failed object={} err={}", object_name, exc)
+            value = None
+        if value is None:
+            await self._ensure_bucket()
+            return await self._upload(data, object_name, mime), False
+        while True:
+            # find 返回后到登记 pending 之间没有 await：查索引、查在途、登记三步对其他协程是原子的
+            match = await self.phash.find(value)
+            if match is None:
+                match = self._find_pending(value)
+            if match is None:
+                break
+            existing, distance = match
+            if isinstance(existing, asyncio.Future):
+                existing = await asyncio.shield(existing)
+                if existing is None:
+                    # 先上传的一方失败，重新判断
+                    continue
+            self.stats["near_duplicates"] += 1
+            logger.debug("near-duplicate image {} -> {} distance={}", object_name, existing, distance)
+            return existing, True
+
+        pending = asyncio.get_running_loop().create_future()
+        self._phash_pending[value] = pending
+        stored = None
+        try:
+            await self._ensure_bucket()
+            stored = await self._upload(data, object_name, mime)
+            await self.phash.add(value, stored)
+        finally:
+            # 先登记到索引再移出 pending，任一时刻都能在两者之一找到
+            self._phash_pending.pop(value, None)
+            pending.set_result(stored)
+        return stored, False
+
+    def _find_pending(self, value: int) -> Optional[Tuple[asyncio.Future, int]]:
+        best = None
+        for other, pending in self._phash_pending.items():
+            distance = (other ^ value).bit_count()
+            if distance <= self.phash.distance and (best is None or distance < best[1]):
+                best = (pending, distance)
+        return best
+
+    async def _store_variants(self, data: bytes, object_name: str, linked: bool = False) -> Optional[Dict[str, str]]:
+        """
+        生成并上传变体，返回 {变体名: 对象名}；失败只记录日志，不影响原图
+        """
+        pending = self._variants_inflight.get(object_name)
+        if pending is None:
+            pending = asyncio.ensure_future(self._render_variants(data, object_name, linked))
+            self._variants_inflight[object_name] = pending
+            pending.add_done_callback(lambda _: self._variants_inflight.pop(object_name, None))
+        return await asyncio.shield(pending)
+
+    async def _render_variants(self, data: bytes, object_name: str, linked: bool) -> Optional[Dict[str, str]]:
+        processor = self.processor
+        keys = {name: processor.variant_name(object_name, name) for name, _ in processor.variants}
+        try:
+            if linked or getattr(self.storage, "content_addressed", False):
+                # 引用已有对象（近重复/内容寻址）时其变体通常已存在，无需重新生成
+                if await self.storage.object_exists(next(iter(keys.values()))):
+                    return keys
+            outputs = await processor.process(data)
+            await asyncio.gather(
+                *(
+                    self.storage.upload_bytes(out, keys[name], content_type=processor.content_type)
+                    for name, out in outputs
+                )
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("media variants failed object={} err={}", object_name, exc)
+            return None
+        return keys
+
+    def report(self) -> Dict[str, Any]:
+        """下载/上传统计；内容寻址模式下附带去重统计（duplicate_rate 为重复内容占比），写回缓存附带刷写统计"""
+        report: Dict[str, Any] = dict(self.stats)
+        index = getattr(self.storage, "index", None)
+        if getattr(self.storage, "content_addressed", False) and index is not None:
+            report["dedup"] = index.report()
+        if self.processor is not None and self.processor.variants:
+            report["processing"] = self.processor.report()
+        if self.phash is not None:
+            report["phash"] = self.phash.report()
+        report["download"] = self.downloader.report()
+        storage_report = getattr(self.storage, "report", None)
+        if storage_report is not None:
+            report["storage"] = storage_report()
+        return report
+
+    async def close(self) -> None:
+        """关闭变体进程池、近重复索引与存储连接"""
+        if self.processor is not None:
+            await asyncio.to_thread(self.processor.close)
+        if self.phash is not None:
+            self.phash.close()
+        close = getattr(self.storage, "close", None)
+        if close is not None:
+            await close()
+
+    async def process_note(self, session: aiohttp.ClientSession, note: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        处理单条笔记的全部图片：对象名写入 note["image_keys"]（与 images 一一对应，失败为 None）
+        与 note["cover_key"]（首张成功的图片）；启用变体时 note["image_variants"] 同样与 images 对应；
+        已处理过的笔记（断点续爬）直接跳过
+        """
+        if "image_keys" in note:
+            return note
+        urls: List[str] = note.get("images") or []
+        results = await asyncio.gather(
+            *(self._fetch_once(session, url, f"notes/{note['note_id']}/{i}") for i, url in enumerate(urls))
+        )
+        keys = [key for key, _ in results]
+        note["image_keys"] = keys
+        note["cover_key"] = next((k for k in keys if k), None)
+        if self.processor is not None and self.processor.variants:
+            note["image_variants"] = [variants for _, variants in results]
+        return note
+
+
+def create_media_pipeline() -> Optional[MediaPipeline]:
+    """MEDIA_ENABLED=true 时创建媒体入库流水线"""
+    if os.getenv("MEDIA_ENABLED", "false").lower() != "true":
+        return None
+    phash = create_perceptual_index()
+    processor = create_image_processor(hashing=phash is not None)
+    if processor is None:
+        # 未安装 Pillow 时无法计算感知哈希
+        phash = None
+    return MediaPipeline(processor=processor, phash=phash)
+
+
+__all__ = ["MediaPipeline", "MediaRejected", "create_media_pipeline", "sniff_mime", "IMAGE_TYPES"]
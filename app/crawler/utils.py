@@ -8,6 +8,8 @@ import string
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple
 
+from .image_urls import get_canonicalizer
+
 USER_AGENTS: List[str] = [
     # 常见桌面 UA，可按需扩充
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
@@ -50,14 +52,11 @@ def sanitize_text(text: str) -> str:
 
 
 def dedup_images(urls: List[str]) -> List[str]:
-    """图片 URL 去重，保持顺序"""
-    seen = set()
-    result = []
-    for u in urls:
-        if u and u not in seen:
-            seen.add(u)
-            result.append(u)
-    return result
+    """
+    图片 URL 去重，保持顺序：不同 CDN 域名/尺寸后缀/查询参数下的同一张图片只保留质量最好的一个
+    （规则见 image_urls）
+    """
+    return get_canonicalizer().dedup(urls)
 
 
 def parse_publish_time(ts: str) -> datetime | None:
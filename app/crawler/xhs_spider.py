@@ -6,12 +6,14 @@ from __future__ import annotations
 
 import asyncio
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 import aiohttp
 from dotenv import load_dotenv
 from loguru import logger
 
+from .coalesce import RequestCoalescer
+from .media import MediaPipeline
 from .utils import (
     build_headers,
     dedup_images,
@@ -24,12 +26,18 @@ from .utils import (
 # 加载 .env
 load_dotenv()
 
+SEARCH_URL = "https://www.xiaohongshu.com/api/fe_api/burdock/v3/search/notes"
+COMMENT_URL = "https://www.xiaohongshu.com/api/sns/web/v2/comment/page"
+
 
 class AsyncXhsCrawler:
     """
     小红书异步爬虫
     """
 
+    # 进程内共享：不同任务（不同实例）对同一接口/参数的并发请求只发一次
+    coalescer = RequestCoalescer(ttl=float(os.getenv("CRAWLER_COALESCE_TTL", "30")))
+
     def __init__(
         self,
         cookies: Optional[str] = None,
@@ -37,6 +45,7 @@ class AsyncXhsCrawler:
         comment_limit: Optional[int] = None,
         concurrency: int = 5,
         timeout: float = 15.0,
+        media: Optional[MediaPipeline] = None,
     ) -> None:
         """
         Args:
@@ -45,6 +54,7 @@ class AsyncXhsCrawler:
             comment_limit: 每条笔记最多抓取评论数，默认读取 COMMENT_LIMIT（.env，默认20）
             concurrency: 并发协程数
             timeout: 单请求超时时间
+            media: 可选，媒体入库流水线；传入则每条笔记完成后在后台下载图片并上传
         """
         self.cookies = cookies or os.getenv("XHS_COOKIES", "")
         self.request_delay = (
@@ -60,8 +70,16 @@ class AsyncXhsCrawler:
         self.concurrency = concurrency
         self.timeout = timeout
         self.sem = asyncio.Semaphore(concurrency)
+        self.media = media
 
     async def _request_json(self, session: aiohttp.ClientSession, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        GET JSON 接口；相同 (url, params, cookie) 的并发请求经 coalescer 合并为一次
+        """
+        key = RequestCoalescer.make_key(url, params, hash(self.cookies))
+        return await self.coalescer.run(key, lambda: self._fetch_json(session, url, params), owner=session)
+
+    async def _fetch_json(self, session: aiohttp.ClientSession, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
         headers = build_headers()
         if self.cookies:
             headers["Cookie"] = self.cookies
@@ -71,15 +89,51 @@ class AsyncXhsCrawler:
             try:
                 async with session.get(url, params=params, headers=headers, timeout=self.timeout) as resp:
                     if resp.status != 200:
-                        logger.warning("Request failed %s status=%s", url, resp.status)
+                        logger.warning("Request failed {} status={}", url, resp.status)
                         return {}
                     return await resp.json()
             except asyncio.TimeoutError:
-                logger.error("Request timeout %s", url)
+                logger.error("Request timeout {}", url)
             except aiohttp.ClientError as exc:
-                logger.error("Request error %s: %s", url, exc)
+                logger.error("Request error {}: {}", url, exc)
         return {}
 
+    def _accept_notes(
+        self,
+        items: List[Dict[str, Any]],
+        notes: List[Dict[str, Any]],
+        limit: int,
+    ) -> List[Dict[str, Any]]:
+        """
+        解析一页搜索结果并追加到 notes，返回本页新接受的笔记
+        """
+        seen = {n["note_id"] for n in notes}
+        accepted: List[Dict[str, Any]] = []
+        for item in items:
+            if len(notes) >= limit:
+                break
+            parsed = self.extract_note_data(item)
+            if not parsed or parsed["note_id"] in seen:
+                continue
+            if parsed.get("note_type") != "normal":  # 过滤视频/广告
+                continue
+            if not is_within_last_months(parsed.get("publish_time"), months=6):
+                continue
+            seen.add(parsed["note_id"])
+            notes.append(parsed)
+            accepted.append(parsed)
+        return accepted
+
+    async def _fetch_search_page(
+        self,
+        session: aiohttp.ClientSession,
+        keyword: str,
+        page: int,
+    ) -> List[Dict[str, Any]]:
+        params = {"keyword": keyword, "page": page, "page_size": 20}
+        data = await self._request_json(session, SEARCH_URL, params)
+        return data.get("data", {}).get("notes", []) if data else []
+
     async def fetch_notes_by_keyword(
         self,
         session: aiohttp.ClientSession,
@@ -91,31 +145,17 @@ class AsyncXhsCrawler:
         """
         notes: List[Dict[str, Any]] = []
         page = 1
-        page_size = 20
-        base_url = "https://www.xiaohongshu.com/api/fe_api/burdock/v3/search/notes"
 
         while len(notes) < limit:
-            params = {"keyword": keyword, "page": page, "page_size": page_size}
-            data = await self._request_json(session, base_url, params)
-            items = data.get("data", {}).get("notes", []) if data else []
+            items = await self._fetch_search_page(session, keyword, page)
             if not items:
                 break
-            for item in items:
-                parsed = self.extract_note_data(item)
-                if not parsed:
-                    continue
-                if parsed.get("note_type") != "normal":  # 过滤视频/广告
-                    continue
-                if not is_within_last_months(parsed.get("publish_time"), months=6):
-                    continue
-                notes.append(parsed)
-                if len(notes) >= limit:
-                    break
+            self._accept_notes(items, notes, limit)
             page += 1
 
         # 只保留评论量最高的 limit 条图文笔记
         notes = sorted(notes, key=lambda n: n.get("commented", 0), reverse=True)[:limit]
-        logger.info("keyword=%s fetched=%d", keyword, len(notes))
+        logger.info("keyword={} fetched={}", keyword, len(notes))
         return notes
 
     def extract_note_data(self, item: Dict[str, Any]) -> Dict[str, Any] | None:
@@ -154,18 +194,24 @@ class AsyncXhsCrawler:
         session: aiohttp.ClientSession,
         note_id: str,
         limit: Optional[int] = None,
+        cursor: str = "",
+        comments: Optional[List[Dict[str, Any]]] = None,
+        on_page: Optional[Callable[[str, List[Dict[str, Any]]], Awaitable[None]]] = None,
     ) -> List[Dict[str, Any]]:
         """
         拉取评论（示例接口占位），默认前 N 条
+
+        Args:
+            cursor: 起始游标，断点续爬时传入上次保存的游标
+            comments: 已抓取的评论，断点续爬时传入，新评论追加其后
+            on_page: 每页完成后回调 (下一页游标, 已抓取评论)，用于保存断点
         """
         max_comments = limit or self.comment_limit
-        base_url = "https://www.xiaohongshu.com/api/sns/web/v2/comment/page"
-        comments: List[Dict[str, Any]] = []
-        cursor = ""
+        comments = comments if comments is not None else []
 
         while len(comments) < max_comments:
             params = {"note_id": note_id, "cursor": cursor, "page_size": 20}
-            data = await self._request_json(session, base_url, params)
+            data = await self._request_json(session, COMMENT_URL, params)
             items = data.get("data", {}).get("comments", []) if data else []
             if not items:
                 break
@@ -182,38 +228,168 @@ class AsyncXhsCrawler:
                 if len(comments) >= max_comments:
                     break
             cursor = data.get("data", {}).get("cursor", "")
+            if on_page is not None:
+                await on_page(cursor, comments)
             if not cursor:
                 break
 
         return comments
 
+    async def _fetch_note_comments(
+        self,
+        session: aiohttp.ClientSession,
+        note: Dict[str, Any],
+        state: Dict[str, Any],
+        save: Callable[[], Awaitable[None]],
+        emit: Callable[[Dict[str, Any]], None],
+    ) -> None:
+        """
+        拉取单条笔记评论，进度（游标 + 已抓评论）记录在 state["comment_progress"]，
+        完成后发出 note 事件
+        """
+        note_id = note["note_id"]
+        progress = state["comment_progress"].setdefault(note_id, {"cursor": "", "comments": []})
+        stats = state["stats"]
+
+        async def on_page(cursor: str, comments: List[Dict[str, Any]]) -> None:
+            stats["pages"] += 1
+            stats["comments"] += len(comments) - len(progress["comments"])
+            progress["cursor"] = cursor
+            progress["comments"] = list(comments)
+            emit({"event": "progress", **stats})
+            await save()
+
+        try:
+            if progress["comments"] and not progress["cursor"]:
+                # 中断前已拉到最后一页，无需再请求
+                comments = progress["comments"]
+            else:
+                comments = await self.fetch_comments(
+                    session,
+                    note_id,
+                    cursor=progress["cursor"],
+                    comments=list(progress["comments"]),
+                    on_page=on_page,
+                )
+            note["comments"] = comments[:20]
+        except Exception as exc:
+            logger.error("fetch_comments failed note_id={} err={}", note_id, exc)
+            note["comments"] = []
+        state["comment_progress"].pop(note_id, None)
+        emit({"event": "note", "note": note})
+        await save()
+
+    async def crawl_keyword(
+        self,
+        session: aiohttp.ClientSession,
+        keyword: str,
+        limit: int = 50,
+        checkpoint: Optional[Dict[str, Any]] = None,
+        on_checkpoint: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        爬取单个关键词：逐页搜索，每页接受的笔记立即拉取评论。
+
+        进度保存在 state 中（下一搜索页、已接受笔记、每条笔记的评论游标），
+        每完成一页（搜索页或评论页）回调 on_checkpoint；传入 checkpoint 则从该进度继续。
+        on_event 同步接收事件：每条笔记评论拉取完成后的 note 事件，每页完成后的 progress 计数事件。
+        """
+        state: Dict[str, Any] = checkpoint or {}
+        state.setdefault("page", 1)
+        state.setdefault("search_done", False)
+        state.setdefault("notes", [])
+        state.setdefault("comment_progress", {})
+        state.setdefault("stats", {"pages": 0, "notes": 0, "comments": 0})
+        notes: List[Dict[str, Any]] = state["notes"]
+        stats: Dict[str, int] = state["stats"]
+
+        async def save() -> None:
+            if on_checkpoint is not None:
+                await on_checkpoint(keyword, state)
+
+        def emit(event: Dict[str, Any]) -> None:
+            if on_event is not None:
+                on_event(keyword, event)
+
+        # 媒体在后台处理，与后续搜索/评论请求重叠；对象名写回笔记，随断点保存
+        media_tasks: List[asyncio.Task] = []
+
+        def start_media(note: Dict[str, Any]) -> None:
+            if self.media is not None and "image_keys" not in note:
+                media_tasks.append(asyncio.create_task(self.media.process_note(session, note)))
+
+        # 续爬时先补发已完成的笔记
+        for note in notes:
+            if "comments" in note:
+                emit({"event": "note", "note": note})
+                start_media(note)
+
+        try:
+            while True:
+                # 先补齐已接受但评论未完成的笔记（断点续爬时即为中断处）
+                for note in notes:
+                    if "comments" not in note:
+                        await self._fetch_note_comments(session, note, state, save, emit)
+                        start_media(note)
+                if state["search_done"] or len(notes) >= limit:
+                    break
+                items = await self._fetch_search_page(session, keyword, state["page"])
+                state["page"] += 1
+                stats["pages"] += 1
+                if not items:
+                    state["search_done"] = True
+                else:
+                    self._accept_notes(items, notes, limit)
+                stats["notes"] = len(notes)
+                emit({"event": "progress", **stats})
+                await save()
+            await asyncio.gather(*media_tasks)
+            if media_tasks:
+                logger.info("media keyword={} {}", keyword, self.media.report())
+        finally:
+            for task in media_tasks:
+                task.cancel()
+
+        # 只保留评论量最高的 limit 条图文笔记
+        result = sorted(notes, key=lambda n: n.get("commented", 0), reverse=True)[:limit]
+        logger.info("keyword={} fetched={}", keyword, len(result))
+        return result
+
     async def crawl_keywords(
         self,
         keywords: List[str],
         per_keyword: int = 50,
+        checkpoints: Optional[Dict[str, Dict[str, Any]]] = None,
+        on_checkpoint: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
     ) -> Dict[str, List[Dict[str, Any]]]:
         """
         批量关键词爬取
+
+        Args:
+            checkpoints: 可选，keyword -> 断点进度，存在则从断点继续
+            on_checkpoint: 可选，进度更新回调 (keyword, state)
+            on_event: 可选，笔记/进度事件回调 (keyword, event)
         """
         results: Dict[str, List[Dict[str, Any]]] = {}
+        checkpoints = checkpoints or {}
 
         timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
         connector = aiohttp.TCPConnector(limit=50, ssl=False)
         async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
             for kw in keywords:
-                notes = await self.fetch_notes_by_keyword(session, kw, limit=per_keyword)
-                # 拉取评论
-                for note in notes:
-                    note_id = note.get("note_id")
-                    if not note_id:
-                        continue
-                    try:
-                        comments = await self.fetch_comments(session, note_id)
-                        note["comments"] = comments[:20]
-                    except Exception as exc:
-                        logger.error("fetch_comments failed note_id=%s err=%s", note_id, exc)
-                        note["comments"] = []
-                results[kw] = notes
+                results[kw] = await self.crawl_keyword(
+                    session,
+                    kw,
+                    limit=per_keyword,
+                    checkpoint=checkpoints.get(kw),
+                    on_checkpoint=on_checkpoint,
+                    on_event=on_event,
+                )
+        logger.debug(
+            "request coalescing stats={} duplicates_avoided={}", self.coalescer.stats, self.coalescer.duplicates_avoided
+        )
         return results
 
 
@@ -8,7 +8,7 @@ from decimal import Decimal
 
 from sqlalchemy import select, update, delete, func, and_, or_, desc, asc
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import noload, selectinload
 from loguru import logger
 
 from app.db.models import Keyword, Note, Comment
@@ -488,6 +488,77 @@ class NoteCRUD:
             logger.error(f"搜索笔记失败: 错误: {e}")
             return []
     
+    @staticmethod
+    async def keyset_page(
+        session: AsyncSession,
+        keyword_id: Optional[int] = None,
+        author_id: Optional[str] = None,
+        min_like_count: Optional[int] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        order_by: str = "crawl_time",
+        after: Optional[tuple] = None,
+        limit: int = 20
+    ) -> List[Note]:
+        """
+        键集分页查询笔记（按 排序字段 DESC, id DESC），翻页代价与页码无关
+        
+        Args:
+            session: 数据库会话
+            keyword_id: 关键词ID筛选（可选）
+            author_id: 作者ID筛选（可选）
+            min_like_count: 最小点赞数筛选（可选）
+            start_time: 发布时间下限（含，可选）
+            end_time: 发布时间上限（不含，可选）
+            order_by: 排序字段（crawl_time, like_count, publish_time）；按 publish_time 排序时不返回发布时间为空的笔记
+            after: 上一页最后一条的 (排序字段值, id)
+            limit: 返回数量限制
+            
+        Returns:
+            List[Note]: 笔记列表（不加载评论与关键词关系）
+            
+        Raises:
+            ValueError: 不支持的排序字段
+            Exception: 查询失败时
+        """
+        columns = {
+            "crawl_time": Note.crawl_time,
+            "like_count": Note.like_count,
+            "publish_time": Note.publish_time,
+        }
+        if order_by not in columns:
+            raise ValueError(f"不支持的排序字段: {order_by}")
+        column = columns[order_by]
+        try:
+            conditions = []
+            if keyword_id is not None:
+                conditions.append(Note.keyword_id == keyword_id)
+            if author_id:
+                conditions.append(Note.author_id == author_id)
+            if min_like_count is not None:
+                conditions.append(Note.like_count >= min_like_count)
+            if start_time is not None:
+                conditions.append(Note.publish_time >= start_time)
+            if end_time is not None:
+                conditions.append(Note.publish_time < end_time)
+            if order_by == "publish_time":
+                conditions.append(Note.publish_time.is_not(None))
+            if after is not None:
+                value, last_id = after
+                conditions.append(or_(column < value, and_(column == value, Note.id < last_id)))
+            
+            # 评论/关键词关系默认 selectin 加载，列表查询不需要，避免逐页拉取全部评论
+            query = select(Note).options(noload(Note.comments), noload(Note.keyword_obj))
+            if conditions:
+                query = query.where(and_(*conditions))
+            query = query.order_by(desc(column), desc(Note.id)).limit(limit)
+            
+            result = await session.execute(query)
+            return list(result.scalars().all())
+        except Exception as e:
+            logger.error(f"键集分页查询笔记失败: 错误: {e}")
+            raise
+    
     @staticmethod
     async def update(
         session: AsyncSession,
@@ -745,6 +816,60 @@ class CommentCRUD:
             logger.error(f"获取评论列表失败: note_id={note_id}, 错误: {e}")
             return []
     
+    @staticmethod
+    async def keyset_by_note_id(
+        session: AsyncSession,
+        note_id: int,
+        order_by: str = "like_count",
+        after: Optional[tuple] = None,
+        limit: int = 20
+    ) -> List[Comment]:
+        """
+        键集分页获取笔记的评论（按 排序字段 DESC, id DESC）
+        
+        Args:
+            session: 数据库会话
+            note_id: 笔记ID
+            order_by: 排序字段（like_count, id 即抓取顺序）
+            after: 上一页最后一条的 (排序字段值, id)
+            limit: 返回数量限制
+            
+        Returns:
+            List[Comment]: 评论列表（不加载笔记关系）
+            
+        Raises:
+            ValueError: 不支持的排序字段
+            Exception: 查询失败时
+        """
+        if order_by not in ("like_count", "id"):
+            raise ValueError(f"不支持的排序字段: {order_by}")
+        try:
+            query = (
+                select(Comment)
+                .options(noload(Comment.note_obj))
+                .where(Comment.note_id == note_id)
+            )
+            if order_by == "like_count":
+                if after is not None:
+                    value, last_id = after
+                    query = query.where(
+                        or_(
+                            Comment.like_count < value,
+                            and_(Comment.like_count == value, Comment.id < last_id),
+                        )
+                    )
+                query = query.order_by(desc(Comment.like_count), desc(Comment.id))
+            else:
+                if after is not None:
+                    query = query.where(Comment.id < after[1])
+                query = query.order_by(desc(Comment.id))
+            
+            result = await session.execute(query.limit(limit))
+            return list(result.scalars().all())
+        except Exception as e:
+            logger.error(f"键集分页获取评论失败: note_id={note_id}, 错误: {e}")
+            raise
+    
     @staticmethod
     async def get_replies(
         session: AsyncSession,
@@ -296,6 +296,9 @@ class Note(Base):
         Index("idx_like_count", "like_count"),
         Index("idx_publish_time", "publish_time"),
         Index("idx_crawl_time", "crawl_time"),
+        # 按关键词键集分页（InnoDB 二级索引隐含主键，覆盖 ORDER BY 字段, id）
+        Index("idx_keyword_crawl_time", "keyword_id", "crawl_time"),
+        Index("idx_keyword_like_count", "keyword_id", "like_count"),
     )
     
     def __repr__(self) -> str:
@@ -431,6 +434,7 @@ class Comment(Base):
         Index("idx_parent_comment_id", "parent_comment_id"),
         Index("idx_user_id", "user_id"),
         Index("idx_comment_time", "comment_time"),
+        Index("idx_note_like_count", "note_id", "like_count"),
     )
     
     def __repr__(self) -> str:
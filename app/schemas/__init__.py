@@ -1,3 +1,37 @@
 """
 数据模式/序列化模块
 """
+
+from .crawl import (
+    CrawlTaskRequest,
+    ResponseModel,
+    ApiResponse,
+    CommentItem,
+    NoteItem,
+    TaskInfo,
+    TaskCreatedData,
+    TaskListData,
+    ResultPageData,
+)
+from .notes import (
+    StoredNote,
+    StoredComment,
+    NotePageData,
+    CommentPageData,
+)
+
+__all__ = [
+    "CrawlTaskRequest",
+    "ResponseModel",
+    "ApiResponse",
+    "CommentItem",
+    "NoteItem",
+    "TaskInfo",
+    "TaskCreatedData",
+    "TaskListData",
+    "ResultPageData",
+    "StoredNote",
+    "StoredComment",
+    "NotePageData",
+    "CommentPageData",
+]
@@ -0,0 +1,105 @@
+"""
+爬取任务相关的接口数据模式
+"""
+
+import os
+from datetime import datetime
+from typing import Dict, Generic, List, Optional, TypeVar
+
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+MAX_KEYWORDS_PER_REQUEST = int(os.getenv("CRAWL_MAX_KEYWORDS_PER_REQUEST", "50"))
+
+
+class CrawlTaskRequest(BaseModel):
+    keywords: List[str] = Field(
+        ...,
+        description="关键词列表",
+        min_length=1,
+        max_length=MAX_KEYWORDS_PER_REQUEST,
+    )
+    note_limit: int = Field(50, gt=0, le=200, description="每个关键词抓取数量")
+
+
+class ResponseModel(BaseModel):
+    """通用响应（data 为任意字典）"""
+
+    code: int = 200
+    msg: str = "success"
+    data: Optional[dict] = None
+
+
+class ApiResponse(BaseModel, Generic[T]):
+    """带类型的通用响应，用于接口文档"""
+
+    code: int = 200
+    msg: str = "success"
+    data: Optional[T] = None
+
+
+class CommentItem(BaseModel):
+    user: str = ""
+    content: str
+    liked: int = 0
+
+
+class NoteItem(BaseModel):
+    """
+    爬取结果中的单条笔记；字段投影时除 note_id 外均可能缺省
+    """
+
+    note_id: str
+    title: Optional[str] = None
+    desc: Optional[str] = None
+    liked: Optional[int] = None
+    collected: Optional[int] = None
+    commented: Optional[int] = None
+    publish_time: Optional[datetime] = None
+    images: Optional[List[str]] = None
+    note_type: Optional[str] = None
+    comments: Optional[List[CommentItem]] = None
+    image_keys: Optional[List[Optional[str]]] = Field(None, description="MinIO 对象名，与 images 一一对应，失败为 null")
+    cover_key: Optional[str] = Field(None, description="封面 MinIO 对象名")
+    image_variants: Optional[List[Optional[Dict[str, str]]]] = Field(
+        None, description="图片变体 {变体名: MinIO 对象名}，与 images 一一对应，未生成为 null"
+    )
+
+
+class TaskInfo(BaseModel):
+    keyword: str
+    status: str = Field(..., description="pending / running / success / failed")
+    note_limit: int
+    error: Optional[str] = None
+
+
+class TaskCreatedData(BaseModel):
+    created: List[str]
+    skipped: List[str]
+    queue_depth: int
+    eta_seconds: Optional[int] = Field(None, description="按当前消化速率估算的排空秒数，无样本时为空")
+
+
+class TaskListData(BaseModel):
+    tasks: List[TaskInfo]
+
+
+class ResultPageData(BaseModel):
+    keyword: str
+    notes: List[NoteItem]
+    next_cursor: Optional[str] = None
+    total: int
+
+
+__all__ = [
+    "CrawlTaskRequest",
+    "ResponseModel",
+    "ApiResponse",
+    "CommentItem",
+    "NoteItem",
+    "TaskInfo",
+    "TaskCreatedData",
+    "TaskListData",
+    "ResultPageData",
+]
@@ -0,0 +1,51 @@
+"""
+已入库笔记/评论查询接口的数据模式
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class StoredNote(BaseModel):
+    note_id: str
+    keyword_id: int
+    title: str = ""
+    content: Optional[str] = None
+    author_id: str = ""
+    author_name: str = ""
+    like_count: int = 0
+    collect_count: int = 0
+    comment_count: int = 0
+    share_count: int = 0
+    cover_image_url: Optional[str] = None
+    image_urls: Optional[List[str]] = None
+    video_url: Optional[str] = None
+    note_url: str
+    publish_time: Optional[datetime] = None
+    crawl_time: datetime
+
+
+class StoredComment(BaseModel):
+    comment_id: str
+    parent_comment_id: Optional[str] = None
+    user_id: str = ""
+    user_name: str = ""
+    content: str
+    like_count: int = 0
+    reply_count: int = 0
+    comment_time: Optional[datetime] = None
+
+
+class NotePageData(BaseModel):
+    notes: List[StoredNote]
+    next_cursor: Optional[str] = None
+
+
+class CommentPageData(BaseModel):
+    comments: List[StoredComment]
+    next_cursor: Optional[str] = None
+
+
+__all__ = ["StoredNote", "StoredComment", "NotePageData", "CommentPageData"]
@@ -0,0 +1,141 @@
+"""
+任务入队准入控制
+
+- 队列深度上限：待执行任务数 + 本次新增超过上限即拒绝；
+- 客户端速率：按客户端的令牌桶限制每分钟可入队的关键词数（只计已不在队列中的关键词，幂等重试不消耗配额）；客户端按来源 IP 区分，
+  只有来自受信代理（CRAWL_TRUSTED_PROXIES）的请求才采信 X-Client-Id / X-Forwarded-For；
+- 拒绝时给出 Retry-After：队列满时按实测消化速率估算，限速时按令牌补充时间计算。
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import time
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+from app.task.async_scheduler import TaskScheduler
+
+
+class AdmissionController:
+    """
+    入队准入控制器（进程内）
+    """
+
+    def __init__(
+        self,
+        max_queue_depth: int = 500,
+        client_rate: float = 60,
+        client_burst: Optional[float] = None,
+        drain_window: float = 600,
+        default_retry_after: int = 60,
+        trusted_proxies: Iterable[str] = (),
+    ) -> None:
+        """
+        Args:
+            max_queue_depth: 待执行任务数上限，0 表示不限制
+            client_rate: 每个客户端每分钟可入队的关键词数，0 表示不限制
+            client_burst: 令牌桶容量，默认等于 client_rate
+            drain_window: 估算消化速率的统计窗口（秒）
+            default_retry_after: 无消化速率样本时的 Retry-After（秒）
+            trusted_proxies: 受信反向代理/网关的 IP，只有来自这些地址的请求才采信客户端标识头
+        """
+        self.max_queue_depth = max_queue_depth
+        self.client_rate = client_rate
+        self.client_burst = client_burst if client_burst is not None else client_rate
+        self.drain_window = drain_window
+        self.default_retry_after = default_retry_after
+        self.trusted_proxies = frozenset(trusted_proxies)
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # client -> (tokens, updated_at)
+
+    def client_id(self, peer: Optional[str], headers: Mapping[str, str]) -> str:
+        """
+        限速用的客户端标识：默认为来源 IP；请求头可由调用方任意伪造，
+        只有直连方是受信代理时才采信 X-Client-Id，其次取 X-Forwarded-For 中最后一个非受信地址
+        """
+        peer = peer or "unknown"
+        if peer not in self.trusted_proxies:
+            return peer
+        client = headers.get("X-Client-Id")
+        if client:
+            return f"id:{client}"
+        for hop in reversed([h.strip() for h in headers.get("X-Forwarded-For", "").split(",") if h.strip()]):
+            if hop not in self.trusted_proxies:
+                return hop
+        return peer
+
+    def _refill(self, client_id: str) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(client_id, (self.client_burst, now))
+        tokens = min(self.client_burst, tokens + (now - updated_at) * self.client_rate / 60)
+        self._buckets[client_id] = (tokens, now)
+        if len(self._buckets) > 10000:
+            # 清理已回满的空闲客户端，防止无限增长
+            self._buckets = {k: v for k, v in self._buckets.items() if v[0] < self.client_burst}
+        return tokens
+
+    def check_client_rate(self, client_id: str, count: int) -> Optional[int]:
+        """
+        检查客户端速率，放行则扣减令牌并返回 None，否则返回需等待秒数
+        """
+        if self.client_rate <= 0:
+            return None
+        tokens = self._refill(client_id)
+        if count > self.client_burst:
+            # 单次请求超过桶容量，永远无法一次放行，按补满全桶的时间提示
+            return math.ceil(self.client_burst / self.client_rate * 60)
+        if tokens < count:
+            return max(1, math.ceil((count - tokens) / self.client_rate * 60))
+        self._buckets[client_id] = (tokens - count, time.monotonic())
+        return None
+
+    def refund(self, client_id: str, count: int) -> None:
+        """
+        退还已扣减但未实际入队的关键词令牌（检查之后被其他请求抢先入队）
+        """
+        if self.client_rate <= 0 or count <= 0:
+            return
+        tokens = self._refill(client_id)
+        self._buckets[client_id] = (min(self.client_burst, tokens + count), time.monotonic())
+
+    async def queue_status(self, scheduler: TaskScheduler) -> dict:
+        """
+        当前队列深度、消化速率与排空预计时间
+        """
+        depth = await scheduler.queue_depth()
+        rate = await scheduler.drain_rate(self.drain_window)
+        return {
+            "queue_depth": depth,
+            "max_queue_depth": self.max_queue_depth,
+            "drain_rate": round(rate, 4),
+            "eta_seconds": math.ceil(depth / rate) if rate > 0 else None,
+        }
+
+    def retry_after_for_queue(self, status: dict, count: int) -> Optional[int]:
+        """
+        队列容量检查：放行返回 None，否则按消化速率估算腾出 count 个位置所需秒数
+        """
+        if self.max_queue_depth <= 0 or count <= 0:
+            return None
+        excess = status["queue_depth"] + count - self.max_queue_depth
+        if excess <= 0:
+            return None
+        rate = status["drain_rate"]
+        if rate <= 0:
+            return self.default_retry_after
+        return max(1, math.ceil(excess / rate))
+
+
+_controller = AdmissionController(
+    max_queue_depth=int(os.getenv("CRAWL_MAX_QUEUE_DEPTH", "500")),
+    client_rate=float(os.getenv("CRAWL_CLIENT_RATE", "60")),
+    client_burst=float(os.getenv("CRAWL_CLIENT_BURST")) if os.getenv("CRAWL_CLIENT_BURST") else None,
+    trusted_proxies=[p.strip() for p in os.getenv("CRAWL_TRUSTED_PROXIES", "").split(",") if p.strip()],
+)
+
+
+async def get_admission_controller() -> AdmissionController:  # FastAPI Depends
+    return _controller
+
+
+__all__ = ["AdmissionController", "get_admission_controller"]
@@ -0,0 +1,347 @@
+"""
+已入库笔记/评论查询：键集分页、筛选与进程内结果缓存
+
+- 分页使用键集（排序字段值 + id）游标，翻页代价与页码无关，且不受翻页期间新入库数据影响
+- 热点查询结果缓存 NOTES_CACHE_TTL 秒；本进程提交的笔记/评论写入按关键词/笔记精确失效，
+  其他进程（爬虫脚本等）写入的数据最多在 TTL 后可见
+- 失效挂在 ORM 事件上：写入时登记受影响的标签，事务提交后才失效，回滚则丢弃
+"""
+
+from __future__ import annotations
+
+import base64
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from app.db import Comment, CommentCRUD, Keyword, Note, NoteCRUD, get_db_session
+from app.task import codec
+
+NOTES_CACHE_TTL = float(os.getenv("NOTES_CACHE_TTL", "30"))
+NOTES_CACHE_ENTRIES = int(os.getenv("NOTES_CACHE_ENTRIES", "1024"))
+
+NOTE_SORTS = ("crawl_time", "like_count", "publish_time")
+COMMENT_SORTS = ("like_count", "id")
+
+_PENDING_TAGS = "notes_cache_tags"
+
+
+class QueryCache:
+    """
+    带标签的 TTL + LRU 缓存
+
+    每个条目关联若干标签，按标签失效。标签维护代数：查询开始时记录代数，
+    写回时代数已变化（查询期间有数据提交）则不缓存，避免把旧结果写回缓存。
+    """
+
+    def __init__(self, ttl: float = NOTES_CACHE_TTL, max_entries: int = NOTES_CACHE_ENTRIES) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._items: "OrderedDict[Hashable, Tuple[float, Set[str], Any]]" = OrderedDict()
+        self._tag_keys: Dict[str, Set[Hashable]] = {}
+        self._generations: Dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def generation(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._generations.get(tag, 0) for tag in sorted(tags))
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._items.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                self._discard(key)
+            self.stats["misses"] += 1
+            return None
+        self._items.move_to_end(key)
+        self.stats["hits"] += 1
+        return item[2]
+
+    def put(self, key: Hashable, value: Any, tags: Set[str], generation: Tuple[int, ...]) -> None:
+        if self.ttl <= 0 or self.max_entries <= 0 or self.generation(tags) != generation:
+            return
+        self._discard(key)
+        self._items[key] = (time.monotonic() + self.ttl, tags, value)
+        for tag in tags:
+            self._tag_keys.setdefault(tag, set()).add(key)
+        while len(self._items) > self.max_entries:
+            self._discard(next(iter(self._items)))
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in list(self._tag_keys.get(tag, ())):
+                self._discard(key)
+            self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._tag_keys.clear()
+
+    def _discard(self, key: Hashable) -> None:
+        item = self._items.pop(key, None)
+        if item is None:
+            return
+        for tag in item[1]:
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_keys[tag]
+
+
+_cache = QueryCache()
+
+
+def get_query_cache() -> QueryCache:
+    return _cache
+
+
+# ============================================
+# 写入失效
+# ============================================
+
+def _note_tags(note: Note) -> Set[str]:
+    return {"notes", f"notes:{note.keyword_id}", "note-ids"}
+
+
+def _comment_tags(comment: Comment) -> Set[str]:
+    return {f"comments:{comment.note_id}"}
+
+
+def _keyword_tags(keyword: Keyword) -> Set[str]:
+    return {"keywords"}
+
+
+def _make_listener(tags_for):
+    def listener(mapper, connection, target) -> None:
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(_PENDING_TAGS, set()).update(tags_for(target))
+
+    return listener
+
+
+def _after_commit(session: Session) -> None:
+    tags = session.info.pop(_PENDING_TAGS, None)
+    if tags:
+        _cache.invalidate(tags)
+
+
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_TAGS, None)
+
+
+_registered = False
+
+
+def register_cache_invalidation() -> None:
+    """
+    注册 ORM 事件：笔记/评论/关键词写入提交后失效相关缓存（重复调用无副作用）
+    """
+    global _registered
+    if _registered:
+        return
+    for model, tags_for in ((Note, _note_tags), (Comment, _comment_tags), (Keyword, _keyword_tags)):
+        listener = _make_listener(tags_for)
+        for name in ("after_insert", "after_update", "after_delete"):
+            event.listen(model, name, listener)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+    _registered = True
+
+
+register_cache_invalidation()
+
+
+# ============================================
+# 游标与序列化
+# ============================================
+
+def encode_cursor(sort: str, value: Any, row_id: int) -> str:
+    raw = codec.dumps([sort, value, row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], sort: str) -> Optional[tuple]:
+    """
+    解析游标为 (排序字段值, id)
+
+    Raises:
+        ValueError: 游标非法或与当前排序字段不一致
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, row_id = codec.loads(raw)
+    except Exception as exc:
+        raise ValueError("invalid cursor") from exc
+    if cursor_sort != sort:
+        raise ValueError("cursor does not match sort")
+    return value, int(row_id)
+
+
+def note_to_dict(note: Note) -> Dict[str, Any]:
+    return {
+        "note_id": note.note_id,
+        "keyword_id": note.keyword_id,
+        "title": note.title,
+        "content": note.content,
+        "author_id": note.author_id,
+        "author_name": note.author_name,
+        "like_count": note.like_count,
+        "collect_count": note.collect_count,
+        "comment_count": note.comment_count,
+        "share_count": note.share_count,
+        "cover_image_url": note.cover_image_url,
+        "image_urls": note.image_urls,
+        "video_url": note.video_url,
+        "note_url": note.note_url,
+        "publish_time": note.publish_time,
+        "crawl_time": note.crawl_time,
+    }
+
+
+def comment_to_dict(comment: Comment) -> Dict[str, Any]:
+    return {
+        "comment_id": comment.comment_id,
+        "parent_comment_id": comment.parent_comment_id,
+        "user_id": comment.user_id,
+        "user_name": comment.user_name,
+        "content": comment.content,
+        "like_count": comment.like_count,
+        "reply_count": comment.reply_count,
+        "comment_time": comment.comment_time,
+    }
+
+
+# ============================================
+# 查询
+# ============================================
+
+async def _resolve_id(session, column, pk, value: str, tag: str) -> Optional[int]:
+    key = ("id", tag, value)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+    generation = _cache.generation({tag})
+    row_id = (await session.execute(select(pk).where(column == value))).scalar_one_or_none()
+    if row_id is not None:
+        _cache.put(key, row_id, {tag}, generation)
+    return row_id
+
+
+async def list_notes(
+    keyword: Optional[str] = None,
+    author_id: Optional[str] = None,
+    min_likes: Optional[int] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    sort: str = "crawl_time",
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> Dict[str, Any]:
+    """
+    分页查询已入库笔记（按 sort 降序）
+
+    Returns:
+        dict: {"notes": 当前页, "next_cursor": 下一页游标或 None}；关键词不存在时为空页
+
+    Raises:
+        ValueError: 排序字段或游标非法
+    """
+    if sort not in NOTE_SORTS:
+        raise ValueError(f"unsupported sort field: {sort}")
+    after = decode_cursor(cursor, sort)
+    async with get_db_session() as session:
+        keyword_id = None
+        if keyword:
+            keyword_id = await _resolve_id(session, Keyword.keyword, Keyword.id, keyword, "keywords")
+            if keyword_id is None:
+                return {"notes": [], "next_cursor": None}
+
+        key = ("notes", keyword_id, author_id, min_likes, start_time, end_time, sort, cursor, limit)
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+        tags = {"notes"} if keyword_id is None else {f"notes:{keyword_id}"}
+        generation = _cache.generation(tags)
+
+        rows = await NoteCRUD.keyset_page(
+            session,
+            keyword_id=keyword_id,
+            author_id=author_id,
+            min_like_count=min_likes,
+            start_time=start_time,
+            end_time=end_time,
+            order_by=sort,
+            after=after,
+            limit=limit + 1,
+        )
+    page = _page(rows, limit, sort, note_to_dict, "notes")
+    _cache.put(key, page, tags, generation)
+    return page
+
+
+async def list_comments(
+    note_id: str,
+    sort: str = "like_count",
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> Optional[Dict[str, Any]]:
+    """
+    分页查询笔记的已入库评论（按 sort 降序）
+
+    Returns:
+        Optional[dict]: {"comments": 当前页, "next_cursor": 下一页游标或 None}；笔记不存在返回 None
+
+    Raises:
+        ValueError: 排序字段或游标非法
+    """
+    if sort not in COMMENT_SORTS:
+        raise ValueError(f"unsupported sort field: {sort}")
+    after = decode_cursor(cursor, sort)
+    async with get_db_session() as session:
+        note_pk = await _resolve_id(session, Note.note_id, Note.id, note_id, "note-ids")
+        if note_pk is None:
+            return None
+
+        key = ("comments", note_pk, sort, cursor, limit)
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+        tags = {f"comments:{note_pk}"}
+        generation = _cache.generation(tags)
+
+        rows = await CommentCRUD.keyset_by_note_id(session, note_pk, order_by=sort, after=after, limit=limit + 1)
+    page = _page(rows, limit, sort, comment_to_dict, "comments")
+    _cache.put(key, page, tags, generation)
+    return page
+
+
+def _page(rows: List[Any], limit: int, sort: str, to_dict, name: str) -> Dict[str, Any]:
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, getattr(last, sort), last.id)
+    return {name: [to_dict(row) for row in rows], "next_cursor": next_cursor}
+
+
+__all__ = [
+    "QueryCache",
+    "get_query_cache",
+    "list_notes",
+    "list_comments",
+    "register_cache_invalidation",
+    "encode_cursor",
+    "decode_cursor",
+    "NOTE_SORTS",
+    "COMMENT_SORTS",
+]
@@ -0,0 +1,171 @@
+"""
+爬取结果查询：分页、字段投影与排序
+
+结果整体保存在任务存储中，这里只对单页数据做投影拷贝，
+保证每次响应的序列化量受 limit 约束（接口默认 DEFAULT_PAGE_SIZE 条），而不是整个关键词的全部笔记。
+各排序字段的顺序在结果写入存储时由 build_sort_orders 计算一次，查询时只按下标取页。
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+NOTE_FIELDS = {
+    "note_id",
+    "title",
+    "desc",
+    "liked",
+    "collected",
+    "commented",
+    "publish_time",
+    "images",
+    "note_type",
+    "comments",
+    "image_keys",
+    "cover_key",
+    "image_variants",
+}
+SORTABLE_FIELDS = {"liked", "collected", "commented", "publish_time"}
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Set[str]]:
+    """
+    解析字段投影：``title,liked`` 只返回指定字段，``-comments,-images`` 排除指定字段；
+    note_id 始终返回。None/空串表示返回全部字段。
+
+    Raises:
+        ValueError: 未知字段或混用包含/排除写法
+    """
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    excludes = {n[1:] for n in names if n.startswith("-")}
+    includes = {n for n in names if not n.startswith("-")}
+    if excludes and includes:
+        raise ValueError("fields cannot mix included and excluded names")
+    unknown = (excludes | includes) - NOTE_FIELDS
+    if unknown:
+        raise ValueError(f"unknown fields: {sorted(unknown)}")
+    selected = includes if includes else NOTE_FIELDS - excludes
+    return selected | {"note_id"}
+
+
+def parse_sort(sort: Optional[str]) -> Optional[Tuple[str, bool]]:
+    """
+    解析排序：``-liked`` 降序，``publish_time`` 升序；返回 (字段, 是否降序)
+
+    Raises:
+        ValueError: 不支持的排序字段
+    """
+    if not sort:
+        return None
+    descending = sort.startswith("-")
+    field = sort.lstrip("-+")
+    if field not in SORTABLE_FIELDS:
+        raise ValueError(f"unsupported sort field: {field}")
+    return field, descending
+
+
+def parse_cursor(cursor: Optional[str]) -> int:
+    """
+    游标即下一页起始偏移量
+
+    Raises:
+        ValueError: 非法游标
+    """
+    if not cursor:
+        return 0
+    offset = int(cursor)
+    if offset < 0:
+        raise ValueError("cursor must be non-negative")
+    return offset
+
+
+def _sort_key(value: Any) -> Any:
+    # publish_time 可能混有带/不带时区的 datetime，统一转时间戳比较
+    return value.timestamp() if isinstance(value, datetime) else value
+
+
+def _sort_notes(notes: List[Dict[str, Any]], field: str, descending: bool) -> List[Dict[str, Any]]:
+    present = [n for n in notes if n.get(field) is not None]
+    missing = [n for n in notes if n.get(field) is None]
+    # 缺失值始终排在最后
+    return sorted(present, key=lambda n: _sort_key(n[field]), reverse=descending) + missing
+
+
+def build_sort_orders(notes: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """
+    预先计算每个可排序字段的升序/降序下标序列，随结果一起存储
+
+    Returns:
+        dict: {"liked": [下标...], "-liked": [下标...], ...}
+    """
+    orders: Dict[str, List[int]] = {}
+    for field in SORTABLE_FIELDS:
+        present = [i for i, n in enumerate(notes) if n.get(field) is not None]
+        missing = [i for i, n in enumerate(notes) if n.get(field) is None]
+        for descending in (False, True):
+            key = f"-{field}" if descending else field
+            # 与 _sort_notes 一致：缺失值始终排在最后
+            orders[key] = sorted(present, key=lambda i: _sort_key(notes[i][field]), reverse=descending) + missing
+    return orders
+
+
+def query_notes(
+    notes: List[Dict[str, Any]],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    sort: Optional[str] = None,
+    orders: Optional[Dict[str, List[int]]] = None,
+) -> Dict[str, Any]:
+    """
+    对已存储的笔记列表分页查询
+
+    Args:
+        notes: 关键词的全部笔记（只读）
+        cursor: 上一页返回的 next_cursor
+        limit: 每页条数（上限 MAX_PAGE_SIZE）；None 返回游标之后的全部笔记
+        fields: 字段投影，见 parse_fields
+        sort: 排序，见 parse_sort；不传则保持存储顺序（评论数降序）
+        orders: build_sort_orders 的预计算结果；缺失时现场排序（兼容旧数据）
+
+    Returns:
+        dict: {"notes": 当前页, "next_cursor": 下一页游标或 None, "total": 总数}
+
+    Raises:
+        ValueError: 参数非法
+    """
+    offset = parse_cursor(cursor)
+    end = len(notes) if limit is None else offset + max(1, min(limit, MAX_PAGE_SIZE))
+    selected = parse_fields(fields)
+    order = parse_sort(sort)
+
+    if order is None:
+        page = notes[offset:end]
+    elif orders and sort.lstrip("+") in orders:
+        page = [notes[i] for i in orders[sort.lstrip("+")][offset:end]]
+    else:
+        page = _sort_notes(notes, *order)[offset:end]
+    if selected is not None:
+        page = [{k: v for k, v in n.items() if k in selected} for n in page]
+    return {
+        "notes": page,
+        "next_cursor": str(end) if end < len(notes) else None,
+        "total": len(notes),
+    }
+
+
+__all__ = [
+    "NOTE_FIELDS",
+    "SORTABLE_FIELDS",
+    "DEFAULT_PAGE_SIZE",
+    "MAX_PAGE_SIZE",
+    "build_sort_orders",
+    "query_notes",
+    "parse_fields",
+    "parse_sort",
+]
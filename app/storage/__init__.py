@@ -2,6 +2,23 @@
 对象存储模块
 """
 
+from .base import StorageBackend, create_storage, get_storage
+from .dedup import ContentIndex
+from .local import LocalStorage
 from .minio_client import AsyncMinioClient
+from .phash import PerceptualIndex
+from .s3 import S3Client, S3Error
+from .writeback import WriteBackStorage
 
-__all__ = ["AsyncMinioClient"]
\ No newline at end of file
+__all__ = [
+    "AsyncMinioClient",
+    "ContentIndex",
+    "LocalStorage",
+    "PerceptualIndex",
+    "S3Client",
+    "S3Error",
+    "StorageBackend",
+    "WriteBackStorage",
+    "create_storage",
+    "get_storage",
+]
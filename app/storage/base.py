@@ -0,0 +1,211 @@
+"""
+存储后端抽象：MinIO（AsyncMinioClient）、本地磁盘（LocalStorage）与写回缓存（WriteBackStorage）提供相同的上传/URL 接口，
+由 STORAGE_BACKEND 选择
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, List, Optional, Union
+
+from loguru import logger
+
+from .mime import SNIFF_BYTES, extension_for, guess_content_type
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+def _normalize_item(item) -> tuple:
+    """上传项统一为 (数据或文件路径, 对象名, 内容类型)"""
+    if isinstance(item, dict):
+        return item["source"], item.get("object_name"), item.get("content_type")
+    if isinstance(item, tuple):
+        source, object_name, *rest = item
+        return source, object_name, rest[0] if rest else None
+    return item, None, None
+
+
+class StorageBackend(ABC):
+    """
+    对象存储后端接口
+    """
+
+    # 内容寻址：对象名由内容摘要派生，重复内容不再写入
+    content_addressed: bool = False
+    # 内容寻址统计（ContentIndex），未启用时可为 None
+    index = None
+
+    @abstractmethod
+    async def check_and_create_bucket(self) -> bool:
+        """确保存储位置（存储桶/根目录）存在"""
+
+    @abstractmethod
+    async def upload_file(
+        self, file_path: str, object_name: Optional[str] = None, content_type: Optional[str] = None
+    ) -> str:
+        """上传本地文件，返回对象名（未给内容类型时按文件识别）"""
+
+    @abstractmethod
+    async def upload_bytes(self, data: BytesLike, object_name: str, content_type: Optional[str] = None) -> str:
+        """上传内存数据，返回对象名"""
+
+    @abstractmethod
+    async def upload_stream(
+        self,
+        stream: Union[BytesLike, AsyncIterable[bytes]],
+        object_name: str,
+        content_type: Optional[str] = None,
+        length: Optional[int] = None,
+        part_size: Optional[int] = None,
+    ) -> str:
+        """流式上传，返回对象名"""
+
+    @abstractmethod
+    async def upload_content(
+        self,
+        source: Union[str, Path, BytesLike, AsyncIterable[bytes]],
+        prefix: str = "",
+        content_type: Optional[str] = None,
+    ) -> str:
+        """内容寻址上传，返回对象名（内容已存在时为已有对象名）"""
+
+    @abstractmethod
+    async def object_exists(self, object_name: str) -> bool:
+        """检查对象是否存在"""
+
+    @abstractmethod
+    async def get_file_url(self, object_name: str, expires: int = 7 * 24 * 60 * 60) -> str:
+        """带有效期的访问 URL"""
+
+    @abstractmethod
+    async def get_file_urls(self, object_names: Iterable[str], expires: int = 7 * 24 * 60 * 60) -> Dict[str, str]:
+        """批量获取访问 URL：{对象名: URL}"""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """释放资源"""
+
+    async def upload_many(
+        self,
+        items: Iterable[Union[str, Path, tuple, Dict[str, Any]]],
+        concurrency: Optional[int] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        批量上传：单项失败不影响其余项，按完成顺序回调进度
+
+        Args:
+            items: 上传项，每项为本地文件路径、(数据或文件路径, 对象名[, 内容类型]) 元组，
+                或 {"source", "object_name", "content_type"} 字典；数据项未给对象名时自动生成
+            concurrency (Optional[int]): 本批次同时上传数，默认读取 MINIO_UPLOAD_CONCURRENCY；
+                MinIO 后端同时受进程级上传并发上限约束
+            on_progress: 每完成一项调用一次（普通函数或协程函数），参数为
+                {"done", "failed", "total", "bytes", "elapsed", "objects_per_sec", "bytes_per_sec", "item"}
+
+        Returns:
+            List[Dict[str, Any]]: 与 items 一一对应的结果
+                {"index", "object_name", "ok", "bytes", "error", "elapsed"}
+        """
+        entries = [_normalize_item(item) for item in items]
+        sem = asyncio.Semaphore(concurrency or int(os.getenv("MINIO_UPLOAD_CONCURRENCY", "16")))
+        results: List[Optional[Dict[str, Any]]] = [None] * len(entries)
+        progress = {"done": 0, "failed": 0, "total": len(entries), "bytes": 0}
+        started = time.monotonic()
+
+        async def run(index: int, source, object_name: Optional[str], content_type: Optional[str]) -> None:
+            async with sem:
+                item_started = time.monotonic()
+                result = {"index": index, "object_name": None, "ok": False, "bytes": 0, "error": None}
+                try:
+                    if isinstance(source, (str, Path)):
+                        result["bytes"] = (await asyncio.to_thread(os.stat, source)).st_size
+                        result["object_name"] = await self.upload_file(str(source), object_name)
+                    else:
+                        result["bytes"] = memoryview(source).nbytes
+                        if object_name is None and self.content_addressed:
+                            result["object_name"] = await self.upload_content(source, content_type=content_type)
+                        else:
+                            if object_name is None:
+                                head = memoryview(source).cast("B")[:SNIFF_BYTES].tobytes()
+                                object_name = f"{uuid.uuid4().hex}{extension_for(content_type or guess_content_type('', head))}"
+                            result["object_name"] = await self.upload_bytes(source, object_name, content_type)
+                    result["ok"] = True
+                except Exception as e:  # pylint: disable=broad-except
+                    result["error"] = str(e) or type(e).__name__
+                result["elapsed"] = time.monotonic() - item_started
+
+            results[index] = result
+            progress["done"] += 1
+            if result["ok"]:
+                progress["bytes"] += result["bytes"]
+            else:
+                progress["failed"] += 1
+            if on_progress is not None:
+                elapsed = time.monotonic() - started
+                snapshot = {
+                    **progress,
+                    "elapsed": elapsed,
+                    "objects_per_sec": progress["done"] / elapsed if elapsed > 0 else 0.0,
+                    "bytes_per_sec": progress["bytes"] / elapsed if elapsed > 0 else 0.0,
+                    "item": result,
+                }
+                try:
+                    ret = on_progress(snapshot)
+                    if asyncio.iscoroutine(ret):
+                        await ret
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.warning("upload progress callback failed: {}", e)
+
+        await asyncio.gather(*(run(i, *entry) for i, entry in enumerate(entries)))
+        logger.info(
+            "Bulk upload finished: {}/{} ok, {} bytes in {:.2f}s",
+            progress["done"] - progress["failed"],
+            progress["total"],
+            progress["bytes"],
+            time.monotonic() - started,
+        )
+        return results
+
+
+def create_storage() -> StorageBackend:
+    """
+    按 STORAGE_BACKEND 创建存储后端：minio（默认）、local 或 writeback（本地写回缓存 + MinIO）
+
+    Raises:
+        ValueError: 未知的后端
+    """
+    backend = os.getenv("STORAGE_BACKEND", "minio").lower()
+    if backend == "minio":
+        from .minio_client import AsyncMinioClient
+
+        return AsyncMinioClient()
+    if backend == "local":
+        from .local import LocalStorage
+
+        return LocalStorage()
+    if backend == "writeback":
+        from .writeback import WriteBackStorage
+
+        return WriteBackStorage()
+    raise ValueError(f"unsupported STORAGE_BACKEND: {backend}")
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """
+    进程内共享的存储后端（create_storage 创建一次）：媒体流水线与文件访问路由共用同一连接池与写回缓存
+    """
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
+
+
+__all__ = ["StorageBackend", "create_storage", "get_storage"]
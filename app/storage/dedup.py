@@ -0,0 +1,155 @@
+"""
+内容寻址去重：对象名由内容的 SHA-256 派生，相同内容只上传一次
+
+- 对象名：{prefix}/{sha256 前两位}/{sha256}{扩展名}
+- 存在性检查三级：进程内 LRU → 本地持久索引（SQLite，MINIO_INDEX_PATH）→ MinIO stat_object
+- 同一摘要并发上传时只有一个真正上传，其余等待其结果
+- 统计上传数、跳过数与跳过的字节数，duplicate_rate 为跳过数占比
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from loguru import logger
+
+
+def content_key(digest: str, extension: str = "", prefix: str = "") -> str:
+    """按内容摘要生成对象名"""
+    name = f"{digest[:2]}/{digest}{extension}"
+    return f"{prefix.strip('/')}/{name}" if prefix else name
+
+
+class ContentIndex:
+    """
+    摘要 → 对象名 索引：LRU 缓存热点摘要，SQLite 持久化全部已知摘要（进程重启后仍可跳过）
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None) -> None:
+        """
+        Args:
+            path: 持久索引文件，默认读取 MINIO_INDEX_PATH（默认 data/media_index.db）；空字符串表示不持久化
+            max_entries: LRU 容量，默认读取 MINIO_INDEX_CACHE（默认 100000）
+        """
+        if path is None:
+            path = os.getenv("MINIO_INDEX_PATH", os.path.join("data", "media_index.db"))
+        self.path = path
+        self.max_entries = max_entries or int(os.getenv("MINIO_INDEX_CACHE", "100000"))
+        self._lru: "OrderedDict[str, str]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"uploaded": 0, "skipped": 0, "bytes_uploaded": 0, "bytes_skipped": 0}
+
+    @property
+    def duplicate_rate(self) -> float:
+        total = self.stats["uploaded"] + self.stats["skipped"]
+        return self.stats["skipped"] / total if total else 0.0
+
+    def report(self) -> Dict[str, float]:
+        return {**self.stats, "duplicate_rate": round(self.duplicate_rate, 4)}
+
+    # ---------- 持久索引 ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                "digest TEXT PRIMARY KEY, object_name TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db = db
+        return self._db
+
+    def _db_get(self, digest: str) -> Optional[str]:
+        with self._db_lock:
+            row = self._connect().execute("SELECT object_name FROM objects WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def _db_put(self, digest: str, object_name: str, size: int) -> None:
+        with self._db_lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO objects (digest, object_name, size, created_at) VALUES (?, ?, ?, ?)",
+                (digest, object_name, size, time.time()),
+            )
+
+    # ---------- 查询与登记 ----------
+
+    def _remember(self, digest: str, object_name: str) -> None:
+        self._lru[digest] = object_name
+        self._lru.move_to_end(digest)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    async def lookup(self, digest: str) -> Optional[str]:
+        """查询已知摘要对应的对象名（LRU → 持久索引），未知返回 None"""
+        object_name = self._lru.get(digest)
+        if object_name is not None:
+            self._lru.move_to_end(digest)
+            return object_name
+        if not self.path:
+            return None
+        try:
+            object_name = await asyncio.to_thread(self._db_get, digest)
+        except sqlite3.Error as exc:
+            logger.warning("media index lookup failed: {}", exc)
+            return None
+        if object_name is not None:
+            self._remember(digest, object_name)
+        return object_name
+
+    async def add(self, digest: str, object_name: str, size: int) -> None:
+        self._remember(digest, object_name)
+        if not self.path:
+            return
+        try:
+            await asyncio.to_thread(self._db_put, digest, object_name, size)
+        except sqlite3.Error as exc:
+            logger.warning("media index write failed: {}", exc)
+
+    def record(self, size: int, skipped: bool) -> None:
+        if skipped:
+            self.stats["skipped"] += 1
+            self.stats["bytes_skipped"] += size
+        else:
+            self.stats["uploaded"] += 1
+            self.stats["bytes_uploaded"] += size
+
+    def claim(self, digest: str) -> Optional[asyncio.Future]:
+        """
+        登记正在上传的摘要：已有上传进行中时返回其 Future（调用方等待即可），否则返回 None 并占位
+        """
+        pending = self._inflight.get(digest)
+        if pending is not None:
+            return pending
+        self._inflight[digest] = asyncio.get_running_loop().create_future()
+        return None
+
+    def release(self, digest: str, object_name: Optional[str] = None, error: Optional[BaseException] = None) -> None:
+        future = self._inflight.pop(digest, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            # 等待方可能已取消，避免 "exception was never retrieved" 警告
+            future.exception()
+        else:
+            future.set_result(object_name)
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+                self._db = None
+
+
+__all__ = ["ContentIndex", "content_key"]
@@ -0,0 +1,401 @@
+"""
+本地磁盘存储后端：单机部署与测试时代替 MinIO，接口与 AsyncMinioClient 相同
+
+- 目录分片：{根目录}/{sha1(对象名)前两位}/{次两位}/{对象名}，单个目录下的文件数保持在可控范围
+- 原子写入：先写 {根目录}/.tmp 下的临时文件，完成后 os.replace 到目标路径，读取方不会看到半个文件
+- 本地文件上传用 shutil.copyfile（Linux 下走 sendfile/copy_file_range，数据不经用户态）
+- get_file_url 返回带有效期与 HMAC 签名的 /api/storage/... 地址，签名复用 PresignCache 的分桶缓存；
+  响应由服务器直接发送文件（支持 http.response.pathsend 的 ASGI 服务器）或交给 nginx（X-Accel-Redirect）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterable, Dict, Iterable, Optional, Union
+from urllib.parse import quote
+
+from loguru import logger
+
+from .base import BytesLike, StorageBackend
+from .dedup import ContentIndex, content_key
+from .mime import SNIFF_BYTES, extension_for, guess_content_type
+from .presign import PresignCache
+
+# 流式写入时攒够该大小再落盘，减少线程切换
+WRITE_BUFFER_SIZE = 1024 * 1024
+# 超过该时长的临时文件视为中断遗留
+TMP_MAX_AGE = 24 * 60 * 60
+
+
+class LocalStorage(StorageBackend):
+    """
+    本地磁盘存储
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        base_url: Optional[str] = None,
+        secret: Optional[str] = None,
+        fsync: Optional[bool] = None,
+    ) -> None:
+        """
+        Args:
+            root: 根目录，默认读取 STORAGE_LOCAL_ROOT（默认 data/storage）
+            base_url: 访问地址前缀，默认读取 STORAGE_LOCAL_BASE_URL（默认 http://localhost:{API_PORT}）
+            secret: URL 签名密钥，默认读取 STORAGE_LOCAL_SECRET；未配置时在根目录生成并保存（多个 worker 共用）
+            fsync: 写入后是否 fsync，默认读取 STORAGE_LOCAL_FSYNC（默认 false）
+        """
+        self.root = Path(root or os.getenv("STORAGE_LOCAL_ROOT", os.path.join("data", "storage")))
+        self.base_url = (
+            base_url or os.getenv("STORAGE_LOCAL_BASE_URL") or f"http://localhost:{os.getenv('API_PORT', '8000')}"
+        ).rstrip("/")
+        self._secret = (secret or os.getenv("STORAGE_LOCAL_SECRET", "")).encode("utf-8") or None
+        self.fsync = fsync if fsync is not None else os.getenv("STORAGE_LOCAL_FSYNC", "false").lower() == "true"
+        self.content_addressed = os.getenv("MINIO_CONTENT_ADDRESSED", "false").lower() == "true"
+        # 本地 stat 足够便宜，索引只用于统计
+        self.index = ContentIndex(path="")
+        self.url_cache = PresignCache()
+        self._tmp_dir = self.root / ".tmp"
+
+        logger.info("Local storage initialized: root={}", self.root)
+
+    # ============================================
+    # 路径与签名
+    # ============================================
+
+    def object_path(self, object_name: str) -> Path:
+        """
+        对象名 -> 文件路径
+
+        Raises:
+            ValueError: 对象名为空、是绝对路径或包含 ".."
+        """
+        parts = object_name.split("/")
+        if not object_name or object_name.startswith("/") or "\x00" in object_name or any(
+            p in ("", ".", "..") for p in parts
+        ):
+            raise ValueError(f"invalid object name: {object_name!r}")
+        shard = hashlib.sha1(object_name.encode("utf-8")).hexdigest()
+        return self.root.joinpath(shard[:2], shard[2:4], *parts)
+
+    def _load_secret(self) -> bytes:
+        if self._secret is None:
+            path = self.root / ".secret"
+            if not path.exists():
+                # 写完整后再用硬链接发布，多个进程同时生成时只有一个生效，读取方不会读到空文件
+                f, tmp = self._open_tmp()
+                with f:
+                    f.write(os.urandom(32).hex().encode("ascii"))
+                try:
+                    os.link(tmp, path)
+                except FileExistsError:
+                    pass
+                finally:
+                    _unlink(tmp)
+            self._secret = path.read_bytes().strip()
+        return self._secret
+
+    def signature(self, object_name: str, expires_at: int) -> str:
+        message = f"{object_name}\n{expires_at}".encode("utf-8")
+        return hmac.new(self._load_secret(), message, hashlib.sha256).hexdigest()
+
+    def verify(self, object_name: str, expires_at: int, signature: str) -> bool:
+        """校验访问 URL 的签名与有效期"""
+        if expires_at < time.time():
+            return False
+        return hmac.compare_digest(self.signature(object_name, expires_at), signature)
+
+    def _sign(self, object_name: str, expires: int, signed_at: Optional[datetime]) -> str:
+        start = signed_at.timestamp() if signed_at is not None else time.time()
+        expires_at = int(start) + expires
+        return (
+            f"{self.base_url}/api/storage/{quote(object_name)}"
+            f"?expires={expires_at}&signature={self.signature(object_name, expires_at)}"
+        )
+
+    # ============================================
+    # 写入
+    # ============================================
+
+    def _open_tmp(self):
+        self._tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self._tmp_dir)
+        return os.fdopen(fd, "wb"), tmp
+
+    def _commit(self, f, tmp: str, path: Path) -> None:
+        """关闭临时文件并原子替换到目标路径"""
+        try:
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+            f.close()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, path)
+        except BaseException:
+            f.close()
+            _unlink(tmp)
+            raise
+
+    def _write_bytes(self, view: memoryview, path: Path) -> None:
+        f, tmp = self._open_tmp()
+        try:
+            f.write(view)
+        except BaseException:
+            f.close()
+            _unlink(tmp)
+            raise
+        self._commit(f, tmp, path)
+
+    def _copy_file(self, file_path: str, path: Path) -> None:
+        f, tmp = self._open_tmp()
+        f.close()
+        try:
+            shutil.copyfile(file_path, tmp)
+            self._commit(open(tmp, "rb"), tmp, path)
+        except BaseException:
+            _unlink(tmp)
+            raise
+
+    async def _write_stream(self, stream: AsyncIterable[bytes], digest=None):
+        """把异步流写入临时文件（可同时计算摘要），返回 (文件对象, 临时路径, 大小, 文件头)"""
+        f, tmp = await asyncio.to_thread(self._open_tmp)
+        size = 0
+        head = b""
+        buffer = bytearray()
+        try:
+            async for chunk in stream:
+                if size < SNIFF_BYTES:
+                    head = (head + chunk)[:SNIFF_BYTES]
+                if digest is not None:
+                    digest.update(chunk)
+                size += len(chunk)
+                if len(chunk) >= WRITE_BUFFER_SIZE:
+                    # 大块直接落盘，不再复制进缓冲区
+                    if buffer:
+                        await asyncio.to_thread(f.write, bytes(buffer))
+                        buffer.clear()
+                    await asyncio.to_thread(f.write, chunk)
+                    continue
+                buffer += chunk
+                if len(buffer) >= WRITE_BUFFER_SIZE:
+                    await asyncio.to_thread(f.write, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(f.write, bytes(buffer))
+        except BaseException:
+            f.close()
+            _unlink(tmp)
+            raise
+        return f, tmp, size, head
+
+    # ============================================
+    # 存储后端接口
+    # ============================================
+
+    async def check_and_create_bucket(self) -> bool:
+        """
+        确保根目录存在，并清理进程中断遗留的临时文件（超过1天）
+
+        Raises:
+            OSError: 无法创建目录
+        """
+        await asyncio.to_thread(self._prepare)
+        return True
+
+    def _prepare(self) -> None:
+        self._tmp_dir.mkdir(parents=True, exist_ok=True)
+        cutoff = time.time() - TMP_MAX_AGE
+        for entry in os.scandir(self._tmp_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    async def upload_file(
+        self, file_path: str, object_name: Optional[str] = None, content_type: Optional[str] = None
+    ) -> str:
+        """
+        复制本地文件到存储目录（content_type 仅为接口兼容）
+
+        Raises:
+            FileNotFoundError: 本地文件不存在
+            OSError: 写入失败
+        """
+        if object_name is None and self.content_addressed:
+            return await self.upload_content(file_path)
+        if object_name is None:
+            object_name = f"{uuid.uuid4().hex}{Path(file_path).suffix}"
+        try:
+            await asyncio.to_thread(self._copy_file, file_path, self.object_path(object_name))
+            logger.info("File stored successfully: {} -> {}", file_path, object_name)
+            return object_name
+        except Exception as e:
+            logger.error("Failed to store file {}: {}", file_path, e)
+            raise
+
+    async def upload_bytes(self, data: BytesLike, object_name: str, content_type: Optional[str] = None) -> str:
+        """
+        写入内存数据（content_type 仅为接口兼容，读取时按扩展名识别）
+
+        Raises:
+            OSError: 写入失败
+        """
+        view = memoryview(data).cast("B")
+        try:
+            await asyncio.to_thread(self._write_bytes, view, self.object_path(object_name))
+            logger.info("Bytes stored successfully: {} bytes -> {}", len(view), object_name)
+            return object_name
+        except Exception as e:
+            logger.error("Failed to store object {}: {}", object_name, e)
+            raise
+
+    async def upload_stream(
+        self,
+        stream: Union[BytesLike, AsyncIterable[bytes]],
+        object_name: str,
+        content_type: Optional[str] = None,
+        length: Optional[int] = None,
+        part_size: Optional[int] = None,
+    ) -> str:
+        """
+        边读边写临时文件，完成后原子替换
+
+        Raises:
+            OSError: 写入失败
+            Exception: 迭代器本身抛出的异常（临时文件随之删除）
+        """
+        if isinstance(stream, (bytes, bytearray, memoryview)):
+            return await self.upload_bytes(stream, object_name, content_type)
+        try:
+            path = self.object_path(object_name)
+            f, tmp, size, _ = await self._write_stream(stream)
+            await asyncio.to_thread(self._commit, f, tmp, path)
+            logger.info("Stream stored successfully: {} bytes -> {}", size, object_name)
+            return object_name
+        except Exception as e:
+            logger.error("Failed to store stream {}: {}", object_name, e)
+            raise
+
+    async def upload_content(
+        self,
+        source: Union[str, Path, BytesLike, AsyncIterable[bytes]],
+        prefix: str = "",
+        content_type: Optional[str] = None,
+    ) -> str:
+        """
+        内容寻址写入：边写临时文件边算摘要，目标已存在时丢弃临时文件
+
+        Returns:
+            str: 对象名称（{prefix}/{摘要前两位}/{摘要}{扩展名}）
+
+        Raises:
+            OSError: 写入失败
+        """
+        digest = hashlib.sha256()
+        fallback_name = ""
+        if isinstance(source, (str, Path)):
+            fallback_name = str(source)
+            source = _iter_path(fallback_name)
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            source = _iter_once(memoryview(source).cast("B"))
+        try:
+            f, tmp, size, head = await self._write_stream(source, digest)
+            try:
+                if content_type is None:
+                    content_type = guess_content_type(fallback_name, head)
+                extension = extension_for(content_type) or Path(fallback_name).suffix
+                key = digest.hexdigest()
+                object_name = content_key(key, extension, prefix)
+                path = self.object_path(object_name)
+                # 同一内容正在由其他协程写入时等待其完成；对方失败则自己写
+                duplicate = False
+                pending = self.index.claim(key)
+                if pending is not None:
+                    try:
+                        await asyncio.shield(pending)
+                        duplicate = True
+                    except Exception:  # pylint: disable=broad-except
+                        pass
+                try:
+                    if duplicate or await asyncio.to_thread(path.is_file):
+                        f.close()
+                        await asyncio.to_thread(_unlink, tmp)
+                        self.index.record(size, skipped=True)
+                        logger.debug("Duplicate content skipped: {}", object_name)
+                    else:
+                        await asyncio.to_thread(self._commit, f, tmp, path)
+                        self.index.record(size, skipped=False)
+                        logger.info("Content stored successfully: {} bytes -> {}", size, object_name)
+                except BaseException as e:
+                    if pending is None:
+                        self.index.release(key, error=e)
+                    raise
+                if pending is None:
+                    self.index.release(key, object_name)
+                return object_name
+            except BaseException:
+                f.close()
+                _unlink(tmp)
+                raise
+        except Exception as e:
+            logger.error("Failed to store content: {}", e)
+            raise
+
+    async def object_exists(self, object_name: str) -> bool:
+        return await asyncio.to_thread(self.object_path(object_name).is_file)
+
+    async def get_file_url(self, object_name: str, expires: int = 7*24*60*60) -> str:
+        """带有效期与签名的访问 URL（由 /api/storage 路由校验后返回文件）"""
+        return (await self.url_cache.get_many([object_name], expires, self._sign))[object_name]
+
+    async def get_file_urls(self, object_names: Iterable[str], expires: int = 7*24*60*60) -> Dict[str, str]:
+        return await self.url_cache.get_many(object_names, expires, self._sign)
+
+    async def close(self) -> None:
+        self.index.close()
+        logger.info("Local storage closed")
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def _iter_once(view: memoryview):
+    yield view
+
+
+async def _iter_path(file_path: str, chunk_size: int = WRITE_BUFFER_SIZE):
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+_local_storage: Optional[LocalStorage] = None
+
+
+def get_local_storage() -> LocalStorage:
+    """进程级本地存储实例（供 /api/storage 路由校验签名、定位文件）"""
+    global _local_storage
+    if _local_storage is None:
+        _local_storage = LocalStorage()
+    return _local_storage
+
+
+__all__ = ["LocalStorage", "get_local_storage"]
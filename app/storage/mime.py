@@ -0,0 +1,75 @@
+"""
+内容类型识别：优先按文件头魔数，其次按对象名扩展名
+"""
+
+from __future__ import annotations
+
+import mimetypes
+from typing import Optional
+
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+
+# 识别所需的最少文件头字节数
+SNIFF_BYTES = 32
+
+# mimetypes 对这些类型给出的扩展名不常用，固定映射
+_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/avif": ".avif",
+    "image/heic": ".heic",
+    "video/mp4": ".mp4",
+    "video/quicktime": ".mov",
+}
+
+
+def sniff_mime(head: bytes) -> Optional[str]:
+    """
+    按文件头魔数识别常见图片/视频类型，无法识别返回 None
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"avif", b"avis"):
+            return "image/avif"
+        if brand in (b"heic", b"heix", b"mif1", b"msf1"):
+            return "image/heic"
+        if brand == b"qt  ":
+            return "video/quicktime"
+        if brand in (b"isom", b"iso2", b"mp41", b"mp42", b"avc1", b"M4V "):
+            return "video/mp4"
+    return None
+
+
+def guess_content_type(object_name: str = "", head: bytes = b"") -> str:
+    """
+    推断上传对象的 Content-Type：文件头 > 扩展名 > application/octet-stream
+    """
+    sniffed = sniff_mime(head) if head else None
+    if sniffed:
+        return sniffed
+    guessed, _ = mimetypes.guess_type(object_name)
+    return guessed or DEFAULT_CONTENT_TYPE
+
+
+def extension_for(content_type: str) -> str:
+    """
+    内容类型对应的扩展名（含点），未知类型返回空字符串
+    """
+    if content_type in _EXTENSIONS:
+        return _EXTENSIONS[content_type]
+    if content_type == DEFAULT_CONTENT_TYPE:
+        return ""
+    return mimetypes.guess_extension(content_type) or ""
+
+
+__all__ = ["sniff_mime", "guess_content_type", "extension_for", "DEFAULT_CONTENT_TYPE", "SNIFF_BYTES"]
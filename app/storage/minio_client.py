@@ -1,18 +1,26 @@
 """
 异步MinIO存储工具模块
 提供图片/视频等文件的异步上传和管理功能
+
+底层为原生 asyncio S3 客户端（app/storage/s3.py，aiohttp + SigV4），
+并发只受连接池上限 MINIO_MAX_CONNECTIONS 限制，不再经由线程池
 """
+import hashlib
 import os
+import tempfile
 import uuid
-from datetime import timedelta
-from typing import Optional
+from typing import AsyncIterable, AsyncIterator, BinaryIO, Dict, Iterable, Optional, Union
 from pathlib import Path
 
 from dotenv import load_dotenv
-from minio import Minio
-from minio.error import S3Error
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+
+from .base import StorageBackend
+from .dedup import ContentIndex, content_key
+from .mime import SNIFF_BYTES, extension_for, guess_content_type
+from .multipart import MIN_PART_SIZE, MultipartUploader
+from .presign import PresignCache
+from .s3 import S3Client, S3Error
 
 try:
     from loguru import logger
@@ -23,8 +31,73 @@ except ImportError:
 # 加载环境变量
 load_dotenv()
 
+# 计算摘要时的读块大小
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _hash_file(file_path: str):
+    """流式计算文件 SHA-256，返回 (摘要, 大小, 文件头)"""
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            if size < SNIFF_BYTES:
+                head = (head + chunk)[:SNIFF_BYTES]
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size, head
+
+
+_upload_slots: Optional[asyncio.Semaphore] = None
+_upload_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def upload_slots() -> asyncio.Semaphore:
+    """
+    进程级上传并发上限（MINIO_UPLOAD_CONCURRENCY，按对象计），所有客户端实例与调用方共享，避免压垮 MinIO 节点
+    """
+    global _upload_slots, _upload_slots_loop
+    loop = asyncio.get_running_loop()
+    if _upload_slots is None or _upload_slots_loop is not loop:
+        _upload_slots = asyncio.Semaphore(int(os.getenv("MINIO_UPLOAD_CONCURRENCY", "16")))
+        _upload_slots_loop = loop
+    return _upload_slots
+
+
+async def _iter_file(f: BinaryIO, chunk_size: int = HASH_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """按块读取文件对象（读盘在线程中进行）"""
+    while True:
+        chunk = await asyncio.to_thread(f.read, chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def _next_chunk(chunks: AsyncIterator[bytes]) -> bytes:
+    """取下一块数据，流已结束返回空字节串"""
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return b""
+
+
+async def _iter_parts(stream: AsyncIterable[bytes], part_size: int) -> AsyncIterator[bytes]:
+    """把异步字节流重新切分为 part_size 大小的块（最后一块可能更小）"""
+    buffer = bytearray()
+    async for chunk in stream:
+        buffer.extend(chunk)
+        while len(buffer) >= part_size:
+            yield bytes(buffer[:part_size])
+            del buffer[:part_size]
+    if buffer:
+        yield bytes(buffer)
 
-class AsyncMinioClient:
+
+class AsyncMinioClient(StorageBackend):
     """
     异步MinIO客户端
     提供文件上传、下载、删除等操作的异步接口
@@ -38,38 +111,40 @@ class AsyncMinioClient:
         self.secret_key = os.getenv("MINIO_SECRET_KEY", "minioadmin")
         self.bucket_name = os.getenv("MINIO_BUCKET_NAME", "xiaohongshu-storage")
         self.secure = os.getenv("MINIO_SECURE", "false").lower() == "true"
+        self.region = os.getenv("MINIO_REGION", "us-east-1")
+        # 未知长度流式上传的分片大小
+        self.part_size = int(os.getenv("MINIO_PART_SIZE", str(10 * 1024 * 1024)))
+        # 内容寻址：对象名由内容摘要派生，重复内容不再上传
+        self.content_addressed = os.getenv("MINIO_CONTENT_ADDRESSED", "false").lower() == "true"
+        self.index = ContentIndex()
+        # 内容寻址上传异步流时，小于该值的数据在内存中暂存，超过则转存临时文件
+        self.spool_bytes = int(os.getenv("MINIO_SPOOL_BYTES", str(8 * 1024 * 1024)))
         
-        # 创建MinIO客户端实例
-        self.client = Minio(
+        # 创建S3客户端实例（连接池上限即最大并发请求数）
+        self.client = S3Client(
             self.endpoint,
             access_key=self.access_key,
             secret_key=self.secret_key,
-            secure=self.secure
+            secure=self.secure,
+            region=self.region,
+            max_connections=int(os.getenv("MINIO_MAX_CONNECTIONS", "64")),
+            timeout=float(os.getenv("MINIO_TIMEOUT", "300")),
+            max_retries=int(os.getenv("MINIO_MAX_RETRIES", "3")),
+            retry_backoff=float(os.getenv("MINIO_RETRY_BACKOFF", "0.2")),
         )
-        
-        # 创建线程池用于异步操作
-        self.executor = ThreadPoolExecutor(max_workers=10)
+        # 不小于该大小的文件走并行分片上传（可续传）
+        self.multipart_threshold = int(os.getenv("MINIO_MULTIPART_THRESHOLD", str(64 * 1024 * 1024)))
+        self.multipart = MultipartUploader(self.client, self.bucket_name)
+        # 上次清理孤儿分片上传的时间（monotonic），每个 MINIO_MULTIPART_MAX_AGE 周期最多清理一次
+        self._orphans_swept_at: Optional[float] = None
+        # 预签名 URL 缓存（同一分桶内复用签名结果）
+        self.url_cache = PresignCache()
         
         logger.info(f"MinIO client initialized: endpoint={self.endpoint}, bucket={self.bucket_name}")
 
-    async def _run_in_executor(self, func, *args, **kwargs):
-        """
-        在线程池中运行同步函数
-        
-        Args:
-            func: 要执行的函数
-            *args: 函数的位置参数
-            **kwargs: 函数的关键字参数
-            
-        Returns:
-            函数执行结果
-        """
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, lambda: func(*args, **kwargs))
-
     async def check_and_create_bucket(self) -> bool:
         """
-        检查存储桶是否存在，不存在则创建
+        检查存储桶是否存在，不存在则创建；已存在时顺带清理过期的孤儿分片上传
         
         Returns:
             bool: 存储桶是否存在或创建成功返回True，否则返回False
@@ -78,18 +153,14 @@ class AsyncMinioClient:
             S3Error: MinIO服务相关异常
         """
         try:
-            exists = await self._run_in_executor(
-                self.client.bucket_exists, 
-                self.bucket_name
-            )
+            exists = await self.client.bucket_exists(self.bucket_name)
             
             if not exists:
                 logger.info(f"Bucket {self.bucket_name} does not exist, creating...")
-                await self._run_in_executor(
-                    self.client.make_bucket, 
-                    self.bucket_name
-                )
+                await self.client.make_bucket(self.bucket_name)
                 logger.info(f"Bucket {self.bucket_name} created successfully")
+            else:
+                await self._sweep_orphaned_uploads()
             
             logger.info(f"Bucket {self.bucket_name} is ready")
             return True
@@ -101,13 +172,16 @@ class AsyncMinioClient:
             logger.error(f"Unexpected error when checking or creating bucket: {e}")
             raise
 
-    async def upload_file(self, file_path: str, object_name: Optional[str] = None) -> str:
+    async def upload_file(
+        self, file_path: str, object_name: Optional[str] = None, content_type: Optional[str] = None
+    ) -> str:
         """
         异步上传文件到MinIO
         
         Args:
             file_path (str): 本地文件路径
-            object_name (Optional[str]): 对象名称，如果不指定则自动生成UUID
+            object_name (Optional[str]): 对象名称，如果不指定则自动生成UUID（内容寻址模式下按内容摘要生成）
+            content_type (Optional[str]): 内容类型，默认按文件识别
             
         Returns:
             str: 上传后的对象名称
@@ -116,27 +190,19 @@ class AsyncMinioClient:
             FileNotFoundError: 本地文件不存在
             S3Error: MinIO服务相关异常
         """
-        # 检查文件是否存在
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File not found: {file_path}")
-            
+        if object_name is None and self.content_addressed:
+            return await self.upload_content(file_path, content_type=content_type)
+        
         # 生成唯一的对象名称
         if object_name is None:
             file_extension = Path(file_path).suffix
             object_name = f"{uuid.uuid4().hex}{file_extension}"
             
         try:
-            # 获取文件大小
-            file_stat = os.stat(file_path)
-            
-            # 异步上传文件
-            await self._run_in_executor(
-                self.client.fput_object,
-                self.bucket_name,
-                object_name,
-                file_path,
-                metadata={'Content-Type': 'application/octet-stream'}
-            )
+            # 文件不存在时 os.stat 抛出 FileNotFoundError
+            size = (await asyncio.to_thread(os.stat, file_path)).st_size
+            async with upload_slots():
+                await self._put_file(file_path, object_name, size, content_type or guess_content_type(file_path))
             
             logger.info(f"File uploaded successfully: {file_path} -> {object_name}")
             return object_name
@@ -148,6 +214,283 @@ class AsyncMinioClient:
             logger.error(f"Unexpected error when uploading file {file_path}: {e}")
             raise
 
+    async def _put_file(self, file_path: str, object_name: str, size: int, content_type: str) -> None:
+        """大文件并行分片上传，其余边读盘边单次 PUT"""
+        if size >= self.multipart_threshold:
+            await self.multipart.upload_file(file_path, object_name, content_type)
+            return
+        with open(file_path, "rb") as f:
+            await self.client.put_object(self.bucket_name, object_name, _iter_file(f), size, content_type=content_type)
+
+    async def upload_bytes(
+        self,
+        data: Union[bytes, bytearray, memoryview],
+        object_name: str,
+        content_type: Optional[str] = None
+    ) -> str:
+        """
+        异步上传内存中的数据到MinIO（无需落盘）
+        
+        Args:
+            data: 文件内容（bytes / bytearray / memoryview，不复制整块数据）
+            object_name (str): 对象名称
+            content_type (Optional[str]): 内容类型，不指定时按文件头/扩展名识别
+            
+        Returns:
+            str: 上传后的对象名称
+            
+        Raises:
+            S3Error: MinIO服务相关异常
+        """
+        view = memoryview(data).cast("B")
+        if content_type is None:
+            content_type = guess_content_type(object_name, view[:SNIFF_BYTES].tobytes())
+        try:
+            async with upload_slots():
+                await self.client.put_object(self.bucket_name, object_name, view, content_type=content_type)
+            
+            logger.info(f"Bytes uploaded successfully: {len(view)} bytes -> {object_name}")
+            return object_name
+            
+        except S3Error as e:
+            logger.error(f"Failed to upload object {object_name}: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error when uploading object {object_name}: {e}")
+            raise
+
+    async def upload_stream(
+        self,
+        stream: Union[bytes, bytearray, memoryview, AsyncIterable[bytes]],
+        object_name: str,
+        content_type: Optional[str] = None,
+        length: Optional[int] = None,
+        part_size: Optional[int] = None
+    ) -> str:
+        """
+        异步流式上传到MinIO：边读边传，内存占用不超过一个分片
+        
+        Args:
+            stream: 内存数据，或异步字节迭代器（如 aiohttp 的 resp.content.iter_chunked()）
+            object_name (str): 对象名称
+            content_type (Optional[str]): 内容类型，不指定时按首块数据的文件头/扩展名识别
+            length (Optional[int]): 数据总长度；未知时按 part_size 分片上传（multipart）
+            part_size (Optional[int]): 分片大小，默认读取 MINIO_PART_SIZE（不小于5MB）
+            
+        Returns:
+            str: 上传后的对象名称
+            
+        Raises:
+            S3Error: MinIO服务相关异常
+            Exception: 迭代器本身抛出的异常（上传随之中止）
+        """
+        if isinstance(stream, (bytes, bytearray, memoryview)):
+            return await self.upload_bytes(stream, object_name, content_type)
+        
+        try:
+            async with upload_slots():
+                if length is not None and length >= 0:
+                    chunks = stream.__aiter__()
+                    head = b""
+                    if content_type is None:
+                        # 预读首块识别类型，再把它放回数据流
+                        head = await _next_chunk(chunks)
+                        content_type = guess_content_type(object_name, head)
+                
+                    async def body() -> AsyncIterator[bytes]:
+                        if head:
+                            yield head
+                        async for chunk in chunks:
+                            yield chunk
+                
+                    await self.client.put_object(self.bucket_name, object_name, body(), length, content_type=content_type)
+                    size = length
+                else:
+                    part_size = max(part_size or self.part_size, MIN_PART_SIZE)
+                    size = await self._upload_unknown_length(stream, object_name, content_type, part_size)
+            
+            logger.info(f"Stream uploaded successfully: {size} bytes -> {object_name}")
+            return object_name
+            
+        except S3Error as e:
+            logger.error(f"Failed to upload stream {object_name}: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error when uploading stream {object_name}: {e}")
+            raise
+
+    async def _upload_unknown_length(
+        self,
+        stream: AsyncIterable[bytes],
+        object_name: str,
+        content_type: Optional[str],
+        part_size: int
+    ) -> int:
+        """未知长度：不足一个分片时单次 PUT，否则逐片 multipart 上传；失败时中止未完成的上传"""
+        parts = _iter_parts(stream, part_size)
+        first = await _next_chunk(parts)
+        if content_type is None:
+            content_type = guess_content_type(object_name, first[:SNIFF_BYTES])
+        if len(first) < part_size:
+            await self.client.put_object(self.bucket_name, object_name, first, content_type=content_type)
+            return len(first)
+        
+        upload_id = await self.client.create_multipart_upload(self.bucket_name, object_name, content_type)
+        try:
+            etags = [(1, await self.client.upload_part(self.bucket_name, object_name, upload_id, 1, first))]
+            size = len(first)
+            async for part in parts:
+                number = len(etags) + 1
+                etags.append((number, await self.client.upload_part(self.bucket_name, object_name, upload_id, number, part)))
+                size += len(part)
+            await self.client.complete_multipart_upload(self.bucket_name, object_name, upload_id, etags)
+            return size
+        except BaseException:
+            try:
+                await self.client.abort_multipart_upload(self.bucket_name, object_name, upload_id)
+            except Exception as e:
+                logger.warning(f"Failed to abort multipart upload {object_name}: {e}")
+            raise
+
+    async def upload_content(
+        self,
+        source: Union[str, Path, bytes, bytearray, memoryview, AsyncIterable[bytes]],
+        prefix: str = "",
+        content_type: Optional[str] = None
+    ) -> str:
+        """
+        内容寻址上传：对象名由内容的 SHA-256 派生，已存在的内容跳过上传
+        
+        Args:
+            source: 本地文件路径、内存数据或异步字节迭代器（后者边读边算摘要，暂存后再上传）
+            prefix (str): 对象名前缀
+            content_type (Optional[str]): 内容类型，不指定时按文件头/扩展名识别
+            
+        Returns:
+            str: 对象名称（{prefix}/{摘要前两位}/{摘要}{扩展名}）；内容已存在时为已有对象名
+            
+        Raises:
+            S3Error: MinIO服务相关异常
+        """
+        spool = None
+        try:
+            if isinstance(source, (str, Path)):
+                file_path = str(source)
+                digest, size, head = await asyncio.to_thread(_hash_file, file_path)
+                fallback_name = file_path
+            elif isinstance(source, (bytes, bytearray, memoryview)):
+                view = memoryview(source).cast("B")
+                if len(view) > HASH_CHUNK_SIZE:
+                    digest = await asyncio.to_thread(lambda: hashlib.sha256(view).hexdigest())
+                else:
+                    digest = hashlib.sha256(view).hexdigest()
+                size, head, fallback_name = len(view), view[:SNIFF_BYTES].tobytes(), ""
+            else:
+                spool, digest, size, head = await self._spool(source)
+                fallback_name = ""
+            
+            if content_type is None:
+                content_type = guess_content_type(fallback_name, head)
+            extension = extension_for(content_type) or Path(fallback_name).suffix
+            object_name = content_key(digest, extension, prefix)
+            
+            existing = await self.index.lookup(digest)
+            if existing is None:
+                pending = self.index.claim(digest)
+                if pending is not None:
+                    # 同一内容正在由其他协程上传
+                    existing = await asyncio.shield(pending)
+            if existing is not None:
+                self.index.record(size, skipped=True)
+                logger.debug(f"Duplicate content skipped: {digest} -> {existing}")
+                return existing
+            
+            try:
+                if await self.object_exists(object_name):
+                    self.index.record(size, skipped=True)
+                else:
+                    async with upload_slots():
+                        if isinstance(source, (str, Path)):
+                            await self._put_file(file_path, object_name, size, content_type)
+                        elif spool is None:
+                            await self.client.put_object(self.bucket_name, object_name, view, content_type=content_type)
+                        else:
+                            await self.client.put_object(
+                                self.bucket_name, object_name, _iter_file(spool), size, content_type=content_type
+                            )
+                    self.index.record(size, skipped=False)
+                    logger.info(f"Content uploaded successfully: {size} bytes -> {object_name}")
+                await self.index.add(digest, object_name, size)
+            except BaseException as e:
+                self.index.release(digest, error=e)
+                raise
+            self.index.release(digest, object_name)
+            return object_name
+            
+        except S3Error as e:
+            logger.error(f"Failed to upload content: {e}")
+            raise
+        finally:
+            if spool is not None:
+                spool.close()
+
+    async def _spool(self, stream: AsyncIterable[bytes]):
+        """读取异步流并计算摘要，数据暂存到内存（超过 spool_bytes 转存临时文件）"""
+        digest = hashlib.sha256()
+        spool = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+        size = 0
+        head = b""
+        try:
+            async for chunk in stream:
+                if size < SNIFF_BYTES:
+                    head = (head + chunk)[:SNIFF_BYTES]
+                digest.update(chunk)
+                spool.write(chunk)
+                size += len(chunk)
+        except BaseException:
+            spool.close()
+            raise
+        spool.seek(0)
+        return spool, digest.hexdigest(), size, head
+
+    async def object_exists(self, object_name: str) -> bool:
+        """
+        检查对象是否存在
+        
+        Raises:
+            S3Error: 对象不存在以外的MinIO服务异常
+        """
+        try:
+            await self.client.stat_object(self.bucket_name, object_name)
+            return True
+        except S3Error as e:
+            if e.status == 404:
+                return False
+            raise
+
+    async def abort_orphaned_uploads(self, prefix: str = "") -> int:
+        """
+        中止存储桶中超过 MINIO_MULTIPART_MAX_AGE 且没有续传清单引用的未完成分片上传
+        
+        Returns:
+            int: 中止的上传数
+            
+        Raises:
+            S3Error: MinIO服务相关异常
+        """
+        return await self.multipart.abort_orphaned(prefix)
+
+    async def _sweep_orphaned_uploads(self) -> None:
+        # 失败不影响存储桶可用性，下次检查时再试
+        now = asyncio.get_running_loop().time()
+        if self._orphans_swept_at is not None and now - self._orphans_swept_at < self.multipart.max_age:
+            return
+        try:
+            await self.abort_orphaned_uploads()
+            self._orphans_swept_at = now
+        except Exception as e:
+            logger.warning(f"Failed to abort orphaned multipart uploads in {self.bucket_name}: {e}")
+
     async def get_file_url(self, object_name: str, expires: int = 7*24*60*60) -> str:
         """
         获取文件的预签名URL
@@ -163,12 +506,7 @@ class AsyncMinioClient:
             S3Error: MinIO服务相关异常
         """
         try:
-            url = await self._run_in_executor(
-                self.client.presigned_get_object,
-                self.bucket_name,
-                object_name,
-                timedelta(seconds=expires)
-            )
+            url = (await self.url_cache.get_many([object_name], expires, self._sign))[object_name]
             
             logger.debug(f"Generated presigned URL for {object_name}")
             return url
@@ -180,7 +518,33 @@ class AsyncMinioClient:
             logger.error(f"Unexpected error when generating presigned URL: {e}")
             raise
 
+    async def get_file_urls(self, object_names: Iterable[str], expires: int = 7*24*60*60) -> Dict[str, str]:
+        """
+        批量获取预签名URL（如渲染笔记列表的全部图片），命中缓存的直接返回，其余一次性签名
+        
+        Args:
+            object_names (Iterable[str]): 对象名称列表（重复项只签一次）
+            expires (int): URL过期时间（秒），默认7天
+            
+        Returns:
+            Dict[str, str]: {对象名称: 文件访问URL}
+        """
+        try:
+            urls = await self.url_cache.get_many(object_names, expires, self._sign)
+            
+            logger.debug(f"Generated {len(urls)} presigned URLs")
+            return urls
+            
+        except Exception as e:
+            logger.error(f"Unexpected error when generating presigned URLs: {e}")
+            raise
+
+    def _sign(self, object_name: str, expires: int, signed_at) -> str:
+        # 签名为本地计算，不访问服务端
+        return self.client.presigned_get_object(self.bucket_name, object_name, expires, signed_at)
+
     async def close(self):
         """关闭客户端，释放资源"""
-        self.executor.shutdown(wait=True)
+        await self.client.close()
+        self.index.close()
         logger.info("MinIO client closed")
@@ -0,0 +1,299 @@
+"""
+大文件并行分片上传（视频等）
+
+- 分片并发上传（MINIO_MULTIPART_CONCURRENCY），分片大小可配（MINIO_MULTIPART_PART_SIZE），
+  内存占用约为 并发数 × 分片大小
+- 单个分片失败按指数退避重试（MINIO_MULTIPART_RETRIES），不影响已完成的分片
+- 每完成一个分片写一次本地清单（MINIO_MULTIPART_DIR），失败或进程中断后再次上传同一文件时
+  以服务端已有分片为准续传；文件已变化时中止旧上传重新开始
+- 服务端上没有清单引用、且超过 MINIO_MULTIPART_MAX_AGE 的未完成上传视为孤儿，由 abort_orphaned 清理；
+  未启用清单时上传失败立即中止
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import aiohttp
+from loguru import logger
+
+from .s3 import S3Client, S3Error
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def _retryable(exc: BaseException) -> bool:
+    if isinstance(exc, S3Error):
+        return exc.status is None or exc.status >= 500 or exc.status in (408, 429)
+    return isinstance(exc, (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError))
+
+
+def _read_range(file_path: str, offset: int, size: int) -> bytes:
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+class MultipartUploader:
+    """
+    并行分片上传器
+    """
+
+    def __init__(
+        self,
+        client: S3Client,
+        bucket: str,
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        retries: Optional[int] = None,
+        manifest_dir: Optional[str] = None,
+        max_age: Optional[float] = None,
+    ) -> None:
+        """
+        Args:
+            client: S3 客户端
+            bucket: 存储桶
+            part_size: 分片大小，默认读取 MINIO_MULTIPART_PART_SIZE（默认16MB，不小于5MB）
+            concurrency: 同时上传的分片数，默认读取 MINIO_MULTIPART_CONCURRENCY（默认4）
+            retries: 单个分片的重试次数，默认读取 MINIO_MULTIPART_RETRIES（默认3）
+            manifest_dir: 续传清单目录，默认读取 MINIO_MULTIPART_DIR（默认 data/uploads）；空字符串表示不续传
+            max_age: 未完成上传的最长保留时间（秒），默认读取 MINIO_MULTIPART_MAX_AGE（默认1天）
+        """
+        self.client = client
+        self.bucket = bucket
+        self.part_size = max(
+            part_size or int(os.getenv("MINIO_MULTIPART_PART_SIZE", str(16 * 1024 * 1024))), MIN_PART_SIZE
+        )
+        self.concurrency = concurrency or int(os.getenv("MINIO_MULTIPART_CONCURRENCY", "4"))
+        self.retries = retries if retries is not None else int(os.getenv("MINIO_MULTIPART_RETRIES", "3"))
+        if manifest_dir is None:
+            manifest_dir = os.getenv("MINIO_MULTIPART_DIR", os.path.join("data", "uploads"))
+        self.manifest_dir = Path(manifest_dir) if manifest_dir else None
+        self.max_age = max_age or float(os.getenv("MINIO_MULTIPART_MAX_AGE", str(24 * 60 * 60)))
+
+    # ============================================
+    # 清单
+    # ============================================
+
+    def _manifest_path(self, object_name: str) -> Optional[Path]:
+        if self.manifest_dir is None:
+            return None
+        digest = hashlib.sha1(f"{self.bucket}/{object_name}".encode("utf-8")).hexdigest()
+        return self.manifest_dir / f"{digest}.json"
+
+    def _load_manifest(self, path: Optional[Path]) -> Optional[dict]:
+        if path is None:
+            return None
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exc:
+            logger.warning("corrupted upload manifest ignored {}: {}", path, exc)
+            return None
+
+    def _write_manifest(self, path: Optional[Path], manifest: dict) -> None:
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _remove_manifest(path: Optional[Path]) -> None:
+        if path is not None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # ============================================
+    # 上传
+    # ============================================
+
+    def _plan(self, size: int) -> int:
+        # S3 最多 10000 个分片，超大文件自动放大分片（按 MB 取整）
+        part_size = self.part_size
+        if size > part_size * MAX_PARTS:
+            mb = 1024 * 1024
+            part_size = math.ceil(size / MAX_PARTS / mb) * mb
+        return part_size
+
+    async def _resume(self, path: Optional[Path], object_name: str, source: dict) -> Tuple[Optional[str], Dict[int, str]]:
+        """
+        读取清单并与服务端核对，返回 (upload_id, {分片号: ETag})；无法续传返回 (None, {})
+        """
+        manifest = await asyncio.to_thread(self._load_manifest, path)
+        if manifest is None:
+            return None, {}
+        upload_id = manifest["upload_id"]
+        if manifest.get("source") != source:
+            # 文件已变化，旧分片不可用
+            logger.info("source changed, aborting previous upload {} upload_id={}", object_name, upload_id)
+            await self._abort(object_name, upload_id)
+            return None, {}
+        try:
+            remote = await self.client.list_parts(self.bucket, object_name, upload_id)
+        except S3Error as exc:
+            if exc.status == 404:
+                return None, {}
+            raise
+        # 以服务端为准，且只认大小与计划一致的分片
+        part_size, size = source["part_size"], source["size"]
+        done = {}
+        for number, (etag, part_len) in remote.items():
+            expected = min(part_size, size - (number - 1) * part_size)
+            if part_len == expected:
+                done[number] = etag
+        return upload_id, done
+
+    async def _upload_part(self, file_path: str, object_name: str, upload_id: str, number: int, offset: int, length: int) -> str:
+        attempt = 0
+        while True:
+            try:
+                data = await asyncio.to_thread(_read_range, file_path, offset, length)
+                return await self.client.upload_part(self.bucket, object_name, upload_id, number, data)
+            except Exception as exc:
+                if attempt >= self.retries or not _retryable(exc):
+                    raise
+                delay = min(0.5 * 2 ** attempt, 10.0)
+                attempt += 1
+                logger.warning("part {} of {} failed ({}), retry {}/{} in {}s", number, object_name, exc, attempt, self.retries, delay)
+                await asyncio.sleep(delay)
+
+    async def _abort(self, object_name: str, upload_id: str) -> None:
+        try:
+            await self.client.abort_multipart_upload(self.bucket, object_name, upload_id)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("failed to abort multipart upload {} upload_id={}: {}", object_name, upload_id, exc)
+
+    async def upload_file(
+        self, file_path: str, object_name: str, content_type: str = "application/octet-stream"
+    ) -> str:
+        """
+        分片上传本地文件，可续传
+
+        Returns:
+            str: 对象 ETag
+
+        Raises:
+            S3Error: 分片重试耗尽或服务端拒绝
+            FileNotFoundError: 本地文件不存在
+        """
+        stat = await asyncio.to_thread(os.stat, file_path)
+        size = stat.st_size
+        part_size = self._plan(size)
+        total_parts = max(1, math.ceil(size / part_size))
+        source = {"path": os.path.abspath(file_path), "size": size, "mtime": stat.st_mtime, "part_size": part_size}
+        path = self._manifest_path(object_name)
+
+        upload_id, done = await self._resume(path, object_name, source)
+        if upload_id is None:
+            upload_id = await self.client.create_multipart_upload(self.bucket, object_name, content_type)
+            done = {}
+        elif done:
+            logger.info("resuming {}: {}/{} parts already uploaded", object_name, len(done), total_parts)
+        manifest = {
+            "bucket": self.bucket,
+            "object_name": object_name,
+            "upload_id": upload_id,
+            "source": source,
+            "parts": {str(n): etag for n, etag in done.items()},
+            "created_at": time.time(),
+        }
+        await asyncio.to_thread(self._write_manifest, path, manifest)
+
+        sem = asyncio.Semaphore(self.concurrency)
+        manifest_lock = asyncio.Lock()
+        started = time.monotonic()
+
+        async def run(number: int) -> None:
+            offset = (number - 1) * part_size
+            async with sem:
+                etag = await self._upload_part(file_path, object_name, upload_id, number, offset, min(part_size, size - offset))
+            done[number] = etag
+            async with manifest_lock:
+                manifest["parts"][str(number)] = etag
+                await asyncio.to_thread(self._write_manifest, path, manifest)
+
+        pending = [n for n in range(1, total_parts + 1) if n not in done]
+        tasks = [asyncio.create_task(run(n)) for n in pending]
+        try:
+            await asyncio.gather(*tasks)
+            etag = await self.client.complete_multipart_upload(self.bucket, object_name, upload_id, sorted(done.items()))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if path is None:
+                # 没有清单无法续传，立即中止避免留下孤儿分片
+                await self._abort(object_name, upload_id)
+            else:
+                logger.warning("multipart upload {} interrupted, {}/{} parts kept for resume", object_name, len(done), total_parts)
+            raise
+        await asyncio.to_thread(self._remove_manifest, path)
+        elapsed = time.monotonic() - started
+        logger.info(
+            "multipart upload {}: {} bytes, {}/{} parts sent in {:.1f}s", object_name, size, len(pending), total_parts, elapsed
+        )
+        return etag
+
+    # ============================================
+    # 清理
+    # ============================================
+
+    def _manifests(self) -> List[Tuple[Path, dict]]:
+        if self.manifest_dir is None or not self.manifest_dir.is_dir():
+            return []
+        manifests = []
+        for path in self.manifest_dir.glob("*.json"):
+            manifest = self._load_manifest(path)
+            if manifest is not None:
+                manifests.append((path, manifest))
+        return manifests
+
+    async def abort_orphaned(self, prefix: str = "") -> int:
+        """
+        中止超过 max_age 的未完成上传：无清单引用的（进程崩溃、未启用续传）与清单已过期的
+
+        Returns:
+            int: 中止的上传数
+        """
+        now = time.time()
+        referenced: Set[str] = set()
+        for path, manifest in await asyncio.to_thread(self._manifests):
+            if manifest.get("bucket") != self.bucket:
+                continue
+            if now - manifest.get("created_at", now) > self.max_age:
+                await asyncio.to_thread(self._remove_manifest, path)
+            else:
+                referenced.add(manifest["upload_id"])
+
+        aborted = 0
+        for upload in await self.client.list_multipart_uploads(self.bucket, prefix):
+            if upload["upload_id"] in referenced:
+                continue
+            try:
+                initiated = datetime.fromisoformat(upload["initiated"].replace("Z", "+00:00"))
+                age = now - initiated.astimezone(timezone.utc).timestamp()
+            except (AttributeError, ValueError):
+                age = self.max_age + 1
+            if age > self.max_age:
+                await self._abort(upload["key"], upload["upload_id"])
+                aborted += 1
+        if aborted:
+            logger.info("aborted {} orphaned multipart uploads in {}", aborted, self.bucket)
+        return aborted
+
+
+__all__ = ["MultipartUploader", "MIN_PART_SIZE"]
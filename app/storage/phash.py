@@ -0,0 +1,198 @@
+"""
+感知哈希近重复索引：转发、轻微裁剪/压缩过的图片按 64 位 dHash 的汉明距离判定为同一张
+
+- 多索引哈希（multi-index hashing）：64 位哈希切成 4 段 16 位，每段一张 段值 -> 条目 的表；
+  距离不超过 d 的两个哈希至少有一段相差不超过 d // 4 位，只需探查这些段值的桶，结果是精确的
+- 百万级条目时单次查询只需检查上千个候选，亚毫秒完成
+- 全部条目持久化到本地 SQLite（MEDIA_PHASH_PATH），首次使用时在线程中整体载入内存
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+CHUNKS = 4
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def _to_signed(value: int) -> int:
+    # SQLite INTEGER 为有符号 64 位
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _flip_masks(radius: int) -> List[int]:
+    """16 位内翻转不超过 radius 位的全部掩码（含 0）"""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), r):
+            mask = 0
+            for bit in bits:
+                mask |= 1 << bit
+            masks.append(mask)
+    return masks
+
+
+class PerceptualIndex:
+    """
+    感知哈希 -> 对象名 索引
+    """
+
+    def __init__(self, path: Optional[str] = None, distance: Optional[int] = None) -> None:
+        """
+        Args:
+            path: 持久索引文件，默认读取 MEDIA_PHASH_PATH（默认 data/media_phash.db）；空字符串表示不持久化
+            distance: 判定为近重复的最大汉明距离，默认读取 MEDIA_PHASH_DISTANCE（默认6，0~63）
+        """
+        if path is None:
+            path = os.getenv("MEDIA_PHASH_PATH", os.path.join("data", "media_phash.db"))
+        self.path = path
+        self.distance = distance if distance is not None else int(os.getenv("MEDIA_PHASH_DISTANCE", "6"))
+        if not 0 <= self.distance < 64:
+            raise ValueError(f"invalid MEDIA_PHASH_DISTANCE: {self.distance}")
+        self._masks = _flip_masks(self.distance // CHUNKS)
+        self._hashes = array("Q")
+        self._names: List[str] = []
+        self._tables: List[Dict[int, array]] = [{} for _ in range(CHUNKS)]
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._loaded: Optional[asyncio.Task] = None
+        self.stats = {"lookups": 0, "hits": 0, "candidates": 0, "lookup_ms": 0.0}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def report(self) -> Dict[str, float]:
+        lookups = self.stats["lookups"]
+        return {
+            "entries": len(self),
+            **self.stats,
+            "lookup_ms": round(self.stats["lookup_ms"], 3),
+            "avg_lookup_ms": round(self.stats["lookup_ms"] / lookups, 4) if lookups else 0.0,
+        }
+
+    # ---------- 内存索引 ----------
+
+    def _insert(self, value: int, object_name: str) -> None:
+        idx = len(self._hashes)
+        self._hashes.append(value)
+        self._names.append(object_name)
+        for i, table in enumerate(self._tables):
+            chunk = (value >> (i * CHUNK_BITS)) & CHUNK_MASK
+            bucket = table.get(chunk)
+            if bucket is None:
+                table[chunk] = array("I", (idx,))
+            else:
+                bucket.append(idx)
+
+    def search(self, value: int) -> Optional[Tuple[str, int]]:
+        """
+        查找距离最近且不超过阈值的已知图片
+
+        Returns:
+            tuple: (对象名, 汉明距离)；没有近重复时返回 None
+        """
+        started = time.perf_counter()
+        hashes = self._hashes
+        best_idx, best_dist = -1, self.distance + 1
+        checked = 0
+        for i, table in enumerate(self._tables):
+            chunk = (value >> (i * CHUNK_BITS)) & CHUNK_MASK
+            for mask in self._masks:
+                bucket = table.get(chunk ^ mask)
+                if bucket is None:
+                    continue
+                checked += len(bucket)
+                for idx in bucket:
+                    dist = (hashes[idx] ^ value).bit_count()
+                    if dist < best_dist:
+                        best_idx, best_dist = idx, dist
+            if best_dist == 0:
+                break
+        self.stats["lookups"] += 1
+        self.stats["candidates"] += checked
+        self.stats["lookup_ms"] += (time.perf_counter() - started) * 1000
+        if best_idx < 0:
+            return None
+        self.stats["hits"] += 1
+        return self._names[best_idx], best_dist
+
+    # ---------- 持久化 ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS phashes ("
+                "id INTEGER PRIMARY KEY, hash INTEGER NOT NULL, object_name TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db = db
+        return self._db
+
+    def _load_rows(self) -> None:
+        with self._db_lock:
+            rows = self._connect().execute("SELECT hash, object_name FROM phashes ORDER BY id").fetchall()
+        for value, object_name in rows:
+            self._insert(value & ((1 << 64) - 1), object_name)
+
+    def _db_put(self, value: int, object_name: str) -> None:
+        with self._db_lock:
+            self._connect().execute(
+                "INSERT INTO phashes (hash, object_name, created_at) VALUES (?, ?, ?)",
+                (_to_signed(value), object_name, time.time()),
+            )
+
+    async def _ensure_loaded(self) -> None:
+        if not self.path:
+            return
+        if self._loaded is None:
+            self._loaded = asyncio.ensure_future(asyncio.to_thread(self._load_rows))
+        try:
+            await asyncio.shield(self._loaded)
+        except sqlite3.Error as exc:
+            logger.warning("perceptual index load failed: {}", exc)
+
+    # ---------- 查询与登记 ----------
+
+    async def find(self, value: int) -> Optional[Tuple[str, int]]:
+        """首次调用时载入持久索引，其余同 search"""
+        await self._ensure_loaded()
+        return self.search(value)
+
+    async def add(self, value: int, object_name: str) -> None:
+        await self._ensure_loaded()
+        self._insert(value, object_name)
+        if not self.path:
+            return
+        try:
+            await asyncio.to_thread(self._db_put, value, object_name)
+        except sqlite3.Error as exc:
+            logger.warning("perceptual index write failed: {}", exc)
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+                self._db = None
+
+
+def create_perceptual_index() -> Optional[PerceptualIndex]:
+    """MEDIA_PHASH=true 时创建近重复索引"""
+    if os.getenv("MEDIA_PHASH", "false").lower() != "true":
+        return None
+    return PerceptualIndex()
+
+
+__all__ = ["PerceptualIndex", "create_perceptual_index"]
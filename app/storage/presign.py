@@ -0,0 +1,116 @@
+"""
+预签名 URL 缓存
+
+签名时间按"过期分桶"取整：同一分桶内对同一对象签出的 URL 完全相同，可直接复用，
+浏览器/CDN 也能按 URL 缓存图片。缓存键为 (对象名, 有效期, 分桶起点)，
+URL 距失效不足安全余量（MINIO_URL_SAFETY_MARGIN）时不再返回，改为重新签名。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# 签名函数：(对象名, 有效期, 签名时间) -> URL
+Signer = Callable[[str, int, Optional[datetime]], str]
+
+# 一次需要签名的 URL 达到该数量时放到线程中计算
+SIGN_IN_THREAD = 64
+
+
+class PresignCache:
+    """
+    预签名 URL 的 LRU 缓存
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        bucket_seconds: Optional[int] = None,
+        safety_margin: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            max_entries: 缓存条目上限，默认读取 MINIO_URL_CACHE_ENTRIES（默认10000）
+            bucket_seconds: 签名时间分桶宽度上限（秒），默认读取 MINIO_URL_BUCKET_SECONDS（默认3600）；
+                实际分桶不超过有效期的 1/4，保证返回的 URL 至少还有 3/4 有效期
+            safety_margin: 安全余量（秒），默认读取 MINIO_URL_SAFETY_MARGIN（默认60）
+        """
+        self.max_entries = max_entries or int(os.getenv("MINIO_URL_CACHE_ENTRIES", "10000"))
+        self.bucket_seconds = bucket_seconds or int(os.getenv("MINIO_URL_BUCKET_SECONDS", "3600"))
+        self.safety_margin = safety_margin if safety_margin is not None else int(
+            os.getenv("MINIO_URL_SAFETY_MARGIN", "60")
+        )
+        self._items: "OrderedDict[Hashable, Tuple[float, str]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _bucket(self, expires: int, now: float) -> int:
+        width = max(1, min(self.bucket_seconds, expires // 4))
+        return int(now // width * width)
+
+    def _get(self, key: Hashable, now: float) -> Optional[str]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, url = item
+        if now >= expires_at - self.safety_margin:
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return url
+
+    def _put(self, key: Hashable, expires_at: float, url: str) -> None:
+        self._items[key] = (expires_at, url)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    async def get_many(self, object_names: Iterable[str], expires: int, sign: Signer) -> Dict[str, str]:
+        """
+        批量取 URL：命中缓存直接返回，其余在同一次调用中签名（数量较多时放到一个线程中完成，不阻塞事件循环）
+
+        Returns:
+            dict: {对象名: URL}
+        """
+        now = time.time()
+        start = self._bucket(expires, now)
+        expires_at = start + expires
+        # 分桶起点太早（有效期很短）时剩余时间可能不足安全余量，此时按当前时间签名且不缓存
+        fresh = now >= expires_at - self.safety_margin
+        signed_at = None if fresh else datetime.fromtimestamp(start, tz=timezone.utc)
+
+        urls: Dict[str, str] = {}
+        misses: List[str] = []
+        for name in object_names:
+            if name in urls:
+                continue
+            url = None if fresh else self._get((name, expires, start), now)
+            if url is not None:
+                self.stats["hits"] += 1
+                urls[name] = url
+            else:
+                urls[name] = ""
+                misses.append(name)
+        if not misses:
+            return urls
+
+        self.stats["misses"] += len(misses)
+        if len(misses) >= SIGN_IN_THREAD:
+            signed = await asyncio.to_thread(lambda: [sign(name, expires, signed_at) for name in misses])
+        else:
+            signed = [sign(name, expires, signed_at) for name in misses]
+        for name, url in zip(misses, signed):
+            urls[name] = url
+            if not fresh:
+                self._put((name, expires, start), expires_at, url)
+        return urls
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+__all__ = ["PresignCache"]
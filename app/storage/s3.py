@@ -0,0 +1,483 @@
+"""
+原生 asyncio S3 客户端（aiohttp + SigV4 签名），兼容 MinIO / AWS S3 / moto
+
+- 连接复用 aiohttp 连接池，并发只受 max_connections 限制，不占用线程
+- 路径风格寻址（http(s)://endpoint/bucket/key），MinIO 默认即此风格
+- 小块数据签名 SHA-256 载荷（大缓冲区在线程中计算摘要），流式数据使用 UNSIGNED-PAYLOAD
+- 服务端错误统一抛出 S3Error（code 取自错误响应 XML，HEAD 请求按状态码推断）
+- 幂等请求遇到 5xx / SlowDown / 连接中断时按指数退避重试（流式请求体无法重放，不重试）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime as _dt
+import hashlib
+import hmac
+import random
+from typing import AsyncIterable, Dict, List, Mapping, Optional, Tuple, Union
+from urllib.parse import quote
+from xml.etree import ElementTree
+
+import aiohttp
+from loguru import logger
+from yarl import URL
+
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+S3_NS = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+# 不小于该大小的请求体在线程中计算 SHA-256（hashlib 计算时释放 GIL），不阻塞事件循环
+HASH_IN_THREAD_BYTES = 1024 * 1024
+# 可重试的方法与错误码
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE"})
+RETRYABLE_CODES = frozenset({"SlowDown", "InternalError", "ServiceUnavailable", "RequestTimeout"})
+
+Body = Union[bytes, bytearray, memoryview, AsyncIterable[bytes]]
+
+
+class S3Error(Exception):
+    """
+    S3 服务端返回的错误
+    """
+
+    def __init__(
+        self,
+        code: str,
+        message: str = "",
+        status: Optional[int] = None,
+        resource: Optional[str] = None,
+        request_id: Optional[str] = None,
+        bucket_name: Optional[str] = None,
+        object_name: Optional[str] = None,
+    ) -> None:
+        super().__init__(f"S3 operation failed; code: {code}, message: {message}, resource: {resource}, status: {status}")
+        self.code = code
+        self.message = message
+        self.status = status
+        self.resource = resource
+        self.request_id = request_id
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+
+
+def _quote(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _find(element: ElementTree.Element, tag: str) -> Optional[str]:
+    # 兼容带/不带命名空间的响应
+    node = element.find(f"{S3_NS}{tag}")
+    if node is None:
+        node = element.find(tag)
+    return node.text if node is not None else None
+
+
+class S3Client:
+    """
+    异步 S3 客户端
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        access_key: str,
+        secret_key: str,
+        secure: bool = False,
+        region: str = "us-east-1",
+        max_connections: int = 64,
+        timeout: float = 300.0,
+        max_retries: int = 3,
+        retry_backoff: float = 0.2,
+    ) -> None:
+        """
+        Args:
+            endpoint: 服务地址（host[:port]）
+            access_key: 访问密钥ID
+            secret_key: 访问密钥
+            secure: 是否使用 HTTPS
+            region: 签名使用的区域
+            max_connections: 连接池上限（即最大并发请求数）
+            timeout: 单个请求总超时（秒）
+            max_retries: 幂等请求遇到可重试错误时的最大重试次数
+            retry_backoff: 首次重试的退避上限（秒），之后逐次翻倍并随机抖动
+        """
+        self.endpoint = endpoint
+        self.host = endpoint
+        self.base_url = f"{'https' if secure else 'http'}://{endpoint}"
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._signing_keys: Dict[str, bytes] = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                auto_decompress=False,
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    # ============================================
+    # SigV4 签名
+    # ============================================
+
+    @staticmethod
+    def _path(bucket: Optional[str], key: Optional[str]) -> str:
+        path = "/"
+        if bucket:
+            path += bucket
+            if key:
+                path += "/" + _quote(key, safe="-_.~/")
+        return path
+
+    @staticmethod
+    def _query_string(query: Mapping[str, str]) -> str:
+        return "&".join(f"{_quote(k)}={_quote(str(v))}" for k, v in sorted(query.items()))
+
+    def _signing_key(self, date: str) -> bytes:
+        key = self._signing_keys.get(date)
+        if key is None:
+            key = _hmac(f"AWS4{self.secret_key}".encode("utf-8"), date)
+            for part in (self.region, "s3", "aws4_request"):
+                key = _hmac(key, part)
+            self._signing_keys = {date: key}
+        return key
+
+    def _signature(self, amz_date: str, canonical_request: str) -> Tuple[str, str]:
+        date = amz_date[:8]
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join(
+            ["AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()]
+        )
+        return scope, hmac.new(self._signing_key(date), string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def _sign_headers(
+        self,
+        method: str,
+        path: str,
+        query: Mapping[str, str],
+        headers: Dict[str, str],
+        payload_hash: str,
+        signed_at: Optional[_dt.datetime] = None,
+    ) -> Dict[str, str]:
+        amz_date = (signed_at or _dt.datetime.now(_dt.timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+        headers = {**headers, "Host": self.host, "x-amz-date": amz_date, "x-amz-content-sha256": payload_hash}
+        signed = {k.lower(): str(v).strip() for k, v in headers.items() if k.lower() == "host" or k.lower().startswith("x-amz-")}
+        signed_names = ";".join(sorted(signed))
+        canonical_request = "\n".join(
+            [
+                method,
+                path,
+                self._query_string(query),
+                "".join(f"{name}:{signed[name]}\n" for name in sorted(signed)),
+                signed_names,
+                payload_hash,
+            ]
+        )
+        scope, signature = self._signature(amz_date, canonical_request)
+        headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_names}, Signature={signature}"
+        )
+        return headers
+
+    def presigned_get_object(
+        self, bucket: str, key: str, expires: int = 7 * 24 * 60 * 60, signed_at: Optional[_dt.datetime] = None
+    ) -> str:
+        """
+        生成预签名下载 URL（纯本地计算，不访问服务端）；expires 最长 7 天
+
+        signed_at 指定签名时间（UTC），URL 在 signed_at + expires 失效；相同参数得到相同 URL
+        """
+        if not 1 <= expires <= 7 * 24 * 60 * 60:
+            raise ValueError("expires must be between 1 second and 7 days")
+        amz_date = (signed_at or _dt.datetime.now(_dt.timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+        path = self._path(bucket, key)
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{amz_date[:8]}/{self.region}/s3/aws4_request",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires),
+            "X-Amz-SignedHeaders": "host",
+        }
+        canonical_request = "\n".join(
+            ["GET", path, self._query_string(query), f"host:{self.host}\n", "host", UNSIGNED_PAYLOAD]
+        )
+        _, signature = self._signature(amz_date, canonical_request)
+        return f"{self.base_url}{path}?{self._query_string(query)}&X-Amz-Signature={signature}"
+
+    # ============================================
+    # 请求
+    # ============================================
+
+    async def _request(
+        self,
+        method: str,
+        bucket: Optional[str] = None,
+        key: Optional[str] = None,
+        query: Optional[Mapping[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        body: Optional[Body] = None,
+        length: Optional[int] = None,
+        idempotent: Optional[bool] = None,
+    ) -> Tuple[int, "aiohttp.typedefs.LooseHeaders", bytes]:
+        """
+        发送签名请求，返回 (状态码, 响应头, 响应体)
+
+        idempotent 默认按方法判断（GET/HEAD/PUT/DELETE）；幂等且请求体可重放（非流式）时，
+        5xx、SlowDown 等可重试错误与连接中断/超时最多重试 max_retries 次
+
+        Raises:
+            S3Error: 服务端返回 4xx/5xx（重试用尽后为最后一次的错误）
+        """
+        query = dict(query or {})
+        headers = dict(headers or {})
+        replayable = True
+        if body is None:
+            payload_hash = EMPTY_SHA256
+        elif isinstance(body, (bytes, bytearray, memoryview)):
+            if len(body) >= HASH_IN_THREAD_BYTES:
+                payload_hash = (await asyncio.to_thread(hashlib.sha256, body)).hexdigest()
+            else:
+                payload_hash = hashlib.sha256(body).hexdigest()
+            length = len(body)
+        else:
+            payload_hash = UNSIGNED_PAYLOAD
+            replayable = False
+        if length is not None:
+            headers["Content-Length"] = str(length)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        retries = self.max_retries if idempotent and replayable else 0
+        path = self._path(bucket, key)
+        url = self.base_url + path
+        if query:
+            url += "?" + self._query_string(query)
+
+        attempt = 0
+        while True:
+            try:
+                # 每次重试重新签名：重试可能跨过签名时间的有效窗口
+                signed = self._sign_headers(method, path, query, headers, payload_hash)
+                async with self._get_session().request(
+                    method, URL(url, encoded=True), headers=signed, data=body, skip_auto_headers=("Content-Type",)
+                ) as resp:
+                    content = await resp.read()
+                    if resp.status >= 300:
+                        raise self._error(resp.status, resp.headers, content, bucket, key)
+                    return resp.status, resp.headers, content
+            except (S3Error, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as exc:
+                if attempt >= retries or not self._retryable(exc):
+                    raise
+                attempt += 1
+                delay = random.uniform(0, self.retry_backoff * 2 ** (attempt - 1))
+                logger.warning(
+                    "S3 {} {} failed, retry {}/{} in {:.2f}s: {!r}", method, path, attempt, retries, delay, exc
+                )
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retryable(exc: Exception) -> bool:
+        if isinstance(exc, S3Error):
+            return exc.code in RETRYABLE_CODES or (exc.status or 0) >= 500 or exc.status in (408, 429)
+        # 连接被重置/服务端断开/响应体截断/超时
+        return True
+
+    @staticmethod
+    def _error(status: int, headers, content: bytes, bucket: Optional[str], key: Optional[str]) -> S3Error:
+        code, message, request_id = None, "", headers.get("x-amz-request-id")
+        if content:
+            try:
+                root = ElementTree.fromstring(content)
+                code = _find(root, "Code")
+                message = _find(root, "Message") or ""
+                request_id = _find(root, "RequestId") or request_id
+            except ElementTree.ParseError:
+                message = content[:200].decode("utf-8", "replace")
+        if code is None:
+            # HEAD 请求没有响应体
+            if status == 404:
+                code = "NoSuchKey" if key else "NoSuchBucket"
+            else:
+                code = {403: "AccessDenied", 400: "BadRequest"}.get(status, f"HTTP{status}")
+        resource = "/" + "/".join(part for part in (bucket, key) if part)
+        return S3Error(code, message, status, resource, request_id, bucket, key)
+
+    # ============================================
+    # 存储桶与对象
+    # ============================================
+
+    async def bucket_exists(self, bucket: str) -> bool:
+        try:
+            await self._request("HEAD", bucket)
+            return True
+        except S3Error as exc:
+            if exc.status == 404:
+                return False
+            raise
+
+    async def make_bucket(self, bucket: str) -> None:
+        body = None
+        if self.region and self.region != "us-east-1":
+            body = (
+                "<CreateBucketConfiguration><LocationConstraint>"
+                f"{self.region}</LocationConstraint></CreateBucketConfiguration>"
+            ).encode("utf-8")
+        await self._request("PUT", bucket, body=body)
+
+    async def put_object(
+        self,
+        bucket: str,
+        key: str,
+        body: Body,
+        length: Optional[int] = None,
+        content_type: str = "application/octet-stream",
+    ) -> str:
+        """
+        单次 PUT 上传；body 为异步迭代器时必须给出 length
+
+        Returns:
+            str: ETag
+        """
+        if length is None and not isinstance(body, (bytes, bytearray, memoryview)):
+            raise ValueError("length is required for streaming bodies")
+        _, headers, _ = await self._request(
+            "PUT", bucket, key, headers={"Content-Type": content_type}, body=body, length=length
+        )
+        return headers.get("ETag", "").strip('"')
+
+    async def stat_object(self, bucket: str, key: str) -> Dict[str, object]:
+        """
+        Returns:
+            dict: {"size", "etag", "content_type", "last_modified"}
+
+        Raises:
+            S3Error: 对象不存在时 code 为 NoSuchKey
+        """
+        _, headers, _ = await self._request("HEAD", bucket, key)
+        return {
+            "size": int(headers.get("Content-Length", 0)),
+            "etag": headers.get("ETag", "").strip('"'),
+            "content_type": headers.get("Content-Type"),
+            "last_modified": headers.get("Last-Modified"),
+        }
+
+    async def get_object(self, bucket: str, key: str) -> bytes:
+        _, _, content = await self._request("GET", bucket, key)
+        return content
+
+    async def remove_object(self, bucket: str, key: str) -> None:
+        await self._request("DELETE", bucket, key)
+
+    # ============================================
+    # 分片上传
+    # ============================================
+
+    async def create_multipart_upload(
+        self, bucket: str, key: str, content_type: str = "application/octet-stream"
+    ) -> str:
+        """
+        Returns:
+            str: upload_id
+        """
+        _, _, content = await self._request(
+            "POST", bucket, key, query={"uploads": ""}, headers={"Content-Type": content_type}
+        )
+        return _find(ElementTree.fromstring(content), "UploadId")
+
+    async def upload_part(
+        self, bucket: str, key: str, upload_id: str, part_number: int, body: Body, length: Optional[int] = None
+    ) -> str:
+        """
+        Returns:
+            str: 分片 ETag
+        """
+        _, headers, _ = await self._request(
+            "PUT",
+            bucket,
+            key,
+            query={"partNumber": str(part_number), "uploadId": upload_id},
+            body=body,
+            length=length,
+        )
+        return headers.get("ETag", "").strip('"')
+
+    async def complete_multipart_upload(
+        self, bucket: str, key: str, upload_id: str, parts: List[Tuple[int, str]]
+    ) -> str:
+        """
+        Args:
+            parts: [(分片号, ETag)]，按分片号升序
+
+        Returns:
+            str: 对象 ETag
+        """
+        body = "<CompleteMultipartUpload>" + "".join(
+            f"<Part><PartNumber>{number}</PartNumber><ETag>\"{etag}\"</ETag></Part>" for number, etag in sorted(parts)
+        ) + "</CompleteMultipartUpload>"
+        # 以相同分片列表重复合并是安全的（S3 文档允许重试 CompleteMultipartUpload）
+        _, _, content = await self._request(
+            "POST", bucket, key, query={"uploadId": upload_id}, body=body.encode("utf-8"), idempotent=True
+        )
+        # 合并失败时也可能返回 200，错误在响应体中
+        root = ElementTree.fromstring(content)
+        if root.tag.endswith("Error"):
+            raise S3Error(_find(root, "Code") or "InternalError", _find(root, "Message") or "", 200,
+                          f"/{bucket}/{key}", _find(root, "RequestId"), bucket, key)
+        return (_find(root, "ETag") or "").strip('"')
+
+    async def abort_multipart_upload(self, bucket: str, key: str, upload_id: str) -> None:
+        await self._request("DELETE", bucket, key, query={"uploadId": upload_id})
+
+    async def list_parts(self, bucket: str, key: str, upload_id: str) -> Dict[int, Tuple[str, int]]:
+        """
+        Returns:
+            dict: {分片号: (ETag, 大小)}
+        """
+        parts: Dict[int, Tuple[str, int]] = {}
+        marker = "0"
+        while True:
+            _, _, content = await self._request(
+                "GET", bucket, key, query={"uploadId": upload_id, "part-number-marker": marker}
+            )
+            root = ElementTree.fromstring(content)
+            for node in list(root.findall(f"{S3_NS}Part")) + list(root.findall("Part")):
+                parts[int(_find(node, "PartNumber"))] = ((_find(node, "ETag") or "").strip('"'), int(_find(node, "Size") or 0))
+            if (_find(root, "IsTruncated") or "false").lower() != "true":
+                return parts
+            marker = _find(root, "NextPartNumberMarker") or str(max(parts))
+
+    async def list_multipart_uploads(self, bucket: str, prefix: str = "") -> List[Dict[str, str]]:
+        """
+        Returns:
+            list: [{"key", "upload_id", "initiated"}]（只返回第一页，最多 1000 条）
+        """
+        query = {"uploads": ""}
+        if prefix:
+            query["prefix"] = prefix
+        _, _, content = await self._request("GET", bucket, query=query)
+        root = ElementTree.fromstring(content)
+        uploads = []
+        for node in list(root.findall(f"{S3_NS}Upload")) + list(root.findall("Upload")):
+            uploads.append(
+                {"key": _find(node, "Key"), "upload_id": _find(node, "UploadId"), "initiated": _find(node, "Initiated")}
+            )
+        return uploads
+
+
+__all__ = ["S3Client", "S3Error"]
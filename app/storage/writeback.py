@@ -0,0 +1,549 @@
+"""
+写回缓存层：本地磁盘在前、MinIO 在后（STORAGE_BACKEND=writeback）
+
+- 写入先记入脏对象日志、再落本地磁盘（LocalStorage，原子重命名）后立即返回，MinIO 慢或短暂不可用时不丢媒体；
+  日志写不进去时上传失败，本地写入失败时撤销日志行；重启时日志中本地文件不存在的脏对象（写入未完成）被丢弃
+- 后台任务把脏对象刷到 MinIO：失败按指数退避重试（上限 STORAGE_CACHE_RETRY_MAX 秒），不会丢弃；
+  刷写期间对象被重写时以新版本为准，旧版本的刷写结果不会把它标记为已同步
+- 脏对象日志持久化在 SQLite（STORAGE_CACHE_JOURNAL），进程重启后继续刷写
+- 最近写入的对象从本地层读取（get_file_url 返回本地签名地址）；本地层总大小超过 STORAGE_CACHE_MAX_BYTES 时
+  按 LRU 淘汰已同步的对象，未同步的对象永不淘汰；已淘汰对象的本地地址由 /api/storage 路由重定向到 MinIO
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+import aiohttp
+from loguru import logger
+
+from .base import BytesLike, StorageBackend
+from .local import LocalStorage
+from .mime import SNIFF_BYTES, guess_content_type
+
+
+class WriteBackStorage(StorageBackend):
+    """
+    本地磁盘写回缓存 + 远端对象存储
+    """
+
+    def __init__(
+        self,
+        remote: Optional[StorageBackend] = None,
+        local: Optional[LocalStorage] = None,
+        max_bytes: Optional[int] = None,
+        journal_path: Optional[str] = None,
+        flush_concurrency: Optional[int] = None,
+        retry_max: Optional[float] = None,
+    ) -> None:
+        """
+        Args:
+            remote: 远端存储，默认创建 AsyncMinioClient
+            local: 本地层，默认创建 LocalStorage（根目录 STORAGE_LOCAL_ROOT）
+            max_bytes: 本地层字节预算，默认读取 STORAGE_CACHE_MAX_BYTES（默认10GB）
+            journal_path: 脏对象日志，默认读取 STORAGE_CACHE_JOURNAL（默认 data/writeback.db）；空字符串表示不持久化
+            flush_concurrency: 同时刷写的对象数，默认读取 STORAGE_CACHE_FLUSH_CONCURRENCY（默认4）
+            retry_max: 重试间隔上限（秒），默认读取 STORAGE_CACHE_RETRY_MAX（默认300）
+        """
+        if remote is None:
+            from .minio_client import AsyncMinioClient
+
+            remote = AsyncMinioClient()
+        self.remote = remote
+        self.local = local or LocalStorage()
+        self.content_addressed = self.remote.content_addressed
+        self.local.content_addressed = self.content_addressed
+        self.index = self.local.index
+        self.max_bytes = max_bytes or int(os.getenv("STORAGE_CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+        if journal_path is None:
+            journal_path = os.getenv("STORAGE_CACHE_JOURNAL", os.path.join("data", "writeback.db"))
+        self.journal_path = journal_path
+        self.flush_concurrency = flush_concurrency or int(os.getenv("STORAGE_CACHE_FLUSH_CONCURRENCY", "4"))
+        self.retry_max = retry_max or float(os.getenv("STORAGE_CACHE_RETRY_MAX", "300"))
+
+        # 未同步对象：{对象名: {"size", "content_type", "generation", "attempts", "next_attempt"}}
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        # 已同步、仍在本地的对象（LRU 顺序）：{对象名: 大小}
+        self._clean: "OrderedDict[str, int]" = OrderedDict()
+        self._dirty_bytes = 0
+        self._clean_bytes = 0
+        self._generation = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._loaded: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._remote_ready = False
+        self.stats = {"flushed": 0, "flush_failures": 0, "evicted": 0, "local_reads": 0, "remote_reads": 0}
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "dirty": len(self._dirty),
+            "dirty_bytes": self._dirty_bytes,
+            "cached": len(self._clean),
+            "cached_bytes": self._clean_bytes,
+            "max_bytes": self.max_bytes,
+            **self.stats,
+        }
+
+    # ============================================
+    # 脏对象日志
+    # ============================================
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            Path(self.journal_path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.journal_path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                "object_name TEXT PRIMARY KEY, size INTEGER NOT NULL, content_type TEXT, "
+                "dirty INTEGER NOT NULL, generation INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db = db
+        return self._db
+
+    def _journal(self, sql: str, params: tuple) -> None:
+        if not self.journal_path:
+            return
+        with self._db_lock:
+            self._connect().execute(sql, params)
+
+    def _journal_many(self, sql: str, rows: List[tuple]) -> None:
+        if not self.journal_path or not rows:
+            return
+        with self._db_lock:
+            self._connect().executemany(sql, rows)
+
+    def _load_rows(self) -> list:
+        if not self.journal_path:
+            return []
+        with self._db_lock:
+            rows = self._connect().execute(
+                "SELECT object_name, size, content_type, dirty, generation FROM objects ORDER BY updated_at"
+            ).fetchall()
+        # 脏对象先写日志后落盘：以本地文件为准，文件不存在说明写入没有完成（调用方未收到成功）
+        loaded, unpublished = [], []
+        for object_name, size, content_type, dirty, generation in rows:
+            if dirty:
+                try:
+                    size = self.local.object_path(object_name).stat().st_size
+                except (OSError, ValueError):
+                    unpublished.append((object_name,))
+                    continue
+            loaded.append((object_name, size, content_type, dirty, generation))
+        if unpublished:
+            logger.info("write-back journal dropping {} unpublished writes", len(unpublished))
+            self._journal_many("DELETE FROM objects WHERE object_name = ? AND dirty = 1", unpublished)
+        return loaded
+
+    async def _ensure_loaded(self) -> None:
+        """首次使用时载入日志，有未同步对象则启动刷写任务"""
+        if self._loaded is None:
+            self._loaded = asyncio.ensure_future(self._load())
+        await asyncio.shield(self._loaded)
+
+    async def _load(self) -> None:
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        try:
+            rows = await asyncio.to_thread(self._load_rows)
+        except sqlite3.Error as exc:
+            logger.warning("write-back journal load failed: {}", exc)
+            rows = []
+        for object_name, size, content_type, dirty, generation in rows:
+            self._generation = max(self._generation, generation)
+            if dirty:
+                self._dirty[object_name] = {
+                    "size": size, "content_type": content_type, "generation": generation,
+                    "attempts": 0, "next_attempt": 0.0,
+                }
+                self._dirty_bytes += size
+            else:
+                self._clean[object_name] = size
+                self._clean_bytes += size
+        if self._dirty:
+            logger.info("write-back cache resuming {} unflushed objects ({} bytes)", len(self._dirty), self._dirty_bytes)
+            self._start_flusher()
+
+    # ============================================
+    # 写入
+    # ============================================
+
+    async def _journal_dirty(self, object_name: str, size: int, content_type: Optional[str]) -> int:
+        """
+        写入脏对象日志行，返回本次写入的版本号
+
+        Raises:
+            sqlite3.Error: 日志写入失败（调用方让上传失败，否则对象可能永远不会刷写）
+        """
+        self._generation += 1
+        generation = self._generation
+        await asyncio.to_thread(
+            self._journal,
+            "INSERT OR REPLACE INTO objects (object_name, size, content_type, dirty, generation, updated_at) "
+            "VALUES (?, ?, ?, 1, ?, ?)",
+            (object_name, size, content_type, generation, time.time()),
+        )
+        return generation
+
+    async def _revert_journal(self, object_name: str) -> None:
+        """本地写入失败：把日志行恢复为写入前的状态（本地层仍是旧版本或没有该对象）"""
+        previous = self._dirty.get(object_name)
+        if previous is not None:
+            sql = (
+                "INSERT OR REPLACE INTO objects (object_name, size, content_type, dirty, generation, updated_at) "
+                "VALUES (?, ?, ?, 1, ?, ?)"
+            )
+            params = (object_name, previous["size"], previous["content_type"], previous["generation"], time.time())
+        elif object_name in self._clean:
+            sql = "UPDATE objects SET dirty = 0, updated_at = ? WHERE object_name = ?"
+            params = (time.time(), object_name)
+        else:
+            sql, params = "DELETE FROM objects WHERE object_name = ?", (object_name,)
+        try:
+            await asyncio.to_thread(self._journal, sql, params)
+        except sqlite3.Error as exc:
+            # 残留的脏行在重启时按本地文件校正
+            logger.warning("write-back journal revert failed for {}: {}", object_name, exc)
+
+    async def _write_through_journal(
+        self, object_name: str, size: int, content_type: Optional[str], write: Callable[[], Awaitable[Any]]
+    ) -> None:
+        """先写日志再落本地层，保证已确认的写入一定会被刷写"""
+        generation = await self._journal_dirty(object_name, size, content_type)
+        try:
+            await write()
+        except BaseException:
+            await self._revert_journal(object_name)
+            raise
+        await self._mark_dirty(object_name, await self._local_size(object_name), content_type, generation)
+
+    async def _mark_dirty(self, object_name: str, size: int, content_type: Optional[str], generation: int) -> None:
+        old_size = self._clean.pop(object_name, None)
+        if old_size is not None:
+            self._clean_bytes -= old_size
+        previous = self._dirty.get(object_name)
+        if previous is not None:
+            self._dirty_bytes -= previous["size"]
+        self._dirty[object_name] = {
+            "size": size, "content_type": content_type, "generation": generation,
+            "attempts": 0, "next_attempt": 0.0,
+        }
+        self._dirty_bytes += size
+        if self._dirty_bytes > self.max_bytes:
+            logger.warning(
+                "write-back cache over budget with unflushed data: {} > {} bytes", self._dirty_bytes, self.max_bytes
+            )
+        self._start_flusher()
+        await self._evict()
+
+    async def _mark_clean(self, object_name: str, size: int, content_type: Optional[str]) -> None:
+        self._clean[object_name] = size
+        self._clean_bytes += size
+        self._generation += 1
+        try:
+            await asyncio.to_thread(
+                self._journal,
+                "INSERT OR REPLACE INTO objects (object_name, size, content_type, dirty, generation, updated_at) "
+                "VALUES (?, ?, ?, 0, ?, ?)",
+                (object_name, size, content_type, self._generation, time.time()),
+            )
+        except sqlite3.Error as exc:
+            logger.warning("write-back journal write failed: {}", exc)
+        await self._evict()
+
+    async def _local_size(self, object_name: str) -> int:
+        stat = await asyncio.to_thread(self.local.object_path(object_name).stat)
+        return stat.st_size
+
+    async def check_and_create_bucket(self) -> bool:
+        """
+        准备本地层并尝试创建远端存储桶；远端不可用时只记录警告（刷写时会重试）
+
+        Raises:
+            OSError: 本地目录不可用
+        """
+        await self._ensure_loaded()
+        await self.local.check_and_create_bucket()
+        await self._ensure_remote_bucket()
+        return True
+
+    async def upload_file(
+        self, file_path: str, object_name: Optional[str] = None, content_type: Optional[str] = None
+    ) -> str:
+        if object_name is None and self.content_addressed:
+            return await self.upload_content(file_path, content_type=content_type)
+        await self._ensure_loaded()
+        if object_name is None:
+            object_name = f"{uuid.uuid4().hex}{Path(file_path).suffix}"
+        size = (await asyncio.to_thread(os.stat, file_path)).st_size
+        await self._write_through_journal(
+            object_name, size, content_type, lambda: self.local.upload_file(file_path, object_name)
+        )
+        return object_name
+
+    async def upload_bytes(self, data: BytesLike, object_name: str, content_type: Optional[str] = None) -> str:
+        await self._ensure_loaded()
+        view = memoryview(data).cast("B")
+        if content_type is None:
+            content_type = guess_content_type(object_name, view[:SNIFF_BYTES].tobytes())
+        await self._write_through_journal(
+            object_name, len(view), content_type, lambda: self.local.upload_bytes(view, object_name, content_type)
+        )
+        return object_name
+
+    async def upload_stream(
+        self,
+        stream: Union[BytesLike, AsyncIterable[bytes]],
+        object_name: str,
+        content_type: Optional[str] = None,
+        length: Optional[int] = None,
+        part_size: Optional[int] = None,
+    ) -> str:
+        if isinstance(stream, (bytes, bytearray, memoryview)):
+            return await self.upload_bytes(stream, object_name, content_type)
+        await self._ensure_loaded()
+        # 未知长度时日志中的大小为 0，重启时按本地文件校正
+        await self._write_through_journal(
+            object_name, length or 0, content_type,
+            lambda: self.local.upload_stream(stream, object_name, content_type, length),
+        )
+        return object_name
+
+    async def upload_content(
+        self,
+        source: Union[str, Path, BytesLike, AsyncIterable[bytes]],
+        prefix: str = "",
+        content_type: Optional[str] = None,
+    ) -> str:
+        await self._ensure_loaded()
+        object_name = await self.local.upload_content(source, prefix, content_type)
+        if object_name in self._dirty or object_name in self._clean:
+            # 内容寻址对象不会变化，已在本地层（未同步或已同步）的无需再次刷写
+            return object_name
+        size = await self._local_size(object_name)
+        try:
+            # 本地副本已被淘汰、远端已有同一内容：只作为已同步对象缓存，不再刷写
+            synced = await self.remote.object_exists(object_name)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.debug("remote existence check failed for {}, flushing it: {}", object_name, exc)
+            synced = False
+        if synced:
+            await self._mark_clean(object_name, size, content_type)
+        else:
+            # 对象名由内容决定，只能落盘后再写日志；日志写入失败时上传失败，
+            # 重新上传同一内容会再次写日志（本地已有但不在日志中的对象不会被跳过）
+            generation = await self._journal_dirty(object_name, size, content_type)
+            await self._mark_dirty(object_name, size, content_type, generation)
+        return object_name
+
+    # ============================================
+    # 刷写与淘汰
+    # ============================================
+
+    def _start_flusher(self) -> None:
+        self._wake.set()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_loop())
+
+    async def _ensure_remote_bucket(self) -> bool:
+        """远端不可用时只记录一次警告，由调用方整体退避"""
+        if not self._remote_ready:
+            try:
+                await self.remote.check_and_create_bucket()
+                self._remote_ready = True
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning("remote storage unavailable, writes stay in the local tier: {}", exc)
+        return self._remote_ready
+
+    def _retry_later(self, entry: Dict[str, Any]) -> float:
+        self.stats["flush_failures"] += 1
+        entry["attempts"] += 1
+        delay = min(2 ** entry["attempts"], self.retry_max)
+        entry["next_attempt"] = time.time() + delay
+        return delay
+
+    async def _flush_loop(self) -> None:
+        while True:
+            self._wake.clear()
+            now = time.time()
+            due = [name for name, entry in self._dirty.items() if entry["next_attempt"] <= now]
+            if due:
+                await self._flush_round(due)
+                continue
+            if not self._dirty:
+                await self._wake.wait()
+                continue
+            delay = min(entry["next_attempt"] for entry in self._dirty.values()) - now
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(delay, 0.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _flush_round(self, names: List[str]) -> int:
+        async with self._flush_lock:
+            if not await self._ensure_remote_bucket():
+                for name in names:
+                    if name in self._dirty:
+                        self._retry_later(self._dirty[name])
+                return 0
+            sem = asyncio.Semaphore(self.flush_concurrency)
+
+            async def run(name: str) -> bool:
+                async with sem:
+                    return await self._flush_one(name)
+
+            results = await asyncio.gather(*(run(name) for name in names))
+        await self._evict()
+        return sum(results)
+
+    async def _flush_one(self, object_name: str) -> bool:
+        entry = self._dirty.get(object_name)
+        if entry is None:
+            return False
+        generation = entry["generation"]
+        try:
+            await self.remote.upload_file(
+                str(self.local.object_path(object_name)), object_name, content_type=entry["content_type"]
+            )
+        except FileNotFoundError:
+            # 本地文件被外部删除，无法再刷写
+            logger.error("write-back object lost before flush: {}", object_name)
+            if self._dirty.get(object_name) is entry:
+                del self._dirty[object_name]
+                self._dirty_bytes -= entry["size"]
+                await asyncio.to_thread(self._journal, "DELETE FROM objects WHERE object_name = ?", (object_name,))
+            return False
+        except Exception as exc:  # pylint: disable=broad-except
+            if isinstance(exc, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+                # 远端断开：下一轮先整体探测一次
+                self._remote_ready = False
+            delay = self._retry_later(entry)
+            logger.warning("flush {} failed (attempt {}), retry in {:.0f}s: {}", object_name, entry["attempts"], delay, exc)
+            return False
+
+        current = self._dirty.get(object_name)
+        if current is None or current["generation"] != generation:
+            # 刷写期间被重写，等待下一轮刷写新版本
+            return False
+        del self._dirty[object_name]
+        self._dirty_bytes -= entry["size"]
+        self._clean[object_name] = entry["size"]
+        self._clean_bytes += entry["size"]
+        self.stats["flushed"] += 1
+        try:
+            await asyncio.to_thread(
+                self._journal,
+                "UPDATE objects SET dirty = 0, updated_at = ? WHERE object_name = ? AND generation = ?",
+                (time.time(), object_name, generation),
+            )
+        except sqlite3.Error as exc:
+            logger.warning("write-back journal write failed: {}", exc)
+        return True
+
+    async def _evict(self) -> None:
+        """超出预算时按 LRU 删除已同步对象的本地副本"""
+        victims = []
+        while self._clean and self._dirty_bytes + self._clean_bytes > self.max_bytes:
+            name, size = self._clean.popitem(last=False)
+            self._clean_bytes -= size
+            victims.append(name)
+        if not victims:
+            return
+
+        def remove() -> None:
+            for name in victims:
+                try:
+                    os.remove(self.local.object_path(name))
+                except FileNotFoundError:
+                    pass
+            self._journal_many("DELETE FROM objects WHERE object_name = ? AND dirty = 0", [(n,) for n in victims])
+
+        try:
+            await asyncio.to_thread(remove)
+        except (OSError, sqlite3.Error) as exc:
+            logger.warning("write-back eviction failed: {}", exc)
+        self.stats["evicted"] += len(victims)
+
+    async def flush(self) -> int:
+        """
+        立即刷写全部未同步对象（忽略退避时间）
+
+        Returns:
+            int: 本次成功刷写的对象数
+        """
+        await self._ensure_loaded()
+        return await self._flush_round(list(self._dirty))
+
+    # ============================================
+    # 读取
+    # ============================================
+
+    def _touch(self, object_name: str) -> bool:
+        if object_name in self._dirty:
+            return True
+        if object_name in self._clean:
+            self._clean.move_to_end(object_name)
+            return True
+        return False
+
+    async def object_exists(self, object_name: str) -> bool:
+        await self._ensure_loaded()
+        if object_name in self._dirty or object_name in self._clean:
+            return True
+        return await self.remote.object_exists(object_name)
+
+    async def get_file_url(self, object_name: str, expires: int = 7*24*60*60) -> str:
+        return (await self.get_file_urls([object_name], expires))[object_name]
+
+    async def get_file_urls(self, object_names: Iterable[str], expires: int = 7*24*60*60) -> Dict[str, str]:
+        """本地层中的对象返回本地签名地址（淘汰后由路由重定向到远端），其余返回远端预签名 URL"""
+        await self._ensure_loaded()
+        names = list(dict.fromkeys(object_names))
+        local = [name for name in names if self._touch(name)]
+        remote = [name for name in names if name not in self._dirty and name not in self._clean]
+        self.stats["local_reads"] += len(local)
+        self.stats["remote_reads"] += len(remote)
+        urls = await self.local.get_file_urls(local, expires) if local else {}
+        if remote:
+            urls.update(await self.remote.get_file_urls(remote, expires))
+        return {name: urls[name] for name in names}
+
+    async def close(self, timeout: Optional[float] = None) -> None:
+        """
+        尽量刷写未同步对象（最多等待 STORAGE_CACHE_CLOSE_TIMEOUT 秒，默认10），其余留待下次启动
+        """
+        if self._loaded is not None and self._dirty:
+            timeout = timeout if timeout is not None else float(os.getenv("STORAGE_CACHE_CLOSE_TIMEOUT", "10"))
+            try:
+                await asyncio.wait_for(self.flush(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            if self._dirty:
+                logger.warning("write-back cache closing with {} unflushed objects, resumed on next start", len(self._dirty))
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.remote.close()
+        await self.local.close()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+                self._db = None
+
+
+__all__ = ["WriteBackStorage"]
@@ -1,19 +1,27 @@
 """
 异步任务调度：生产者-消费者（数据库轮询的模拟实现）
 
-当前实现使用内存存储模拟数据库，便于快速落地。
-如需真正落地到数据库，可将 InMemoryStore 替换为数据库 CRUD。
+默认使用内存存储模拟数据库，便于快速落地；设置 TASK_STORE_BACKEND=redis
+可切换为 RedisStore，多个爬虫节点共享同一任务队列，实现水平扩展。
 """
 
 from __future__ import annotations
 
 import asyncio
 import os
-from typing import Dict, List, Optional, Tuple
+import time
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
 
 from loguru import logger
 
 from app.crawler import AsyncXhsCrawler
+from app.crawler.media import create_media_pipeline
+from app.services.results import build_sort_orders
+from app.task.checkpoint import FileCheckpointStore
+from app.task.events import TaskEventHub
+from app.task.rate import compute_drain_rate
 
 
 class InMemoryStore:
@@ -25,8 +33,18 @@ class InMemoryStore:
     def __init__(self) -> None:
         self._tasks: Dict[str, dict] = {}
         self._results: Dict[str, list] = {}
+        self._orders: Dict[str, Dict[str, List[int]]] = {}
+        self._completed_at: Deque[float] = deque(maxlen=1000)
+        # 版本号：任务表整体一个，每个任务一个；epoch 区分进程重启，避免版本号重置后 ETag 撞车
+        self._epoch = uuid.uuid4().hex[:8]
+        self._list_version = 0
+        self._versions: Dict[str, int] = {}
         self._lock = asyncio.Lock()
 
+    def _bump(self, keyword: str) -> None:
+        self._list_version += 1
+        self._versions[keyword] = self._versions.get(keyword, 0) + 1
+
     async def add_tasks(self, keywords: List[str], note_limit: int) -> Tuple[List[str], List[str]]:
         """
         添加任务，返回(新建, 已存在)
@@ -38,6 +56,7 @@ class InMemoryStore:
                     skipped.append(kw)
                     continue
                 self._tasks[kw] = {"keyword": kw, "status": "pending", "note_limit": note_limit, "error": None}
+                self._bump(kw)
                 created.append(kw)
         return created, skipped
 
@@ -45,6 +64,11 @@ class InMemoryStore:
         async with self._lock:
             return list(self._tasks.values())
 
+    async def get_task(self, keyword: str) -> Optional[dict]:
+        async with self._lock:
+            task = self._tasks.get(keyword)
+            return dict(task) if task else None
+
     async def get_pending(self, limit: int) -> List[dict]:
         async with self._lock:
             pending = [t for t in self._tasks.values() if t["status"] == "pending"]
@@ -54,85 +78,300 @@ class InMemoryStore:
         async with self._lock:
             if keyword in self._tasks:
                 self._tasks[keyword]["status"] = "running"
+                self._bump(keyword)
 
     async def mark_done(self, keyword: str, notes: list) -> None:
+        orders = build_sort_orders(notes)
         async with self._lock:
             if keyword in self._tasks:
                 self._tasks[keyword]["status"] = "success"
                 self._results[keyword] = notes
+                self._orders[keyword] = orders
+                self._completed_at.append(time.time())
+                self._bump(keyword)
 
     async def mark_failed(self, keyword: str, error: str) -> None:
         async with self._lock:
             if keyword in self._tasks:
                 self._tasks[keyword]["status"] = "failed"
                 self._tasks[keyword]["error"] = error
+                self._completed_at.append(time.time())
+                self._bump(keyword)
 
     async def get_result(self, keyword: str) -> Optional[list]:
         async with self._lock:
             return self._results.get(keyword)
 
+    async def get_result_orders(self, keyword: str) -> Optional[Dict[str, List[int]]]:
+        """
+        结果写入时预计算的各排序字段下标序列，见 build_sort_orders
+        """
+        async with self._lock:
+            return self._orders.get(keyword)
+
+    async def get_version(self, keyword: Optional[str] = None) -> str:
+        """
+        版本标识：keyword 为 None 时为任务列表版本，否则为该任务（状态 + 结果）版本；任何变更都会改变它
+        """
+        async with self._lock:
+            version = self._list_version if keyword is None else self._versions.get(keyword, 0)
+            return f"{self._epoch}.{version}"
+
+    async def count_pending(self) -> int:
+        async with self._lock:
+            return sum(1 for t in self._tasks.values() if t["status"] == "pending")
+
+    async def drain_rate(self, window: float = 600) -> float:
+        """
+        最近 window 秒内的任务完成速率（个/秒），样本不足返回 0
+        """
+        async with self._lock:
+            return compute_drain_rate(self._completed_at, window)
+
+    async def heartbeat(self, keyword: str) -> None:
+        """单进程内无租约，续约为空操作（与 RedisStore 接口保持一致）"""
+
+    async def close(self) -> None:
+        pass
+
 
 class TaskScheduler:
     """
     简单的轮询调度器，基于 asyncio 协程并发执行，不依赖消息队列。
     """
 
-    def __init__(self, store: InMemoryStore, concurrency: int = 3, poll_interval: float = 2.0) -> None:
+    def __init__(
+        self,
+        store: InMemoryStore,
+        concurrency: int = 3,
+        poll_interval: float = 2.0,
+        heartbeat_interval: float = 30.0,
+        checkpoints=None,
+        checkpoint_interval: float = 5.0,
+        events: Optional[TaskEventHub] = None,
+        media=None,
+    ) -> None:
         self.store = store
         self.concurrency = concurrency
         self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.checkpoints = checkpoints
+        self.checkpoint_interval = checkpoint_interval
+        self.events = events or TaskEventHub()
+        self.media = media
         self._stop_event = asyncio.Event()
         self._worker_task: Optional[asyncio.Task] = None
 
     async def start(self) -> None:
         if self._worker_task is None or self._worker_task.done():
+            self._stop_event.clear()
+            await self._resume_checkpoints()
             self._worker_task = asyncio.create_task(self._worker_loop())
-            logger.info("TaskScheduler started with concurrency=%s", self.concurrency)
+            logger.info("TaskScheduler started with concurrency={}", self.concurrency)
 
-    async def shutdown(self) -> None:
+    async def stop(self) -> None:
+        """
+        停止执行任务（等待执行中的任务结束），存储保持可用，可再次 start
+        """
         self._stop_event.set()
         if self._worker_task:
             await self._worker_task
+            self._worker_task = None
+
+    async def shutdown(self) -> None:
+        await self.stop()
+        await self.store.close()
+        if self.media is not None:
+            await self.media.close()
 
     async def enqueue_keywords(self, keywords: List[str], note_limit: int) -> Tuple[List[str], List[str]]:
-        return await self.store.add_tasks(keywords, note_limit)
+        created, skipped = await self.store.add_tasks(keywords, note_limit)
+        for kw in created:
+            self.events.publish(kw, {"event": "status", "status": "pending"})
+        return created, skipped
 
     async def list_tasks(self) -> List[dict]:
         return await self.store.list_tasks()
 
+    async def get_task(self, keyword: str) -> Optional[dict]:
+        return await self.store.get_task(keyword)
+
+    async def get_version(self, keyword: Optional[str] = None) -> str:
+        return await self.store.get_version(keyword)
+
     async def get_result(self, keyword: str) -> Optional[list]:
         return await self.store.get_result(keyword)
 
+    async def get_result_orders(self, keyword: str) -> Optional[Dict[str, List[int]]]:
+        return await self.store.get_result_orders(keyword)
+
+    async def queue_depth(self) -> int:
+        return await self.store.count_pending()
+
+    async def drain_rate(self, window: float = 600) -> float:
+        return await self.store.drain_rate(window)
+
+    async def _heartbeat_loop(self, keyword: str) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.store.heartbeat(keyword)
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning("heartbeat failed keyword={} err={}", keyword, exc)
+
+    def _checkpoint_saver(
+        self, note_limit: int, attempts: int = 0
+    ) -> Tuple[Callable[[str, dict], Awaitable[None]], Callable[[], Awaitable[None]]]:
+        """
+        断点保存回调：爬虫每完成一页都会调用，这里按 checkpoint_interval 限流落盘；
+        返回 (save, flush)，flush 立即保存被限流跳过的最新进度（任务失败时调用）。
+        attempts 为续爬前断点已累计的失败次数，保存进度时原样保留
+        """
+        last_saved = 0.0
+        unsaved: Dict[str, dict] = {}
+
+        async def write(keyword: str, state: dict) -> None:
+            try:
+                await self.checkpoints.save(keyword, note_limit, state, attempts=attempts)
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning("save checkpoint failed keyword={} err={}", keyword, exc)
+
+        async def save(keyword: str, state: dict) -> None:
+            nonlocal last_saved
+            now = time.monotonic()
+            if now - last_saved < self.checkpoint_interval:
+                unsaved[keyword] = state
+                return
+            last_saved = now
+            unsaved.pop(keyword, None)
+            await write(keyword, state)
+
+        async def flush() -> None:
+            while unsaved:
+                await write(*unsaved.popitem())
+
+        return save, flush
+
+    async def _resume_checkpoints(self) -> None:
+        """
+        将存在断点的关键词重新入队（进程重启后续爬）；
+        失败次数达到上限或过旧的断点已由 list_all 清除，不会被无限重试
+        """
+        if self.checkpoints is None:
+            return
+        try:
+            checkpoints = await self.checkpoints.list_all()
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("load checkpoints failed err={}", exc)
+            return
+        for cp in checkpoints:
+            created, _ = await self.store.add_tasks([cp["keyword"]], cp["note_limit"])
+            if created:
+                logger.info("resume keyword={} from checkpoint page={}", cp["keyword"], cp["state"].get('page'))
+
+    async def _run_task(self, task: dict) -> None:
+        kw = task["keyword"]
+        self.events.publish(kw, {"event": "status", "status": "running"})
+        heartbeat = asyncio.create_task(self._heartbeat_loop(kw))
+        checkpoint, on_checkpoint, flush_checkpoint = None, None, None
+        try:
+            if self.checkpoints is not None:
+                saved = await self.checkpoints.load(kw)
+                checkpoint = saved["state"] if saved else None
+                on_checkpoint, flush_checkpoint = self._checkpoint_saver(
+                    task["note_limit"], saved.get("attempts", 0) if saved else 0
+                )
+            crawler = AsyncXhsCrawler(media=self.media)
+            notes = await crawler.crawl_keywords(
+                [kw],
+                per_keyword=task["note_limit"],
+                checkpoints={kw: checkpoint} if checkpoint else None,
+                on_checkpoint=on_checkpoint,
+                on_event=self.events.publish,
+            )
+            await self.store.mark_done(kw, notes.get(kw, []))
+            # 只有成功才删除断点；失败的任务保留断点，重新提交或重启后从中断处继续
+            if self.checkpoints is not None:
+                try:
+                    await self.checkpoints.clear(kw)
+                except Exception as exc:  # pylint: disable=broad-except
+                    logger.warning("clear checkpoint failed keyword={} err={}", kw, exc)
+            self.events.publish(kw, {"event": "status", "status": "success"})
+            logger.info("crawl success keyword={} count={}", kw, len(notes.get(kw, [])))
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("crawl failed keyword={} err={}", kw, exc)
+            if flush_checkpoint is not None:
+                await flush_checkpoint()
+                try:
+                    attempts = await self.checkpoints.record_failure(kw)
+                    if attempts:
+                        logger.info("checkpoint failure recorded keyword={} attempts={}", kw, attempts)
+                except Exception as exc:  # pylint: disable=broad-except
+                    logger.warning("record checkpoint failure failed keyword={} err={}", kw, exc)
+            await self.store.mark_failed(kw, str(exc))
+            self.events.publish(kw, {"event": "status", "status": "failed", "error": str(exc)})
+        finally:
+            heartbeat.cancel()
+
     async def _worker_loop(self) -> None:
-        sem = asyncio.Semaphore(self.concurrency)
+        # 只领取空闲槽位数量的任务：领取即开始执行并续约，
+        # 不会有已加租约却在本地排队的任务因租约到期被其他节点重复执行
+        running: Set[asyncio.Task] = set()
         while not self._stop_event.is_set():
-            pending = await self.store.get_pending(self.concurrency * 2)
+            free = self.concurrency - len(running)
+            if free <= 0:
+                await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            pending = await self.store.get_pending(free)
             if not pending:
                 await asyncio.sleep(self.poll_interval)
                 continue
+            for task in pending:
+                # 先标记 running，下一轮领取不会再拿到同一任务
+                await self.store.mark_running(task["keyword"])
+                job = asyncio.create_task(self._run_task(task))
+                running.add(job)
+                job.add_done_callback(running.discard)
+        if running:
+            await asyncio.gather(*running)
+
 
-            async def handle(task: dict):
-                async with sem:
-                    kw = task["keyword"]
-                    await self.store.mark_running(kw)
-                    try:
-                        crawler = AsyncXhsCrawler()
-                        notes = await crawler.crawl_keywords([kw], per_keyword=task["note_limit"])
-                        await self.store.mark_done(kw, notes.get(kw, []))
-                        logger.info("crawl success keyword=%s count=%s", kw, len(notes.get(kw, [])))
-                    except Exception as exc:  # pylint: disable=broad-except
-                        logger.error("crawl failed keyword=%s err=%s", kw, exc)
-                        await self.store.mark_failed(kw, str(exc))
+def create_store():
+    """
+    按 TASK_STORE_BACKEND 创建任务存储：memory（默认，单进程）/ redis（多节点共享）
+    """
+    backend = os.getenv("TASK_STORE_BACKEND", "memory").lower()
+    if backend == "redis":
+        from app.task.redis_store import RedisStore
 
-            await asyncio.gather(*(handle(t) for t in pending))
-            await asyncio.sleep(self.poll_interval)
+        return RedisStore()
+    if backend != "memory":
+        raise ValueError(f"unknown TASK_STORE_BACKEND: {backend}")
+    return InMemoryStore()
 
 
-_store = InMemoryStore()
+def create_checkpoint_store(store):
+    """
+    创建断点存储：redis 后端共用 Redis（任意节点可续爬），否则写本地文件；CHECKPOINT_ENABLED=false 时关闭
+    """
+    if os.getenv("CHECKPOINT_ENABLED", "true").lower() != "true":
+        return None
+    if os.getenv("TASK_STORE_BACKEND", "memory").lower() == "redis":
+        from app.task.redis_store import RedisCheckpointStore
+
+        return RedisCheckpointStore(store.client, prefix=store.prefix)
+    return FileCheckpointStore()
+
+
+_store = create_store()
 _scheduler = TaskScheduler(
     store=_store,
     concurrency=int(os.getenv("SCHEDULER_CONCURRENCY", "3")),
     poll_interval=float(os.getenv("SCHEDULER_POLL_INTERVAL", "2")),
+    heartbeat_interval=float(os.getenv("SCHEDULER_HEARTBEAT_INTERVAL", "30")),
+    checkpoints=create_checkpoint_store(_store),
+    checkpoint_interval=float(os.getenv("CHECKPOINT_INTERVAL", "5")),
+    media=create_media_pipeline(),
 )
 
 
@@ -144,14 +383,23 @@ async def startup_scheduler() -> None:
     await _scheduler.start()
 
 
+async def stop_scheduler() -> None:
+    """停止执行任务但保留存储（失去调度器主进程身份时调用）"""
+    await _scheduler.stop()
+
+
 async def shutdown_scheduler() -> None:
     await _scheduler.shutdown()
 
 
 __all__ = [
+    "InMemoryStore",
     "TaskScheduler",
+    "create_store",
+    "create_checkpoint_store",
     "get_scheduler",
     "startup_scheduler",
+    "stop_scheduler",
     "shutdown_scheduler",
 ]
 
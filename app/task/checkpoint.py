@@ -0,0 +1,145 @@
+"""
+爬取断点存储
+
+断点记录单个关键词任务的爬取进度（下一搜索页、已接受笔记、每条笔记的评论游标），
+进程重启后 TaskScheduler 据此续爬，避免从头重新请求。
+
+断点同时记录从它续爬失败的次数（attempts）与最后更新时间（updated_at）：
+失败次数达到 CHECKPOINT_MAX_ATTEMPTS 或超过 CHECKPOINT_MAX_AGE 秒未更新的断点视为过期，
+读取时删除，不再续爬，避免总是失败的关键词在每次重启后被无限重试。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+
+from app.task import codec
+
+
+def checkpoint_limits(max_age: Optional[float], max_attempts: Optional[int]):
+    """
+    断点过期参数，未指定时读取 CHECKPOINT_MAX_AGE（默认1天）与 CHECKPOINT_MAX_ATTEMPTS（默认3），0 表示不限制
+    """
+    if max_age is None:
+        max_age = float(os.getenv("CHECKPOINT_MAX_AGE", str(24 * 3600)))
+    if max_attempts is None:
+        max_attempts = int(os.getenv("CHECKPOINT_MAX_ATTEMPTS", "3"))
+    return max_age, max_attempts
+
+
+def is_expired(checkpoint: dict, max_age: float, max_attempts: int) -> bool:
+    if max_attempts > 0 and checkpoint.get("attempts", 0) >= max_attempts:
+        return True
+    return max_age > 0 and time.time() - checkpoint.get("updated_at", 0) > max_age
+
+
+class FileCheckpointStore:
+    """
+    本地文件断点存储，每个关键词一个 JSON 文件（写临时文件后原子替换）
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_age: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            directory: 断点目录，默认读取 CHECKPOINT_DIR（默认 data/checkpoints）
+            max_age: 断点最长保留秒数，默认读取 CHECKPOINT_MAX_AGE
+            max_attempts: 续爬失败次数上限，默认读取 CHECKPOINT_MAX_ATTEMPTS
+        """
+        self.directory = Path(directory or os.getenv("CHECKPOINT_DIR", "data/checkpoints"))
+        self.max_age, self.max_attempts = checkpoint_limits(max_age, max_attempts)
+
+    def _path(self, keyword: str) -> Path:
+        digest = hashlib.sha1(keyword.encode("utf-8")).hexdigest()
+        return self.directory / f"{digest}.json"
+
+    def _write(self, path: Path, payload: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(payload, encoding="utf-8")
+        os.replace(tmp, path)
+
+    async def save(self, keyword: str, note_limit: int, state: dict, attempts: int = 0) -> None:
+        # 在事件循环线程内序列化快照，避免写盘期间 state 被爬虫修改
+        payload = codec.dumps(
+            {
+                "keyword": keyword,
+                "note_limit": note_limit,
+                "state": state,
+                "attempts": attempts,
+                "updated_at": time.time(),
+            }
+        )
+        await asyncio.to_thread(self._write, self._path(keyword), payload)
+
+    async def _read(self, keyword: str) -> Optional[dict]:
+        path = self._path(keyword)
+        try:
+            text = await asyncio.to_thread(path.read_text, encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        try:
+            return codec.loads(text)
+        except ValueError as exc:
+            logger.warning("corrupted checkpoint ignored keyword={} err={}", keyword, exc)
+            return None
+
+    async def load(self, keyword: str) -> Optional[dict]:
+        """
+        Returns:
+            Optional[dict]: {"keyword", "note_limit", "state", "attempts", "updated_at"}，不存在或已过期返回 None
+        """
+        checkpoint = await self._read(keyword)
+        if checkpoint is not None and is_expired(checkpoint, self.max_age, self.max_attempts):
+            logger.info("expired checkpoint dropped keyword={} attempts={}", keyword, checkpoint.get("attempts", 0))
+            await self.clear(keyword)
+            return None
+        return checkpoint
+
+    async def record_failure(self, keyword: str) -> int:
+        """
+        记录一次续爬失败，返回累计失败次数（没有断点时返回 0）
+        """
+        checkpoint = await self._read(keyword)
+        if checkpoint is None:
+            return 0
+        checkpoint["attempts"] = checkpoint.get("attempts", 0) + 1
+        await asyncio.to_thread(self._write, self._path(keyword), codec.dumps(checkpoint))
+        return checkpoint["attempts"]
+
+    async def clear(self, keyword: str) -> None:
+        try:
+            await asyncio.to_thread(os.remove, self._path(keyword))
+        except FileNotFoundError:
+            pass
+
+    async def list_all(self) -> List[dict]:
+        if not self.directory.is_dir():
+            return []
+        checkpoints = []
+        for path in self.directory.glob("*.json"):
+            try:
+                checkpoint = codec.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as exc:
+                logger.warning("skip unreadable checkpoint {}: {}", path, exc)
+                continue
+            if is_expired(checkpoint, self.max_age, self.max_attempts):
+                logger.info("expired checkpoint dropped keyword={}", checkpoint.get("keyword"))
+                await self.clear(checkpoint.get("keyword", ""))
+                continue
+            checkpoints.append(checkpoint)
+        return checkpoints
+
+
+__all__ = ["FileCheckpointStore", "checkpoint_limits", "is_expired"]
@@ -0,0 +1,39 @@
+"""
+任务数据 JSON 编解码
+
+笔记数据中的 publish_time 为 datetime，标准 json 无法直接序列化；
+这里以 {"$dt": iso} 形式编码，解码时还原为 datetime，保证跨进程/跨存储往返一致。
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from typing import Any
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        return {"$dt": obj.isoformat()}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _object_hook(obj: dict) -> Any:
+    if len(obj) == 1 and "$dt" in obj:
+        return datetime.fromisoformat(obj["$dt"])
+    return obj
+
+
+def dumps(obj: Any) -> str:
+    """序列化为 JSON 字符串（支持 datetime）"""
+    return json.dumps(obj, ensure_ascii=False, default=_default, separators=(",", ":"))
+
+
+def loads(data: str | bytes | None) -> Any:
+    """反序列化 JSON 字符串，空值返回 None"""
+    if data is None:
+        return None
+    return json.loads(data, object_hook=_object_hook)
+
+
+__all__ = ["dumps", "loads"]
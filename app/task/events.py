@@ -0,0 +1,164 @@
+"""
+任务事件分发（进程内）
+
+调度器与爬虫在状态变化、每页进度、每条笔记完成时发布事件，
+订阅者（流式结果接口等）各自持有有界队列，发布方从不阻塞：
+订阅者消费过慢导致队列写满时标记为 lagged，由消费方自行结束并提示客户端改为拉取完整结果。
+只关心状态与进度的订阅者（WebSocket 进度推送）使用合并订阅：同一任务未送出的进度只保留最新一条。
+
+事件格式：
+    {"event": "status", "keyword": ..., "status": "pending|running|success|failed", "error": ...}
+    {"event": "progress", "keyword": ..., "pages": n, "notes": n, "comments": n}
+    {"event": "note", "keyword": ..., "note": {...}}
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple, Union
+
+TERMINAL_STATUSES = {"success", "failed"}
+
+
+class Subscription:
+    """
+    单个订阅者：有界队列 + 溢出标记
+    """
+
+    def __init__(self, keyword: Optional[str], maxsize: int) -> None:
+        self.keyword = keyword
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.lagged = False
+
+    def offer(self, event: dict) -> None:
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """
+        取下一个事件，超时返回 None
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class CoalescingSubscription:
+    """
+    合并订阅：只接收 kinds 中的事件，按 (关键词, 事件类型) 合并，未送出的旧事件被新事件替换；
+    待送出条目超过 maxsize 时丢弃最旧的一条并计入 dropped，发布方与其他订阅者不受慢消费者影响
+    """
+
+    def __init__(
+        self,
+        keyword: Optional[str],
+        maxsize: int,
+        kinds: FrozenSet[str] = frozenset({"status", "progress"}),
+    ) -> None:
+        self.keyword = keyword
+        self.maxsize = maxsize
+        self.kinds = kinds
+        self.lagged = False
+        self.coalesced = 0
+        self.dropped = 0
+        self._pending: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def offer(self, event: dict) -> None:
+        kind = event["event"]
+        if kind not in self.kinds:
+            return
+        key = (event["keyword"], kind)
+        if self._pending.pop(key, None) is not None:
+            self.coalesced += 1
+        # 重新放到末尾，保证同一任务的状态变化顺序不倒置
+        self._pending[key] = event
+        while len(self._pending) > self.maxsize:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """
+        取下一个事件，超时返回 None
+        """
+        if not self._pending:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+        _, event = self._pending.popitem(last=False)
+        return event
+
+
+class TaskEventHub:
+    """
+    任务事件中心：按关键词分发，并缓存执行中任务已完成的笔记，供中途加入的订阅者补发
+    """
+
+    def __init__(self, queue_size: int = 1000) -> None:
+        self.queue_size = queue_size
+        self._subscribers: Dict[Optional[str], Set[Subscription]] = {}
+        self._notes: Dict[str, List[dict]] = {}
+        self._progress: Dict[str, dict] = {}
+
+    def subscribe(
+        self, keyword: Optional[str] = None, coalesce: bool = False
+    ) -> Union[Subscription, CoalescingSubscription]:
+        """
+        订阅指定关键词的事件，keyword 为 None 时订阅全部；coalesce=True 时只收状态与进度并合并
+        """
+        if coalesce:
+            sub = CoalescingSubscription(keyword, self.queue_size)
+        else:
+            sub = Subscription(keyword, self.queue_size)
+        self._subscribers.setdefault(keyword, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Union[Subscription, CoalescingSubscription]) -> None:
+        subs = self._subscribers.get(sub.keyword)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subscribers[sub.keyword]
+
+    def snapshot(self, keyword: str) -> List[dict]:
+        """
+        执行中任务已完成的笔记（订阅后立即调用，与后续事件无缝衔接）
+        """
+        return list(self._notes.get(keyword, []))
+
+    def progress(self, keyword: str) -> Optional[dict]:
+        """
+        执行中任务最近一次进度事件
+        """
+        return self._progress.get(keyword)
+
+    def publish(self, keyword: str, event: dict) -> None:
+        event = {**event, "keyword": keyword}
+        kind = event["event"]
+        if kind == "status":
+            if event["status"] == "running":
+                self._notes[keyword] = []
+            elif event["status"] in TERMINAL_STATUSES:
+                self._notes.pop(keyword, None)
+                self._progress.pop(keyword, None)
+        elif kind == "progress":
+            self._progress[keyword] = event
+        elif kind == "note" and keyword in self._notes:
+            self._notes[keyword].append(event["note"])
+
+        for sub in list(self._subscribers.get(keyword, ())):
+            sub.offer(event)
+        for sub in list(self._subscribers.get(None, ())):
+            sub.offer(event)
+
+
+__all__ = ["TaskEventHub", "Subscription", "CoalescingSubscription", "TERMINAL_STATUSES"]
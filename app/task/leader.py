@@ -0,0 +1,266 @@
+"""
+调度器选主：多个 API 进程中只有一个运行调度器（任务执行、断点续爬、周期重爬）
+
+其余进程只处理 HTTP 请求，通过共享任务存储（TASK_STORE_BACKEND=redis）读写任务状态与结果；
+未当选的进程每 SCHEDULER_LEADER_RETRY 秒重试一次，主进程退出或失去锁后由其他进程接替。
+
+锁后端（SCHEDULER_LEADER_LOCK）：
+    file  - 本机文件锁（默认），适用于同一台机器上的多个 uvicorn worker
+    mysql - MySQL GET_LOCK 会话锁，适用于多台机器；锁随数据库连接断开而释放
+    none  - 不选主，每个进程都运行调度器（单进程部署）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLeaderLock:
+    """
+    文件锁：进程退出（含崩溃）时由操作系统自动释放
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or os.getenv("SCHEDULER_LOCK_FILE", os.path.join("data", "scheduler.lock"))
+        self._fd: Optional[int] = None
+
+    async def acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        # 记录持有者 pid，便于排查
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode("ascii"))
+        self._fd = fd
+        return True
+
+    async def held(self) -> bool:
+        return self._fd is not None
+
+    async def release(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class MySQLLeaderLock:
+    """
+    MySQL GET_LOCK 会话锁：占用连接池中的一个连接直到释放；定期检查兼作保活
+    """
+
+    def __init__(self, name: Optional[str] = None) -> None:
+        self.name = name or os.getenv("SCHEDULER_LOCK_NAME", "xhs_scheduler")
+        self._conn = None
+
+    async def acquire(self) -> bool:
+        from sqlalchemy import text
+
+        from app.db import get_engine
+
+        if self._conn is None:
+            self._conn = await get_engine().connect()
+        try:
+            result = await self._conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": self.name})
+            acquired = result.scalar() == 1
+        except Exception:
+            await self._discard()
+            raise
+        if not acquired:
+            await self._discard()
+        return acquired
+
+    async def held(self) -> bool:
+        from sqlalchemy import text
+
+        if self._conn is None:
+            return False
+        try:
+            result = await self._conn.execute(
+                text("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()"), {"name": self.name}
+            )
+            return result.scalar() == 1
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("scheduler lock check failed, treating the lock as lost: {}", exc)
+            await self._discard()
+            return False
+
+    async def release(self) -> None:
+        from sqlalchemy import text
+
+        if self._conn is None:
+            return
+        try:
+            await self._conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": self.name})
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("scheduler lock release failed, it is released when the connection closes: {}", exc)
+        await self._discard()
+
+    async def _discard(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                await conn.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+
+
+class NullLeaderLock:
+    """不选主：总是当选"""
+
+    async def acquire(self) -> bool:
+        return True
+
+    async def held(self) -> bool:
+        return True
+
+    async def release(self) -> None:
+        pass
+
+
+def create_leader_lock():
+    """
+    按 SCHEDULER_LEADER_LOCK 创建选主锁：file（默认）/ mysql / none
+    """
+    backend = os.getenv("SCHEDULER_LEADER_LOCK", "file").lower()
+    if backend == "file":
+        return FileLeaderLock()
+    if backend == "mysql":
+        return MySQLLeaderLock()
+    if backend == "none":
+        return NullLeaderLock()
+    raise ValueError(f"unknown SCHEDULER_LEADER_LOCK: {backend}")
+
+
+class LeaderElector:
+    """
+    选主循环：当选时调用 on_elected，失去锁或退出时调用 on_demoted
+    """
+
+    def __init__(
+        self,
+        lock,
+        on_elected: Callable[[], Awaitable[None]],
+        on_demoted: Callable[[], Awaitable[None]],
+        retry_interval: float = 10.0,
+    ) -> None:
+        self.lock = lock
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.retry_interval = retry_interval
+        self.is_leader = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self._try_elect()
+        if not self.is_leader:
+            logger.info("scheduler runs in another process, serving API requests only pid={}", os.getpid())
+        self._task = asyncio.create_task(self._loop())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            self.is_leader = False
+            await self.on_demoted()
+        await self.lock.release()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.retry_interval)
+            try:
+                if self.is_leader:
+                    if not await self.lock.held():
+                        logger.warning("scheduler lock lost, stopping scheduler pid={}", os.getpid())
+                        self.is_leader = False
+                        await self.on_demoted()
+                else:
+                    await self._try_elect()
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.error("leader election loop failed: {}", exc)
+
+    async def _try_elect(self) -> None:
+        try:
+            acquired = await self.lock.acquire()
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("scheduler lock acquire failed: {}", exc)
+            return
+        if not acquired:
+            return
+        self.is_leader = True
+        logger.info("elected scheduler leader pid={}", os.getpid())
+        try:
+            await self.on_elected()
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("scheduler start failed, releasing the lock: {}", exc)
+            self.is_leader = False
+            try:
+                await self.on_demoted()
+            finally:
+                await self.lock.release()
+
+
+_elector: Optional[LeaderElector] = None
+
+
+async def startup_leader(on_elected: Callable[[], Awaitable[None]], on_demoted: Callable[[], Awaitable[None]]) -> None:
+    global _elector
+    _elector = LeaderElector(
+        create_leader_lock(),
+        on_elected=on_elected,
+        on_demoted=on_demoted,
+        retry_interval=float(os.getenv("SCHEDULER_LEADER_RETRY", "10")),
+    )
+    await _elector.start()
+
+
+async def shutdown_leader() -> None:
+    if _elector is not None:
+        await _elector.shutdown()
+
+
+def is_leader() -> bool:
+    return _elector is not None and _elector.is_leader
+
+
+__all__ = [
+    "FileLeaderLock",
+    "MySQLLeaderLock",
+    "NullLeaderLock",
+    "LeaderElector",
+    "create_leader_lock",
+    "startup_leader",
+    "shutdown_leader",
+    "is_leader",
+]
@@ -0,0 +1,23 @@
+"""
+任务吞吐统计
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Iterable
+
+
+def compute_drain_rate(completed_at: Iterable[float], window: float) -> float:
+    """
+    根据完成时间戳估算队列消化速率（个/秒）：窗口内完成数 / 窗口内首个完成至今的时长，样本不足返回 0
+    """
+    now = time.time()
+    recent = [t for t in completed_at if t >= now - window]
+    if len(recent) < 2:
+        return 0.0
+    elapsed = now - min(recent)
+    return len(recent) / elapsed if elapsed > 0 else 0.0
+
+
+__all__ = ["compute_drain_rate"]
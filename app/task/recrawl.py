@@ -0,0 +1,358 @@
+"""
+基于新鲜度的周期性重爬调度
+
+以数据库 keywords 表为监控清单：
+- last_crawl_time + 当前间隔 <= 现在 即为到期，按 priority 从高到低入队 TaskScheduler；
+- 每轮爬取结束后按新增笔记占比调整间隔：变化大的缩短、稳定的退避，并累加 total_notes；
+  没有上一轮笔记快照时以 total_notes 为对照基线；
+- 全局每小时请求预算按 (priority + 1) 权重分摊，决定每个关键词的最小重爬间隔，
+  入队前再经令牌桶扣减，保证总请求速率不超预算。令牌桶启动时为空，重启不会产生突发。
+
+自适应间隔与上一轮笔记 ID 持久化在重爬状态存储中（本地文件或 Redis），
+重启或调度器主进程切换后继续收敛，而不是全部回到初始间隔。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import math
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from app.task import codec
+from app.task.async_scheduler import TaskScheduler, get_scheduler
+
+# keywords.status：1-待爬取，2-爬取中，3-已完成，4-已失败
+STATUS_CRAWLING = 2
+STATUS_DONE = 3
+STATUS_FAILED = 4
+
+
+class FileRecrawlStateStore:
+    """
+    本地文件重爬状态存储（当前间隔、上一轮笔记 ID），每个关键词一个 JSON 文件
+    """
+
+    def __init__(self, directory: Optional[str] = None) -> None:
+        """
+        Args:
+            directory: 状态目录，默认读取 RECRAWL_STATE_DIR（默认 data/recrawl）
+        """
+        self.directory = Path(directory or os.getenv("RECRAWL_STATE_DIR", "data/recrawl"))
+
+    def _path(self, keyword: str) -> Path:
+        digest = hashlib.sha1(keyword.encode("utf-8")).hexdigest()
+        return self.directory / f"{digest}.json"
+
+    def _write(self, path: Path, payload: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(payload, encoding="utf-8")
+        os.replace(tmp, path)
+
+    async def save(self, keyword: str, state: dict) -> None:
+        payload = codec.dumps({**state, "keyword": keyword})
+        await asyncio.to_thread(self._write, self._path(keyword), payload)
+
+    async def list_all(self) -> Dict[str, dict]:
+        """
+        Returns:
+            Dict[str, dict]: keyword -> {"interval", "note_ids"}
+        """
+        if not self.directory.is_dir():
+            return {}
+        states = {}
+        for path in self.directory.glob("*.json"):
+            try:
+                state = codec.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as exc:
+                logger.warning("skip unreadable recrawl state {}: {}", path, exc)
+                continue
+            states[state.pop("keyword")] = state
+        return states
+
+
+def create_recrawl_state_store(store):
+    """
+    创建重爬状态存储：redis 后端共用 Redis（任意进程接任调度器后可读取），否则写本地文件
+    """
+    if os.getenv("TASK_STORE_BACKEND", "memory").lower() == "redis":
+        from app.task.redis_store import RedisRecrawlStateStore
+
+        return RedisRecrawlStateStore(store.client, prefix=store.prefix)
+    return FileRecrawlStateStore()
+
+
+class RecrawlScheduler:
+    """
+    周期性重爬调度器
+    """
+
+    def __init__(
+        self,
+        scheduler: TaskScheduler,
+        requests_per_hour: int = 3600,
+        base_interval: float = 6 * 3600,
+        min_interval: float = 1800,
+        max_interval: float = 7 * 24 * 3600,
+        note_limit: int = 50,
+        tick_interval: float = 60,
+        max_keywords: int = 1000,
+        state_store=None,
+    ) -> None:
+        """
+        Args:
+            scheduler: 执行爬取的任务调度器
+            requests_per_hour: 全局每小时请求预算（搜索页 + 评论页）
+            base_interval: 初始重爬间隔（秒）
+            min_interval: 间隔下限（秒）
+            max_interval: 间隔上限（秒）
+            note_limit: 每次重爬抓取笔记数
+            tick_interval: 检查到期关键词的周期（秒）
+            max_keywords: 单次读取的关键词数量上限
+            state_store: 重爬状态存储（间隔与上一轮笔记 ID），None 时只保存在内存
+        """
+        self.scheduler = scheduler
+        self.requests_per_hour = requests_per_hour
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.note_limit = note_limit
+        self.tick_interval = tick_interval
+        self.max_keywords = max_keywords
+        self.state_store = state_store
+
+        # 变化率阈值与间隔调整系数
+        self.high_change = 0.3
+        self.low_change = 0.05
+        self.speedup = 0.5
+        self.backoff = 1.5
+
+        self._intervals: Dict[str, float] = {}
+        self._note_ids: Dict[str, Set[str]] = {}
+        self._inflight: Dict[str, int] = {}  # keyword -> keywords.id
+        # 令牌桶从空开始按速率补充：每次（重新）启动不会先放出一整小时的预算
+        self._tokens = 0.0
+        self._refilled_at = time.monotonic()
+        self._stop_event = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def estimate_cost(self) -> int:
+        """
+        单次爬取的请求数估算：搜索页 + 每条笔记的评论页
+        """
+        comment_limit = int(os.getenv("COMMENT_LIMIT", "20"))
+        search_pages = math.ceil(self.note_limit / 20)
+        comment_pages = max(1, math.ceil(comment_limit / 20))
+        return search_pages + self.note_limit * comment_pages
+
+    def budget_interval(self, priority: int, total_weight: float) -> float:
+        """
+        按优先级分摊预算后，该关键词允许的最小重爬间隔（秒）
+        """
+        share = (max(priority, 0) + 1) / total_weight
+        allowed_per_hour = self.requests_per_hour * share
+        if allowed_per_hour <= 0:
+            return self.max_interval
+        return self.estimate_cost() / allowed_per_hour * 3600
+
+    def interval_for(self, keyword: str, priority: int, total_weight: float) -> float:
+        interval = self._intervals.get(keyword, self.base_interval)
+        interval = max(interval, self.budget_interval(priority, total_weight))
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def adapt_interval(self, keyword: str, change: Optional[float]) -> float:
+        """
+        根据新增笔记占比调整间隔；change 为 None（无上一轮对照）时保持不变
+        """
+        interval = self._intervals.get(keyword, self.base_interval)
+        if change is not None:
+            if change >= self.high_change:
+                interval *= self.speedup
+            elif change <= self.low_change:
+                interval *= self.backoff
+        interval = min(max(interval, self.min_interval), self.max_interval)
+        self._intervals[keyword] = interval
+        return interval
+
+    def observe(self, keyword: str, ids: Set[str], total_notes: int) -> Tuple[Optional[float], int]:
+        """
+        记录本轮笔记 ID，返回 (变化率, 新增笔记数)
+
+        与上一轮快照对比；没有快照（首次爬取或状态丢失）时以库中 total_notes 为基线，
+        超出历史总数的部分至少是新增。无法判断变化时变化率为 None，不调整间隔
+        """
+        previous = self._note_ids.get(keyword)
+        self._note_ids[keyword] = ids
+        if previous is not None:
+            new_count = len(ids - previous)
+            return new_count / max(len(ids), 1), new_count
+        if not total_notes:
+            return None, len(ids)
+        new_count = max(len(ids) - total_notes, 0)
+        return (new_count / len(ids) if new_count else None), new_count
+
+    async def load_state(self) -> None:
+        """从状态存储恢复各关键词的间隔与上一轮笔记 ID"""
+        if self.state_store is None:
+            return
+        try:
+            states = await self.state_store.list_all()
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("load recrawl state failed err={}", exc)
+            return
+        for keyword, state in states.items():
+            self._intervals[keyword] = float(state["interval"])
+            self._note_ids[keyword] = set(state.get("note_ids") or [])
+
+    async def _save_state(self, keyword: str) -> None:
+        if self.state_store is None:
+            return
+        state = {"interval": self._intervals[keyword], "note_ids": sorted(self._note_ids[keyword])}
+        try:
+            await self.state_store.save(keyword, state)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("save recrawl state failed keyword={} err={}", keyword, exc)
+
+    def _take_tokens(self, cost: int) -> bool:
+        now = time.monotonic()
+        self._tokens = min(
+            float(self.requests_per_hour),
+            self._tokens + (now - self._refilled_at) * self.requests_per_hour / 3600,
+        )
+        self._refilled_at = now
+        if self._tokens < cost:
+            return False
+        self._tokens -= cost
+        return True
+
+    async def start(self) -> None:
+        if self._loop_task is None or self._loop_task.done():
+            self._stop_event.clear()
+            await self.load_state()
+            self._loop_task = asyncio.create_task(self._loop())
+            logger.info("RecrawlScheduler started, budget={} req/h", self.requests_per_hour)
+
+    async def shutdown(self) -> None:
+        self._stop_event.set()
+        if self._loop_task:
+            await self._loop_task
+
+    async def _loop(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                await self.collect_finished()
+                await self.schedule_due()
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.error("recrawl tick failed err={}", exc)
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.tick_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def schedule_due(self) -> List[str]:
+        """
+        将到期关键词按优先级入队，受令牌桶预算约束，返回本轮入队的关键词
+        """
+        from app.db import KeywordCRUD, get_db_session
+
+        enqueued: List[str] = []
+        now = datetime.now()
+        async with get_db_session() as session:
+            keywords = await KeywordCRUD.get_all(session, limit=self.max_keywords, order_by="priority")
+            total_weight = sum(max(k.priority, 0) + 1 for k in keywords) or 1
+            cost = self.estimate_cost()
+            for kw in keywords:
+                if kw.keyword in self._inflight:
+                    continue
+                interval = self.interval_for(kw.keyword, kw.priority, total_weight)
+                if kw.last_crawl_time and (now - kw.last_crawl_time).total_seconds() < interval:
+                    continue
+                if not self._take_tokens(cost):
+                    logger.debug("recrawl budget exhausted, {} deferred", kw.keyword)
+                    break
+                created, _ = await self.scheduler.enqueue_keywords([kw.keyword], self.note_limit)
+                if created:
+                    self._inflight[kw.keyword] = kw.id
+                    await KeywordCRUD.update(session, kw.id, status=STATUS_CRAWLING)
+                    enqueued.append(kw.keyword)
+        if enqueued:
+            logger.info("recrawl enqueued: {}", enqueued)
+        return enqueued
+
+    async def collect_finished(self) -> None:
+        """
+        收集已结束的重爬任务：计算变化率、调整间隔并回写 last_crawl_time/total_notes
+        """
+        if not self._inflight:
+            return
+        from app.db import KeywordCRUD, get_db_session
+
+        tasks = {t["keyword"]: t for t in await self.scheduler.list_tasks()}
+        async with get_db_session() as session:
+            for keyword, keyword_id in list(self._inflight.items()):
+                task = tasks.get(keyword)
+                if task is None or task["status"] in {"pending", "running"}:
+                    continue
+                del self._inflight[keyword]
+                row = await KeywordCRUD.get_by_id(session, keyword_id)
+                if row is None:
+                    continue
+                if task["status"] != "success":
+                    await KeywordCRUD.update(session, keyword_id, status=STATUS_FAILED, last_crawl_time=datetime.now())
+                    continue
+
+                notes = await self.scheduler.get_result(keyword) or []
+                change, new_count = self.observe(keyword, {n["note_id"] for n in notes}, row.total_notes)
+                interval = self.adapt_interval(keyword, change)
+                await self._save_state(keyword)
+                await KeywordCRUD.update(
+                    session,
+                    keyword_id,
+                    status=STATUS_DONE,
+                    last_crawl_time=datetime.now(),
+                    total_notes=row.total_notes + new_count,
+                )
+                logger.info("recrawl done keyword={} new={} change={} next_interval={:.0f}s", keyword, new_count, change, interval)
+
+
+_recrawler: Optional[RecrawlScheduler] = None
+
+
+async def startup_recrawler() -> None:
+    """RECRAWL_ENABLED=true 时启动周期性重爬（依赖数据库 keywords 表）"""
+    global _recrawler
+    if os.getenv("RECRAWL_ENABLED", "false").lower() != "true":
+        return
+    scheduler = await get_scheduler()
+    _recrawler = RecrawlScheduler(
+        scheduler=scheduler,
+        requests_per_hour=int(os.getenv("RECRAWL_REQUESTS_PER_HOUR", "3600")),
+        base_interval=float(os.getenv("RECRAWL_BASE_INTERVAL", str(6 * 3600))),
+        min_interval=float(os.getenv("RECRAWL_MIN_INTERVAL", "1800")),
+        max_interval=float(os.getenv("RECRAWL_MAX_INTERVAL", str(7 * 24 * 3600))),
+        note_limit=int(os.getenv("RECRAWL_NOTE_LIMIT", "50")),
+        tick_interval=float(os.getenv("RECRAWL_TICK_INTERVAL", "60")),
+        state_store=create_recrawl_state_store(scheduler.store),
+    )
+    await _recrawler.start()
+
+
+async def shutdown_recrawler() -> None:
+    if _recrawler is not None:
+        await _recrawler.shutdown()
+
+
+__all__ = [
+    "RecrawlScheduler",
+    "FileRecrawlStateStore",
+    "create_recrawl_state_store",
+    "startup_recrawler",
+    "shutdown_recrawler",
+]
@@ -0,0 +1,424 @@
+"""
+Redis 任务存储：与 InMemoryStore 接口一致，支持多个爬虫节点共享同一任务队列。
+
+数据布局（均带 key 前缀，默认 ``xhs:``）：
+    tasks             HASH   keyword -> 任务 JSON
+    inflight          SET    pending/running 中的关键词（入队去重）
+    queue:pending     LIST   待领取队列（LPUSH 入队，RPOPLPUSH 领取）
+    queue:processing  LIST   已领取、处理中的关键词（可靠队列）
+    leases            ZSET   keyword -> 租约到期时间戳（可见性超时）
+    result:<keyword>  STRING 爬取结果 JSON，带 TTL
+    result_orders:<keyword>  STRING 各排序字段的下标序列 JSON，与结果同 TTL
+
+节点崩溃后，其领取的任务租约到期，会被任意节点在下一次 get_pending 时放回待领取队列。
+入队、领取与回收均由 Lua 脚本原子执行（需 Redis >= 6.2），进程在多步操作之间退出不会留下
+无租约的 processing 条目或永久残留的 inflight 关键词。
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.services.results import build_sort_orders
+from app.task import codec
+from app.task.checkpoint import checkpoint_limits, is_expired
+from app.task.rate import compute_drain_rate
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import WatchError
+except ImportError:  # pragma: no cover - 可选依赖
+    aioredis = None
+    WatchError = None
+
+
+def create_redis_client():
+    """
+    按环境变量创建 Redis 异步客户端
+
+    Returns:
+        redis.asyncio.Redis: 客户端实例
+
+    Raises:
+        RuntimeError: 未安装 redis 依赖
+    """
+    if aioredis is None:
+        raise RuntimeError("redis package is required for the redis task store backend")
+    timeout = float(os.getenv("REDIS_TIMEOUT", "5"))
+    return aioredis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        db=int(os.getenv("REDIS_DB", "0")),
+        password=os.getenv("REDIS_PASSWORD") or None,
+        socket_connect_timeout=timeout,
+        max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+        decode_responses=True,
+    )
+
+
+# 入队：SADD 判重与写任务、入队、版本号在同一脚本内完成
+# KEYS: inflight, tasks, queue:pending, versions  ARGV: keyword, 任务 JSON
+_ADD_TASK = """
+if redis.call('SADD', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('LPUSH', KEYS[3], ARGV[1])
+redis.call('HINCRBY', KEYS[4], '', 1)
+redis.call('HINCRBY', KEYS[4], 'task:' .. ARGV[1], 1)
+return 1
+"""
+
+# 领取：出队、加租约与读取任务在同一脚本内完成，返回 {keyword, 任务 JSON}（任务不存在时只有 keyword）
+# KEYS: queue:pending, queue:processing, leases, tasks  ARGV: 租约到期时间戳
+_CLAIM = """
+local kw = redis.call('RPOPLPUSH', KEYS[1], KEYS[2])
+if not kw then
+    return nil
+end
+redis.call('ZADD', KEYS[3], ARGV[1], kw)
+return {kw, redis.call('HGET', KEYS[4], kw)}
+"""
+
+# 回收：租约到期的任务，以及没有租约的 processing 条目（旧版本非原子领取的残留）放回待领取队列
+# KEYS: leases, queue:processing, queue:pending  ARGV: 当前时间戳
+_REQUEUE = """
+local requeued = {}
+for _, kw in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])) do
+    redis.call('ZREM', KEYS[1], kw)
+    redis.call('LREM', KEYS[2], 1, kw)
+    redis.call('RPUSH', KEYS[3], kw)
+    table.insert(requeued, kw)
+end
+for _, kw in ipairs(redis.call('LRANGE', KEYS[2], 0, -1)) do
+    if not redis.call('ZSCORE', KEYS[1], kw) then
+        redis.call('LREM', KEYS[2], 1, kw)
+        redis.call('RPUSH', KEYS[3], kw)
+        table.insert(requeued, kw)
+    end
+end
+return requeued
+"""
+
+
+class RedisStore:
+    """
+    Redis 任务存储。
+    task 状态: pending / running / success / failed
+    """
+
+    def __init__(
+        self,
+        client=None,
+        prefix: Optional[str] = None,
+        visibility_timeout: Optional[float] = None,
+        result_ttl: Optional[int] = None,
+        block_timeout: Optional[float] = None,
+    ) -> None:
+        """
+        Args:
+            client: redis.asyncio.Redis 实例（可传入 fakeredis），默认按环境变量创建
+            prefix: key 前缀，默认读取 REDIS_KEY_PREFIX（默认 xhs:）
+            visibility_timeout: 任务租约秒数，超时未续约视为节点失联，默认读取 REDIS_VISIBILITY_TIMEOUT（默认300）
+            result_ttl: 结果保留秒数，默认读取 REDIS_RESULT_TTL（默认7天，0 表示不过期）
+            block_timeout: 领取首个任务时的阻塞等待秒数，默认读取 REDIS_QUEUE_BLOCK_TIMEOUT（默认1，0 为不阻塞）
+        """
+        self.client = client if client is not None else create_redis_client()
+        self.prefix = prefix if prefix is not None else os.getenv("REDIS_KEY_PREFIX", "xhs:")
+        self.visibility_timeout = (
+            float(visibility_timeout)
+            if visibility_timeout is not None
+            else float(os.getenv("REDIS_VISIBILITY_TIMEOUT", "300"))
+        )
+        self.result_ttl = (
+            int(result_ttl)
+            if result_ttl is not None
+            else int(os.getenv("REDIS_RESULT_TTL", str(7 * 24 * 3600)))
+        )
+        self.block_timeout = (
+            float(block_timeout)
+            if block_timeout is not None
+            else float(os.getenv("REDIS_QUEUE_BLOCK_TIMEOUT", "1"))
+        )
+
+        self.k_tasks = f"{self.prefix}tasks"
+        self.k_inflight = f"{self.prefix}inflight"
+        self.k_pending = f"{self.prefix}queue:pending"
+        self.k_processing = f"{self.prefix}queue:processing"
+        self.k_leases = f"{self.prefix}leases"
+        self.k_completions = f"{self.prefix}completions"
+        self.k_versions = f"{self.prefix}versions"
+        self.k_epoch = f"{self.prefix}epoch"
+
+        self._add_task = self.client.register_script(_ADD_TASK)
+        self._claim = self.client.register_script(_CLAIM)
+        self._requeue = self.client.register_script(_REQUEUE)
+
+    def _result_key(self, keyword: str) -> str:
+        return f"{self.prefix}result:{keyword}"
+
+    def _orders_key(self, keyword: str) -> str:
+        return f"{self.prefix}result_orders:{keyword}"
+
+    async def _update_task(self, keyword: str, **fields) -> Optional[dict]:
+        # WATCH/MULTI 乐观锁：读取与写回之间任务哈希被其他节点修改时重试，不会覆盖对方的更新
+        async with self.client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(self.k_tasks)
+                    task = codec.loads(await pipe.hget(self.k_tasks, keyword))
+                    if task is None:
+                        await pipe.unwatch()
+                        return None
+                    task.update(fields)
+                    pipe.multi()
+                    pipe.hset(self.k_tasks, keyword, codec.dumps(task))
+                    self._bump(pipe, keyword)
+                    await pipe.execute()
+                    return task
+                except WatchError:
+                    continue
+
+    def _bump(self, pipe, keyword: str) -> None:
+        pipe.hincrby(self.k_versions, "", 1)
+        pipe.hincrby(self.k_versions, f"task:{keyword}", 1)
+
+    async def get_version(self, keyword: Optional[str] = None) -> str:
+        """
+        版本标识：keyword 为 None 时为任务列表版本，否则为该任务（状态 + 结果）版本；
+        epoch 在 Redis 数据被清空后重新生成，避免版本号重置后 ETag 撞车。
+        结果按 TTL 过期时不会修改版本号，因此任务版本还包含结果是否存在
+        """
+        field = "" if keyword is None else f"task:{keyword}"
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.get(self.k_epoch)
+            pipe.hget(self.k_versions, field)
+            if keyword is not None:
+                pipe.exists(self._result_key(keyword))
+            epoch, version, *result = await pipe.execute()
+        if epoch is None:
+            await self.client.set(self.k_epoch, uuid.uuid4().hex[:8], nx=True)
+            epoch = await self.client.get(self.k_epoch)
+        if keyword is None:
+            return f"{epoch}.{version or 0}"
+        return f"{epoch}.{version or 0}.{result[0]}"
+
+    async def add_tasks(self, keywords: List[str], note_limit: int) -> Tuple[List[str], List[str]]:
+        """
+        添加任务，返回(新建, 已存在)
+        """
+        created, skipped = [], []
+        keys = [self.k_inflight, self.k_tasks, self.k_pending, self.k_versions]
+        for kw in keywords:
+            task = {"keyword": kw, "status": "pending", "note_limit": note_limit, "error": None}
+            # SADD 原子判重：pending/running 中的关键词不会重复入队（跨节点有效）
+            if await self._add_task(keys=keys, args=[kw, codec.dumps(task)]):
+                created.append(kw)
+            else:
+                skipped.append(kw)
+        return created, skipped
+
+    async def list_tasks(self) -> List[dict]:
+        values = await self.client.hvals(self.k_tasks)
+        return [codec.loads(v) for v in values]
+
+    async def get_task(self, keyword: str) -> Optional[dict]:
+        return codec.loads(await self.client.hget(self.k_tasks, keyword))
+
+    async def requeue_expired(self) -> List[str]:
+        """
+        将租约过期或没有租约的处理中任务放回待领取队列，返回被回收的关键词
+        """
+        requeued = await self._requeue(keys=[self.k_leases, self.k_processing, self.k_pending], args=[time.time()])
+        for kw in requeued:
+            await self._update_task(kw, status="pending")
+        if requeued:
+            logger.warning("requeued expired tasks: {}", requeued)
+        return requeued
+
+    async def get_pending(self, limit: int) -> List[dict]:
+        """
+        领取至多 limit 个待执行任务（领取即加租约，其他节点不会再领取）
+        """
+        await self.requeue_expired()
+        claimed: List[dict] = []
+        if limit > 0 and self.block_timeout > 0:
+            # 阻塞等待队列非空：BLMOVE 把队尾元素移回原位置，不改变队列顺序，真正的领取由脚本完成
+            await self.client.blmove(self.k_pending, self.k_pending, self.block_timeout, "RIGHT", "RIGHT")
+        keys = [self.k_pending, self.k_processing, self.k_leases, self.k_tasks]
+        while len(claimed) < limit:
+            reply = await self._claim(keys=keys, args=[time.time() + self.visibility_timeout])
+            if reply is None:
+                break
+            task = codec.loads(reply[1]) if len(reply) > 1 else None
+            if task is None:
+                await self._ack(reply[0])
+                continue
+            claimed.append(task)
+        return claimed
+
+    async def heartbeat(self, keyword: str) -> None:
+        """续约：执行中的任务需在可见性超时前定期调用"""
+        await self.client.zadd(self.k_leases, {keyword: time.time() + self.visibility_timeout}, xx=True)
+
+    async def _ack(self, keyword: str) -> None:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.lrem(self.k_processing, 1, keyword)
+            pipe.zrem(self.k_leases, keyword)
+            pipe.srem(self.k_inflight, keyword)
+            await pipe.execute()
+
+    async def mark_running(self, keyword: str) -> None:
+        await self.heartbeat(keyword)
+        await self._update_task(keyword, status="running")
+
+    async def mark_done(self, keyword: str, notes: list) -> None:
+        ex = self.result_ttl if self.result_ttl > 0 else None
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self._result_key(keyword), codec.dumps(notes), ex=ex)
+            pipe.set(self._orders_key(keyword), codec.dumps(build_sort_orders(notes)), ex=ex)
+            await pipe.execute()
+        await self._update_task(keyword, status="success")
+        await self._ack(keyword)
+        await self._record_completion(keyword)
+
+    async def mark_failed(self, keyword: str, error: str) -> None:
+        await self._update_task(keyword, status="failed", error=error)
+        await self._ack(keyword)
+        await self._record_completion(keyword)
+
+    async def get_result(self, keyword: str) -> Optional[list]:
+        return codec.loads(await self.client.get(self._result_key(keyword)))
+
+    async def get_result_orders(self, keyword: str) -> Optional[Dict[str, List[int]]]:
+        return codec.loads(await self.client.get(self._orders_key(keyword)))
+
+    async def count_pending(self) -> int:
+        return await self.client.llen(self.k_pending)
+
+    async def _record_completion(self, keyword: str) -> None:
+        now = time.time()
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zadd(self.k_completions, {f"{keyword}:{now}": now})
+            pipe.zremrangebyscore(self.k_completions, "-inf", now - 3600)
+            await pipe.execute()
+
+    async def drain_rate(self, window: float = 600) -> float:
+        """
+        全部节点最近 window 秒内的任务完成速率（个/秒），样本不足返回 0
+        """
+        now = time.time()
+        scores = await self.client.zrangebyscore(self.k_completions, now - window, "+inf", withscores=True)
+        return compute_drain_rate((score for _, score in scores), window)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class RedisCheckpointStore:
+    """
+    Redis 断点存储（与 FileCheckpointStore 接口一致），任意节点接手任务时均可续爬。
+
+    每个断点是一个带 TTL（CHECKPOINT_MAX_AGE）的独立键，另用一个集合索引关键词；
+    过期键由 Redis 删除，索引中的残留在 list_all 时清理
+    """
+
+    def __init__(
+        self,
+        client,
+        prefix: str = "xhs:",
+        max_age: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+    ) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.index_key = f"{prefix}checkpoint_keys"
+        self.max_age, self.max_attempts = checkpoint_limits(max_age, max_attempts)
+
+    def _key(self, keyword: str) -> str:
+        return f"{self.prefix}checkpoint:{keyword}"
+
+    async def _write(self, keyword: str, checkpoint: dict, keepttl: bool = False) -> None:
+        kwargs = {}
+        if keepttl:
+            kwargs["keepttl"] = True
+        elif self.max_age > 0:
+            kwargs["ex"] = int(self.max_age)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self._key(keyword), codec.dumps(checkpoint), **kwargs)
+            pipe.sadd(self.index_key, keyword)
+            await pipe.execute()
+
+    async def save(self, keyword: str, note_limit: int, state: dict, attempts: int = 0) -> None:
+        checkpoint = {
+            "keyword": keyword,
+            "note_limit": note_limit,
+            "state": state,
+            "attempts": attempts,
+            "updated_at": time.time(),
+        }
+        await self._write(keyword, checkpoint)
+
+    async def load(self, keyword: str) -> Optional[dict]:
+        checkpoint = codec.loads(await self.client.get(self._key(keyword)))
+        if checkpoint is not None and is_expired(checkpoint, self.max_age, self.max_attempts):
+            logger.info("expired checkpoint dropped keyword={} attempts={}", keyword, checkpoint.get("attempts", 0))
+            await self.clear(keyword)
+            return None
+        return checkpoint
+
+    async def record_failure(self, keyword: str) -> int:
+        checkpoint = codec.loads(await self.client.get(self._key(keyword)))
+        if checkpoint is None:
+            return 0
+        checkpoint["attempts"] = checkpoint.get("attempts", 0) + 1
+        # 失败不算进度：保留原 TTL，不延长断点寿命
+        await self._write(keyword, checkpoint, keepttl=True)
+        return checkpoint["attempts"]
+
+    async def clear(self, keyword: str) -> None:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(keyword))
+            pipe.srem(self.index_key, keyword)
+            await pipe.execute()
+
+    async def list_all(self) -> List[dict]:
+        keywords = sorted(await self.client.smembers(self.index_key))
+        if not keywords:
+            return []
+        checkpoints = []
+        for keyword, value in zip(keywords, await self.client.mget([self._key(kw) for kw in keywords])):
+            checkpoint = codec.loads(value)
+            if checkpoint is None:
+                # 键已因 TTL 过期
+                await self.client.srem(self.index_key, keyword)
+            elif is_expired(checkpoint, self.max_age, self.max_attempts):
+                logger.info("expired checkpoint dropped keyword={}", keyword)
+                await self.clear(keyword)
+            else:
+                checkpoints.append(checkpoint)
+        return checkpoints
+
+
+class RedisRecrawlStateStore:
+    """
+    Redis 重爬状态存储（与 FileRecrawlStateStore 接口一致），调度器主进程切换后状态不丢失
+    """
+
+    def __init__(self, client, prefix: str = "xhs:") -> None:
+        self.client = client
+        self.key = f"{prefix}recrawl"
+
+    async def save(self, keyword: str, state: dict) -> None:
+        await self.client.hset(self.key, keyword, codec.dumps(state))
+
+    async def list_all(self) -> Dict[str, dict]:
+        return {kw: codec.loads(v) for kw, v in (await self.client.hgetall(self.key)).items()}
+
+
+__all__ = ["RedisStore", "RedisCheckpointStore", "RedisRecrawlStateStore", "create_redis_client"]
@@ -0,0 +1,92 @@
+"""
+API 响应序列化基准：200 条笔记（每条 20 条评论、9 张图片）的结果响应
+
+对比：
+    baseline   ResponseModel(data=...) -> jsonable_encoder -> JSONResponse（原 /api/crawl/result 路径）
+    typed      ApiResponse[ResultPageData] 校验 -> model_dump_json
+    fast       ok(...) -> FastJSONResponse（orjson，跳过校验）
+
+运行：python benchmarks/serialization_benchmark.py [--rounds 50]
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.api.responses import ok, orjson  # noqa: E402
+from app.schemas import ApiResponse, ResponseModel, ResultPageData  # noqa: E402
+
+
+def build_payload(note_count: int = 200) -> dict:
+    now = datetime.now()
+    notes = []
+    for i in range(note_count):
+        notes.append(
+            {
+                "note_id": f"65f0c1a2000000001203{i:04d}",
+                "title": f"周末去哪儿玩｜城市漫步路线第{i}篇",
+                "desc": "今天分享一条适合周末的城市漫步路线，沿途有咖啡店、书店和小众展览。" * 3,
+                "liked": 1000 + i,
+                "collected": 500 + i,
+                "commented": 200 + i,
+                "publish_time": now - timedelta(hours=i),
+                "images": [
+                    f"https://sns-img-qc.xhscdn.com/1040g2sg30{i:04d}{j}?imageView2/2/w/1080/format/webp"
+                    for j in range(9)
+                ],
+                "note_type": "normal",
+                "comments": [
+                    {"user": f"用户{k}", "content": f"收藏了，下周就去试试！第{k}条评论", "liked": k}
+                    for k in range(20)
+                ],
+            }
+        )
+    return {"keyword": "城市漫步", "notes": notes, "next_cursor": None, "total": note_count}
+
+
+def baseline(payload: dict) -> bytes:
+    return JSONResponse(jsonable_encoder(ResponseModel(data=payload))).body
+
+
+def typed(payload: dict) -> bytes:
+    return ApiResponse[ResultPageData](data=payload).model_dump_json().encode("utf-8")
+
+
+def fast(payload: dict) -> bytes:
+    return ok(payload).body
+
+
+def bench(name: str, func, payload: dict, rounds: int) -> None:
+    size = len(func(payload))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(payload)
+    elapsed = time.perf_counter() - start
+    per_call = elapsed / rounds
+    print(
+        f"{name:<10} {per_call * 1000:8.2f} ms/resp  {1 / per_call:8.1f} resp/s  "
+        f"{size / per_call / 1024 / 1024:8.1f} MB/s  ({size / 1024:.0f} KB)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--notes", type=int, default=200)
+    args = parser.parse_args()
+
+    payload = build_payload(args.notes)
+    print(f"payload: {args.notes} notes, orjson={'yes' if orjson else 'no (stdlib fallback)'}")
+    bench("baseline", baseline, payload, args.rounds)
+    bench("typed", typed, payload, args.rounds)
+    bench("fast", fast, payload, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+存储后端基准：批量写入 N 个对象并批量生成访问 URL，对比本地磁盘与 MinIO
+
+对比：
+    local   LocalStorage（临时目录，或 STORAGE_LOCAL_ROOT）
+    minio   AsyncMinioClient（读取 MINIO_* 配置，连接失败时跳过）
+    writeback  WriteBackStorage（本地层在临时目录，写入计时不含后台刷写，结束时刷写完再关闭）
+
+运行：python benchmarks/storage_benchmark.py [--count 500] [--size 65536] [--concurrency 16] [--backends local,minio,writeback]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.storage import AsyncMinioClient, LocalStorage, WriteBackStorage  # noqa: E402
+
+
+def build_storage(name: str, root: str):
+    if name == "local":
+        return LocalStorage(root=os.getenv("STORAGE_LOCAL_ROOT") or root)
+    if name == "minio":
+        return AsyncMinioClient()
+    if name == "writeback":
+        return WriteBackStorage(local=LocalStorage(root=os.path.join(root, "writeback")), journal_path="")
+    raise ValueError(f"unknown backend: {name}")
+
+
+async def bench(name: str, root: str, count: int, size: int, concurrency: int) -> None:
+    storage = build_storage(name, root)
+    try:
+        await storage.check_and_create_bucket()
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"{name:<6} skipped: {exc}")
+        await storage.close()
+        return
+
+    run = uuid.uuid4().hex[:8]
+    payload = os.urandom(size)
+    items = [(payload, f"bench/{run}/{i}.bin", "application/octet-stream") for i in range(count)]
+    start = time.perf_counter()
+    results = await storage.upload_many(items, concurrency=concurrency)
+    write_elapsed = time.perf_counter() - start
+    ok_count = sum(1 for r in results if r["ok"])
+    latencies = sorted(r["elapsed"] for r in results)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+
+    start = time.perf_counter()
+    await storage.get_file_urls([name for _, name, _ in items], expires=3600)
+    url_elapsed = time.perf_counter() - start
+    if isinstance(storage, WriteBackStorage):
+        start = time.perf_counter()
+        await storage.flush()
+        print(f"{name:<6} flushed {storage.report()['flushed']} objects in {time.perf_counter() - start:.2f}s")
+    await storage.close()
+
+    print(
+        f"{name:<6} {ok_count}/{count} ok  {count / write_elapsed:8.1f} obj/s  "
+        f"{ok_count * size / write_elapsed / 1024 / 1024:8.1f} MB/s  p99 {p99 * 1000:7.1f} ms  "
+        f"urls {url_elapsed * 1000:6.1f} ms"
+    )
+
+
+async def amain(args: argparse.Namespace) -> None:
+    print(f"{args.count} objects x {args.size} bytes, concurrency={args.concurrency}")
+    with tempfile.TemporaryDirectory() as root:
+        for name in args.backends.split(","):
+            await bench(name.strip(), root, args.count, args.size, args.concurrency)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--size", type=int, default=64 * 1024)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--backends", default="local,minio")
+    asyncio.run(amain(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -61,6 +61,8 @@ CREATE TABLE IF NOT EXISTS notes (
     KEY idx_like_count (like_count),
     KEY idx_publish_time (publish_time),
     KEY idx_crawl_time (crawl_time),
+    KEY idx_keyword_crawl_time (keyword_id, crawl_time),
+    KEY idx_keyword_like_count (keyword_id, like_count),
     CONSTRAINT fk_notes_keyword FOREIGN KEY (keyword_id) REFERENCES keywords(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='笔记表';
 
@@ -88,6 +90,7 @@ CREATE TABLE IF NOT EXISTS comments (
     KEY idx_parent_comment_id (parent_comment_id),
     KEY idx_user_id (user_id),
     KEY idx_comment_time (comment_time),
+    KEY idx_note_like_count (note_id, like_count),
     CONSTRAINT fk_comments_note FOREIGN KEY (note_id) REFERENCES notes(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='评论表';
 
@@ -8,8 +8,11 @@ from starlette.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from loguru import logger
 
+from app.api.responses import FastJSONResponse
 from app.api.router import router
-from app.task.async_scheduler import startup_scheduler, shutdown_scheduler
+from app.task.async_scheduler import startup_scheduler, stop_scheduler, shutdown_scheduler
+from app.task.leader import is_leader, shutdown_leader, startup_leader
+from app.task.recrawl import startup_recrawler, shutdown_recrawler
 
 try:
     # 本地 swagger 资源，避免外网 CDN 失败
@@ -23,6 +26,7 @@ app = FastAPI(
     title="小红书爬虫API",
     description="基于FastAPI+异步IO的小红书爬虫项目",
     version="1.0.0",
+    default_response_class=FastJSONResponse,
 )
 app.add_middleware(
     CORSMiddleware,
@@ -52,16 +56,28 @@ if swagger_ui_path:
         return get_swagger_ui_oauth2_redirect_html()
 
 
-@app.on_event("startup")
-async def _startup() -> None:
+async def _become_leader() -> None:
     await startup_scheduler()
+    await startup_recrawler()
     logger.info("scheduler started")
 
 
+async def _step_down() -> None:
+    await shutdown_recrawler()
+    await stop_scheduler()
+    logger.info("scheduler stopped")
+
+
+@app.on_event("startup")
+async def _startup() -> None:
+    # 多个 worker 中只有当选的进程运行调度器，其余进程只处理 API 请求
+    await startup_leader(on_elected=_become_leader, on_demoted=_step_down)
+
+
 @app.on_event("shutdown")
 async def _shutdown() -> None:
+    await shutdown_leader()
     await shutdown_scheduler()
-    logger.info("scheduler stopped")
 
 
 @app.get("/")
@@ -71,13 +87,18 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "role": "scheduler" if is_leader() else "api", "pid": os.getpid()}
 
 
 def main():
     host = os.getenv("API_HOST", "0.0.0.0")
     port = int(os.getenv("API_PORT", "8000"))
-    uvicorn.run("main:app", host=host, port=port, reload=False)
+    workers = int(os.getenv("API_WORKERS", "1"))
+    if workers > 1 and os.getenv("TASK_STORE_BACKEND", "memory").lower() != "redis":
+        # 内存存储各进程独立，其他 worker 看不到调度器进程的任务与结果
+        logger.warning("API_WORKERS>1 需要 TASK_STORE_BACKEND=redis，已回退为单进程")
+        workers = 1
+    uvicorn.run("main:app", host=host, port=port, workers=workers, reload=False)
 
 
 if __name__ == "__main__":
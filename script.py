@@ -1,6 +1,5 @@
 import asyncio
-from app.storage import AsyncMinioClient
-from minio.error import S3Error
+from app.storage import AsyncMinioClient, S3Error
 
 async def check_minio():
     client = AsyncMinioClient()
@@ -17,6 +16,8 @@ async def check_minio():
         print("MinIO S3Error:", exc)
     except Exception as exc:
         print("MinIO check failed:", exc)
+    finally:
+        await client.close()
     return False
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+"""
+POST /api/crawl/task 准入控制：队列满与客户端限速返回 429
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.router import router
+from app.services.admission import AdmissionController, get_admission_controller
+from app.task.async_scheduler import get_scheduler
+
+
+class FakeScheduler:
+    def __init__(self, depth: int = 0, rate: float = 0.0) -> None:
+        self.depth = depth
+        self.rate = rate
+        self.enqueued = []
+        self.inflight = set()
+
+    async def queue_depth(self) -> int:
+        return self.depth
+
+    async def drain_rate(self, window: float = 600) -> float:
+        return self.rate
+
+    async def get_task(self, keyword):
+        return {"keyword": keyword, "status": "pending"} if keyword in self.inflight else None
+
+    async def enqueue_keywords(self, keywords, note_limit):
+        created = [kw for kw in keywords if kw not in self.inflight]
+        self.inflight.update(created)
+        self.enqueued.extend(created)
+        self.depth += len(created)
+        return created, [kw for kw in keywords if kw not in created]
+
+
+def make_client(scheduler: FakeScheduler, controller: AdmissionController) -> TestClient:
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_scheduler] = lambda: scheduler
+    app.dependency_overrides[get_admission_controller] = lambda: controller
+    return TestClient(app)
+
+
+def submit(client: TestClient, keywords, **headers):
+    return client.post("/api/crawl/task", json={"keywords": keywords, "note_limit": 10}, headers=headers)
+
+
+def test_queue_full_returns_retry_after_from_drain_rate():
+    scheduler = FakeScheduler(depth=9, rate=0.5)
+    client = make_client(scheduler, AdmissionController(max_queue_depth=10, client_rate=0))
+    assert submit(client, ["a"]).status_code == 200
+
+    resp = submit(client, ["b", "c"])
+    assert resp.status_code == 429
+    # 超出 2 个位置，消化速率 0.5 个/秒 -> 4 秒
+    assert resp.headers["Retry-After"] == "4"
+    assert resp.json()["data"]["queue_depth"] == 10
+    assert scheduler.enqueued == ["a"]
+
+
+def test_queue_full_without_rate_samples_uses_default():
+    client = make_client(FakeScheduler(depth=10), AdmissionController(max_queue_depth=10, client_rate=0))
+    resp = submit(client, ["a"])
+    assert resp.status_code == 429 and resp.headers["Retry-After"] == "60"
+
+
+def test_client_rate_limit():
+    client = make_client(FakeScheduler(), AdmissionController(max_queue_depth=0, client_rate=3))
+    assert submit(client, ["a", "b"]).status_code == 200
+    resp = submit(client, ["c", "d"])
+    assert resp.status_code == 429
+    # 缺 1 个令牌，每分钟补 3 个 -> 20 秒
+    assert resp.headers["Retry-After"] == "20"
+    assert resp.json()["msg"] == "enqueue rate limit exceeded"
+
+
+def test_skipped_keywords_do_not_consume_rate():
+    scheduler = FakeScheduler()
+    client = make_client(scheduler, AdmissionController(max_queue_depth=0, client_rate=3))
+    assert submit(client, ["a", "b"]).status_code == 200
+    # 重试已在队列中的关键词：不新增任务，也不消耗令牌
+    for _ in range(3):
+        resp = submit(client, ["a", "b"])
+        assert resp.status_code == 200 and resp.json()["data"]["skipped"] == ["a", "b"]
+    assert submit(client, ["c"]).status_code == 200
+    assert submit(client, ["d"]).status_code == 429
+    assert scheduler.enqueued == ["a", "b", "c"]
+
+
+def test_refund_restores_tokens_up_to_burst():
+    controller = AdmissionController(client_rate=3)
+    assert controller.check_client_rate("c", 3) is None
+    controller.refund("c", 2)
+    assert controller.check_client_rate("c", 2) is None
+    assert controller.check_client_rate("c", 1) is not None
+    controller.refund("c", 10)
+    assert controller._buckets["c"][0] <= 3
+
+
+def test_spoofed_client_id_does_not_bypass_limit():
+    client = make_client(FakeScheduler(), AdmissionController(max_queue_depth=0, client_rate=2))
+    assert submit(client, ["a", "b"], **{"X-Client-Id": "one"}).status_code == 200
+    assert submit(client, ["c"], **{"X-Client-Id": "two"}).status_code == 429
+    assert submit(client, ["c"], **{"X-Forwarded-For": "10.0.0.9"}).status_code == 429
+
+
+def test_trusted_proxy_headers_identify_clients():
+    # TestClient 的来源地址为 "testclient"
+    controller = AdmissionController(max_queue_depth=0, client_rate=2, trusted_proxies=["testclient"])
+    client = make_client(FakeScheduler(), controller)
+    assert submit(client, ["a", "b"], **{"X-Client-Id": "one"}).status_code == 200
+    assert submit(client, ["c"], **{"X-Client-Id": "one"}).status_code == 429
+    assert submit(client, ["c", "d"], **{"X-Client-Id": "two"}).status_code == 200
+
+
+@pytest.mark.parametrize(
+    "peer,headers,expected",
+    [
+        ("1.2.3.4", {"X-Client-Id": "x"}, "1.2.3.4"),
+        ("10.0.0.1", {"X-Client-Id": "x"}, "id:x"),
+        ("10.0.0.1", {"X-Forwarded-For": "6.6.6.6, 5.5.5.5, 10.0.0.2"}, "5.5.5.5"),
+        ("10.0.0.1", {}, "10.0.0.1"),
+        (None, {}, "unknown"),
+    ],
+)
+def test_client_id(peer, headers, expected):
+    controller = AdmissionController(trusted_proxies=["10.0.0.1", "10.0.0.2"])
+    assert controller.client_id(peer, headers) == expected
@@ -0,0 +1,172 @@
+"""
+断点保存与续爬
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.crawler import AsyncXhsCrawler
+from app.task import async_scheduler
+from app.task.async_scheduler import InMemoryStore, TaskScheduler
+from app.task.checkpoint import FileCheckpointStore
+
+
+class FakeCrawler:
+    """按脚本执行的爬虫：记录收到的断点，推进 page 并按需失败"""
+
+    calls = []
+    fail_at = None
+
+    def __init__(self, media=None) -> None:
+        self.media = media
+
+    async def crawl_keywords(self, keywords, per_keyword, checkpoints=None, on_checkpoint=None, on_event=None):
+        kw = keywords[0]
+        state = dict((checkpoints or {}).get(kw) or {"page": 1})
+        FakeCrawler.calls.append(dict(state))
+        while state["page"] <= 4:
+            if state["page"] == FakeCrawler.fail_at:
+                raise RuntimeError("network down")
+            state["page"] += 1
+            if on_checkpoint is not None:
+                await on_checkpoint(kw, state)
+        return {kw: [{"note_id": "n1"}]}
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    monkeypatch.setattr(async_scheduler, "AsyncXhsCrawler", FakeCrawler)
+    FakeCrawler.calls = []
+    FakeCrawler.fail_at = None
+    # checkpoint_interval 很大：除首页外都被限流，验证失败时会补存最新进度
+    return TaskScheduler(
+        store=InMemoryStore(),
+        checkpoints=FileCheckpointStore(str(tmp_path)),
+        checkpoint_interval=3600,
+        poll_interval=0.01,
+    )
+
+
+def run_task(scheduler: TaskScheduler, keyword: str = "kw") -> dict:
+    async def main():
+        await scheduler.store.add_tasks([keyword], 10)
+        task = (await scheduler.store.get_pending(1))[0]
+        await scheduler._run_task(task)
+        return await scheduler.store.get_task(keyword)
+
+    return asyncio.run(main())
+
+
+def test_file_store_roundtrip(tmp_path):
+    async def main():
+        store = FileCheckpointStore(str(tmp_path))
+        assert await store.load("kw") is None
+        await store.save("kw", 10, {"page": 3, "notes": [{"note_id": "n1"}]})
+        saved = await store.load("kw")
+        assert saved["state"]["page"] == 3 and saved["note_limit"] == 10
+        assert [c["keyword"] for c in await store.list_all()] == ["kw"]
+        await store.clear("kw")
+        await store.clear("kw")
+        assert await store.load("kw") is None
+
+    asyncio.run(main())
+
+
+def test_corrupted_checkpoint_ignored(tmp_path):
+    async def main():
+        store = FileCheckpointStore(str(tmp_path))
+        await store.save("kw", 10, {"page": 2})
+        store._path("kw").write_text("{not json", encoding="utf-8")
+        assert await store.load("kw") is None
+        assert await store.list_all() == []
+
+    asyncio.run(main())
+
+
+def test_failed_crawl_keeps_latest_checkpoint(scheduler):
+    FakeCrawler.fail_at = 3
+    task = run_task(scheduler)
+    assert task["status"] == "failed"
+    saved = asyncio.run(scheduler.checkpoints.load("kw"))
+    assert saved is not None and saved["state"]["page"] == 3
+
+
+def test_resume_after_failure_then_clear_on_success(scheduler):
+    FakeCrawler.fail_at = 3
+    run_task(scheduler)
+
+    FakeCrawler.fail_at = None
+    task = run_task(scheduler)
+    assert task["status"] == "success"
+    assert FakeCrawler.calls[-1]["page"] == 3
+    assert asyncio.run(scheduler.checkpoints.load("kw")) is None
+
+
+def test_restart_requeues_checkpointed_keywords(scheduler):
+    async def main():
+        await scheduler.checkpoints.save("kw", 7, {"page": 2})
+        await scheduler._resume_checkpoints()
+        pending = await scheduler.store.get_pending(10)
+        assert [(t["keyword"], t["note_limit"]) for t in pending] == [("kw", 7)]
+
+    asyncio.run(main())
+
+
+def test_always_failing_keyword_stops_resuming(scheduler):
+    # 每次都在断点之后失败：达到 CHECKPOINT_MAX_ATTEMPTS（默认3）后不再续爬
+    FakeCrawler.fail_at = 3
+    for _ in range(3):
+        run_task(scheduler)
+    assert [c["page"] for c in FakeCrawler.calls] == [1, 3, 3]
+
+    async def main():
+        await scheduler._resume_checkpoints()
+        assert await scheduler.store.get_pending(10) == []
+        assert await scheduler.checkpoints.list_all() == []
+
+    asyncio.run(main())
+    # 重新提交时从头开始
+    run_task(scheduler)
+    assert FakeCrawler.calls[-1]["page"] == 1
+
+
+def test_old_checkpoint_expires(tmp_path):
+    async def main():
+        store = FileCheckpointStore(str(tmp_path), max_age=60)
+        await store.save("old", 10, {"page": 2})
+        await store.save("new", 10, {"page": 2})
+        payload = json.loads(store._path("old").read_text(encoding="utf-8"))
+        payload["updated_at"] -= 120
+        store._path("old").write_text(json.dumps(payload), encoding="utf-8")
+
+        assert [c["keyword"] for c in await store.list_all()] == ["new"]
+        assert not store._path("old").exists()
+
+    asyncio.run(main())
+
+
+def test_crawler_resumes_from_saved_page(monkeypatch):
+    requested = []
+
+    async def fake_search(self, session, keyword, page):
+        requested.append(page)
+        return []
+
+    monkeypatch.setattr(AsyncXhsCrawler, "_fetch_search_page", fake_search)
+    crawler = AsyncXhsCrawler(request_delay=0)
+    done_note = {"note_id": "n1", "comments": [], "commented": 1}
+    checkpoint = {"page": 3, "notes": [done_note], "comment_progress": {}}
+    events = []
+
+    async def main():
+        return await crawler.crawl_keyword(
+            None, "kw", limit=5, checkpoint=checkpoint, on_event=lambda kw, e: events.append(e["event"])
+        )
+
+    result = asyncio.run(main())
+    # 已完成的搜索页不再请求，已抓完评论的笔记直接补发
+    assert requested == [3]
+    assert result == [done_note]
+    assert events[0] == "note"
@@ -0,0 +1,155 @@
+"""
+RequestCoalescer：并发合并、结果缓存与发起方会话关闭后的重新请求
+"""
+
+import asyncio
+
+import aiohttp
+from aiohttp import web
+
+from app.crawler.coalesce import RequestCoalescer
+
+
+class FakeSession:
+    def __init__(self) -> None:
+        self.closed = False
+
+
+def test_concurrent_requests_share_one_fetch():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"data": 1}
+
+    async def main():
+        coalescer = RequestCoalescer(ttl=0)
+        results = await asyncio.gather(*(coalescer.run("k", fetch) for _ in range(10)))
+        assert results == [{"data": 1}] * 10
+        assert len(calls) == 1
+        assert coalescer.duplicates_avoided == 9
+
+    asyncio.run(main())
+
+
+def test_success_cached_failure_not_cached():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return {} if len(calls) == 1 else {"data": 1}
+
+    async def main():
+        coalescer = RequestCoalescer(ttl=30)
+        assert await coalescer.run("k", fetch) == {}
+        assert await coalescer.run("k", fetch) == {"data": 1}
+        assert await coalescer.run("k", fetch) == {"data": 1}
+        assert len(calls) == 2 and coalescer.stats["cache_hits"] == 1
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_affect_others():
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return {"data": 1}
+
+    async def main():
+        coalescer = RequestCoalescer(ttl=0)
+        leader = asyncio.ensure_future(coalescer.run("k", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(coalescer.run("k", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await waiter == {"data": 1}
+
+    asyncio.run(main())
+
+
+def test_waiter_reissues_when_leader_session_closes():
+    async def main():
+        coalescer = RequestCoalescer(ttl=0)
+        leader_session, waiter_session = FakeSession(), FakeSession()
+        in_flight = asyncio.Event()
+
+        async def leader_fetch():
+            in_flight.set()
+            await asyncio.sleep(0.02)
+            # 发起方任务结束，会话被关闭，请求失败
+            leader_session.closed = True
+            raise RuntimeError("Session is closed")
+
+        async def waiter_fetch():
+            return {"data": "own session"}
+
+        leader = asyncio.ensure_future(coalescer.run("k", leader_fetch, owner=leader_session))
+        await in_flight.wait()
+        result = await coalescer.run("k", waiter_fetch, owner=waiter_session)
+        assert result == {"data": "own session"}
+        assert coalescer.stats["reissued"] == 1
+        try:
+            await leader
+        except RuntimeError:
+            pass
+
+    asyncio.run(main())
+
+
+def test_genuine_failure_is_shared():
+    async def main():
+        coalescer = RequestCoalescer(ttl=0)
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {}
+
+        results = await asyncio.gather(
+            coalescer.run("k", fetch, owner=FakeSession()), coalescer.run("k", fetch, owner=FakeSession())
+        )
+        # 会话都正常：真实失败不重复请求
+        assert results == [{}, {}] and len(calls) == 1
+
+    asyncio.run(main())
+
+
+def test_real_session_closed_by_leader():
+    async def handler(request):
+        await asyncio.sleep(0.1)
+        return web.json_response({"ok": True})
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/"
+        coalescer = RequestCoalescer(ttl=0)
+
+        async def get(session):
+            try:
+                async with session.get(url) as resp:
+                    return await resp.json()
+            except aiohttp.ClientError:
+                return {}
+
+        async def leader_task():
+            async with aiohttp.ClientSession() as session:
+                return await coalescer.run("k", lambda: get(session), owner=session)
+
+        try:
+            leader = asyncio.ensure_future(leader_task())
+            await asyncio.sleep(0.02)
+            async with aiohttp.ClientSession() as session:
+                waiter = asyncio.ensure_future(coalescer.run("k", lambda: get(session), owner=session))
+                await asyncio.sleep(0.02)
+                leader.cancel()
+                assert await waiter == {"ok": True}
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
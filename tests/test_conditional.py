@@ -0,0 +1,112 @@
+"""
+ETag / If-None-Match 条件请求与渲染缓存
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.conditional import RenderCache
+from app.api.router import router
+from app.task.async_scheduler import InMemoryStore, TaskScheduler, get_scheduler
+
+
+def make_client(store) -> TestClient:
+    scheduler = TaskScheduler(store=store)
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_scheduler] = lambda: scheduler
+    return TestClient(app)
+
+
+def test_keywords_not_modified_until_tasks_change():
+    store = InMemoryStore()
+    client = make_client(store)
+    first = client.get("/api/crawl/keywords")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and etag.startswith('"')
+
+    cached = client.get("/api/crawl/keywords", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    assert client.get("/api/crawl/keywords", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    assert client.get("/api/crawl/keywords", headers={"If-None-Match": '"other", *'}).status_code == 304
+
+    asyncio.run(store.add_tasks(["kw"], 10))
+    changed = client.get("/api/crawl/keywords", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert [t["keyword"] for t in changed.json()["data"]["tasks"]] == ["kw"]
+
+
+def test_wildcard_requires_current_representation():
+    store = InMemoryStore()
+    asyncio.run(store.add_tasks(["pending"], 10))
+    client = make_client(store)
+    headers = {"If-None-Match": "*"}
+    # 关键词不存在、或任务尚无结果：没有当前表示，* 不命中
+    assert client.get("/api/crawl/result", params={"keyword": "missing"}, headers=headers).status_code == 404
+    assert client.get("/api/crawl/result", params={"keyword": "pending"}, headers=headers).status_code == 404
+
+    asyncio.run(store.mark_done("pending", [{"note_id": "n1"}]))
+    assert client.get("/api/crawl/result", params={"keyword": "pending"}, headers=headers).status_code == 304
+
+
+def test_result_etag_depends_on_query_and_result():
+    store = InMemoryStore()
+
+    async def seed():
+        await store.add_tasks(["kw"], 10)
+        await store.mark_done("kw", [{"note_id": "n1"}, {"note_id": "n2"}])
+
+    asyncio.run(seed())
+    client = make_client(store)
+    full = client.get("/api/crawl/result", params={"keyword": "kw"})
+    page = client.get("/api/crawl/result", params={"keyword": "kw", "limit": 1})
+    assert full.headers["ETag"] != page.headers["ETag"]
+    headers = {"If-None-Match": full.headers["ETag"]}
+    assert client.get("/api/crawl/result", params={"keyword": "kw"}, headers=headers).status_code == 304
+
+    asyncio.run(store.mark_done("kw", [{"note_id": "n3"}]))
+    again = client.get("/api/crawl/result", params={"keyword": "kw"}, headers=headers)
+    assert again.status_code == 200
+    assert [n["note_id"] for n in again.json()["data"]["notes"]] == ["n3"]
+
+
+def test_expired_redis_result_changes_etag():
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.task.redis_store import RedisStore
+
+    store = RedisStore(
+        client=fakeredis.FakeAsyncRedis(decode_responses=True), prefix="test:", block_timeout=0, result_ttl=1
+    )
+
+    async def seed():
+        await store.add_tasks(["kw"], 10)
+        await store.get_pending(1)
+        await store.mark_done("kw", [{"note_id": "n1"}])
+
+    asyncio.run(seed())
+    client = make_client(store)
+    resp = client.get("/api/crawl/result", params={"keyword": "kw"})
+    assert resp.status_code == 200
+    etag = resp.headers["ETag"]
+
+    asyncio.run(asyncio.sleep(1.1))
+    # TTL 过期不改版本号，但结果已不存在：不能再用旧 ETag 回 304 或返回缓存的旧结果
+    expired = client.get("/api/crawl/result", params={"keyword": "kw"}, headers={"If-None-Match": etag})
+    assert expired.status_code == 404
+
+
+def test_render_cache_limits():
+    cache = RenderCache(max_entries=2, max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.get("a")
+    cache.put("c", b"1234")
+    # 超出条数时淘汰最久未使用的 b
+    assert cache.get("b") is None and cache.get("a") == b"1234"
+    cache.put("d", b"12345678")
+    assert cache.get("a") is None and cache.get("c") is None and cache.get("d") == b"12345678"
+    cache.put("huge", b"x" * 11)
+    assert cache.get("huge") is None
@@ -0,0 +1,225 @@
+"""
+ResumableDownloader：Range 续传、If-Range 校验、.part 文件续传与在途字节预算
+"""
+
+import asyncio
+import json
+import os
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from app.crawler.downloader import ByteBudget, IncompleteDownload, ResumableDownloader
+
+BODY = bytes(range(256)) * 64
+
+
+class Origin:
+    """支持 Range/If-Range 的测试源站；cuts 为每个请求发送多少字节后断开"""
+
+    def __init__(self) -> None:
+        self.body = BODY
+        self.etag = '"v1"'
+        self.ignore_range = False
+        self.cuts = []
+        self.requests = []
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests.append(dict(request.headers))
+        body = self.body
+        start = 0
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if range_header and not self.ignore_range and (if_range is None or if_range == self.etag):
+            start = int(range_header.split("=")[1].rstrip("-"))
+            if start >= len(body):
+                return web.Response(status=416, headers={"Content-Range": f"bytes */{len(body)}"})
+        headers = {"ETag": self.etag, "Content-Length": str(len(body) - start)}
+        if start:
+            headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+        resp = web.StreamResponse(status=206 if start else 200, headers=headers)
+        await resp.prepare(request)
+        data = body[start:]
+        cut = self.cuts.pop(0) if self.cuts else None
+        if cut is not None:
+            await resp.write(data[:cut])
+            await asyncio.sleep(0.01)
+            request.transport.close()
+            return resp
+        await resp.write(data)
+        await resp.write_eof()
+        return resp
+
+
+def serve(test):
+    async def main():
+        origin = Origin()
+        app = web.Application()
+        app.router.add_get("/file", origin.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/file"
+        try:
+            async with aiohttp.ClientSession() as session:
+                await test(origin, session, url)
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def make_downloader(**kwargs) -> ResumableDownloader:
+    kwargs.setdefault("chunk_size", 1024)
+    return ResumableDownloader(budget=ByteBudget(limit=1 << 20), **kwargs)
+
+
+async def read_all(downloader, session, url, **kwargs) -> bytes:
+    async with downloader.open(session, url, **kwargs) as remote:
+        return b"".join([chunk async for chunk in remote.chunks()])
+
+
+def test_resume_with_range_after_disconnect():
+    async def test(origin, session, url):
+        origin.cuts = [5000]
+        downloader = make_downloader()
+        assert await read_all(downloader, session, url) == BODY
+        assert downloader.stats["resumed"] == 1
+        resumed = origin.requests[1]
+        assert resumed["Range"] == "bytes=5000-" and resumed["If-Range"] == '"v1"'
+        assert resumed["Accept-Encoding"] == "identity"
+
+    serve(test)
+
+
+def test_server_ignoring_range_restarts_and_skips_prefix():
+    async def test(origin, session, url):
+        origin.cuts = [3000]
+        origin.ignore_range = True
+        downloader = make_downloader()
+        assert await read_all(downloader, session, url) == BODY
+        assert downloader.stats["restarted"] == 1
+
+    serve(test)
+
+
+def test_content_changed_while_resuming():
+    async def test(origin, session, url):
+        origin.cuts = [3000]
+        downloader = make_downloader()
+        with pytest.raises(IncompleteDownload):
+            async with downloader.open(session, url) as remote:
+                async for _ in remote.chunks():
+                    # 断开后、续传前内容被替换
+                    origin.etag = '"v2"'
+                    origin.body = b"x" * len(BODY)
+
+    serve(test)
+
+
+def test_gives_up_after_retries():
+    async def test(origin, session, url):
+        origin.cuts = [1000, 1000]
+        downloader = make_downloader(retries=1)
+        with pytest.raises(IncompleteDownload):
+            await read_all(downloader, session, url)
+        assert downloader.stats["incomplete"] == 1
+
+    serve(test)
+
+
+def test_part_file_resumes_with_if_range(tmp_path):
+    async def test(origin, session, url):
+        path = str(tmp_path / "video.mp4")
+        origin.cuts = [6000]
+        downloader = make_downloader(retries=0)
+        with pytest.raises(IncompleteDownload):
+            await downloader.fetch_to_file(session, url, path)
+        # 中断后保留 .part 与校验器
+        assert os.path.getsize(path + ".part") == 6000
+        with open(path + ".part.meta", encoding="utf-8") as f:
+            assert json.load(f) == {"url": url, "validator": '"v1"'}
+
+        assert await downloader.fetch_to_file(session, url, path) == len(BODY)
+        assert origin.requests[-1]["Range"] == "bytes=6000-"
+        assert origin.requests[-1]["If-Range"] == '"v1"'
+        with open(path, "rb") as f:
+            assert f.read() == BODY
+        assert not os.path.exists(path + ".part") and not os.path.exists(path + ".part.meta")
+
+    serve(test)
+
+
+def test_stale_part_file_is_replaced(tmp_path):
+    async def test(origin, session, url):
+        path = str(tmp_path / "video.mp4")
+        origin.cuts = [6000]
+        downloader = make_downloader(retries=0)
+        with pytest.raises(IncompleteDownload):
+            await downloader.fetch_to_file(session, url, path)
+
+        # 源站内容已变化：If-Range 不匹配，服务端返回完整新内容
+        origin.etag = '"v2"'
+        origin.body = b"new" * 1000
+        assert await downloader.fetch_to_file(session, url, path) == 3000
+        with open(path, "rb") as f:
+            assert f.read() == b"new" * 1000
+
+    serve(test)
+
+
+def test_part_without_validator_restarts(tmp_path):
+    async def test(origin, session, url):
+        path = str(tmp_path / "video.mp4")
+        with open(path + ".part", "wb") as f:
+            f.write(b"garbage")
+        await make_downloader().fetch_to_file(session, url, path)
+        assert "Range" not in origin.requests[-1]
+        with open(path, "rb") as f:
+            assert f.read() == BODY
+
+    serve(test)
+
+
+def test_complete_part_file_finishes_on_416(tmp_path):
+    async def test(origin, session, url):
+        path = str(tmp_path / "video.mp4")
+        with open(path + ".part", "wb") as f:
+            f.write(BODY)
+        with open(path + ".part.meta", "w", encoding="utf-8") as f:
+            json.dump({"url": url, "validator": '"v1"'}, f)
+        assert await make_downloader().fetch_to_file(session, url, path) == len(BODY)
+        with open(path, "rb") as f:
+            assert f.read() == BODY
+
+    serve(test)
+
+
+def test_byte_budget_is_fifo():
+    async def main():
+        budget = ByteBudget(limit=100)
+        order = []
+        await budget.acquire(80)
+
+        async def take(name, size):
+            await budget.acquire(size)
+            order.append(name)
+
+        big = asyncio.ensure_future(take("big", 60))
+        await asyncio.sleep(0)
+        small = asyncio.ensure_future(take("small", 10))
+        await asyncio.sleep(0)
+        # 后来的小请求不插队
+        assert order == []
+        budget.release(80)
+        await asyncio.gather(big, small)
+        assert order == ["big", "small"] and budget.in_flight == 70
+
+        # 超过上限的单次请求在预算空闲时通过
+        budget.release(70)
+        assert await budget.acquire(500) == 500
+        assert budget.report()["peak"] == 500
+
+    asyncio.run(main())
@@ -0,0 +1,181 @@
+"""
+调度器选主：文件锁 / GET_LOCK 选主、主进程退出后接替、失去锁后停止调度
+"""
+
+import asyncio
+import itertools
+
+import pytest
+
+import app.db
+from app.task import leader
+from app.task.async_scheduler import InMemoryStore, TaskScheduler
+from app.task.leader import FileLeaderLock, LeaderElector, MySQLLeaderLock
+
+# 同一进程内两个文件描述符互斥依赖 flock 语义
+needs_flock = pytest.mark.skipif(leader.fcntl is None, reason="fcntl.flock unavailable")
+
+
+class Role:
+    """记录当选/卸任回调"""
+
+    def __init__(self) -> None:
+        self.events = []
+
+    async def elected(self) -> None:
+        self.events.append("elected")
+
+    async def demoted(self) -> None:
+        self.events.append("demoted")
+
+
+def make_elector(lock, role: Role) -> LeaderElector:
+    return LeaderElector(lock, on_elected=role.elected, on_demoted=role.demoted, retry_interval=0.02)
+
+
+@needs_flock
+def test_file_lock_elects_one_and_fails_over(tmp_path):
+    async def main():
+        path = str(tmp_path / "scheduler.lock")
+        first, second = Role(), Role()
+        a = make_elector(FileLeaderLock(path), first)
+        b = make_elector(FileLeaderLock(path), second)
+        await a.start()
+        await b.start()
+        await asyncio.sleep(0.05)
+        assert a.is_leader and not b.is_leader
+        assert first.events == ["elected"] and second.events == []
+
+        # 主进程退出：释放锁，另一进程在重试周期内接替
+        await a.shutdown()
+        assert first.events == ["elected", "demoted"]
+        await asyncio.sleep(0.06)
+        assert b.is_leader and second.events == ["elected"]
+        await b.shutdown()
+
+    asyncio.run(main())
+
+
+class LostLock:
+    """当选后锁被外部夺走（例如数据库连接断开）"""
+
+    def __init__(self) -> None:
+        self.lost = False
+        self.released = False
+
+    async def acquire(self) -> bool:
+        return not self.lost
+
+    async def held(self) -> bool:
+        return not self.lost
+
+    async def release(self) -> None:
+        self.released = True
+
+
+def test_lock_loss_stops_scheduler():
+    async def main():
+        scheduler = TaskScheduler(store=InMemoryStore(), poll_interval=0.01)
+        lock = LostLock()
+        elector = LeaderElector(lock, on_elected=scheduler.start, on_demoted=scheduler.stop, retry_interval=0.02)
+        await elector.start()
+        assert elector.is_leader and scheduler._worker_task is not None
+
+        lock.lost = True
+        await asyncio.sleep(0.06)
+        assert not elector.is_leader
+        assert scheduler._worker_task is None
+        await elector.shutdown()
+        assert lock.released
+
+    asyncio.run(main())
+
+
+@needs_flock
+def test_failed_start_releases_lock(tmp_path):
+    async def main():
+        path = str(tmp_path / "scheduler.lock")
+
+        async def broken():
+            raise RuntimeError("boom")
+
+        role = Role()
+        a = LeaderElector(FileLeaderLock(path), on_elected=broken, on_demoted=role.demoted, retry_interval=10)
+        await a._try_elect()
+        assert not a.is_leader and role.events == ["demoted"]
+        # 锁已释放，其他进程可以当选
+        assert await FileLeaderLock(path).acquire()
+
+    asyncio.run(main())
+
+
+class FakeMySQL:
+    """模拟 GET_LOCK / IS_USED_LOCK / RELEASE_LOCK 的会话锁语义"""
+
+    def __init__(self) -> None:
+        self.locks = {}
+        self.ids = itertools.count(1)
+
+    async def connect(self):
+        return FakeConnection(self, next(self.ids))
+
+
+class FakeResult:
+    def __init__(self, value) -> None:
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeConnection:
+    def __init__(self, server: FakeMySQL, conn_id: int) -> None:
+        self.server = server
+        self.conn_id = conn_id
+        self.closed = False
+
+    async def execute(self, statement, params):
+        if self.closed:
+            raise ConnectionError("connection closed")
+        sql, name, locks = str(statement), params["name"], self.server.locks
+        if "GET_LOCK" in sql:
+            if locks.get(name, self.conn_id) != self.conn_id:
+                return FakeResult(0)
+            locks[name] = self.conn_id
+            return FakeResult(1)
+        if "IS_USED_LOCK" in sql:
+            return FakeResult(int(locks.get(name) == self.conn_id))
+        if "RELEASE_LOCK" in sql:
+            return FakeResult(int(locks.pop(name, None) == self.conn_id))
+        raise AssertionError(sql)
+
+    async def close(self) -> None:
+        # 会话结束时 MySQL 释放该连接持有的锁
+        self.closed = True
+        self.server.locks = {k: v for k, v in self.server.locks.items() if v != self.conn_id}
+
+
+def test_mysql_get_lock_election(monkeypatch):
+    server = FakeMySQL()
+    monkeypatch.setattr(app.db, "get_engine", lambda: server)
+
+    async def main():
+        first, second = Role(), Role()
+        a = make_elector(MySQLLeaderLock("test_lock"), first)
+        b = make_elector(MySQLLeaderLock("test_lock"), second)
+        await a.start()
+        await b.start()
+        assert a.is_leader and not b.is_leader
+        # 未当选的一方不长期占用连接
+        assert b.lock._conn is None
+
+        # 主进程的数据库连接断开：锁随会话释放，主进程检测到后停止，另一进程接替
+        await a.lock._conn.close()
+        await asyncio.sleep(0.1)
+        assert first.events == ["elected", "demoted"]
+        assert b.is_leader and second.events == ["elected"]
+        await a.shutdown()
+        await b.shutdown()
+        assert server.locks == {}
+
+    asyncio.run(main())
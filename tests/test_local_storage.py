@@ -0,0 +1,139 @@
+"""
+LocalStorage：原子写入、内容寻址、签名 URL 与 /api/storage 路由
+"""
+
+import asyncio
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import router as router_module
+from app.storage.local import LocalStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(root=str(tmp_path / "storage"), base_url="http://testserver", secret="s3cret")
+
+
+def tmp_files(storage: LocalStorage):
+    return list(storage._tmp_dir.iterdir()) if storage._tmp_dir.exists() else []
+
+
+def test_writes_are_atomic(storage):
+    async def main():
+        await storage.upload_bytes(b"old", "notes/a.jpg")
+        path = storage.object_path("notes/a.jpg")
+
+        async def broken():
+            yield b"partial"
+            raise ConnectionError("stream interrupted")
+
+        with pytest.raises(ConnectionError):
+            await storage.upload_stream(broken(), "notes/a.jpg")
+        # 失败的写入不影响已有内容，也不留下临时文件
+        assert path.read_bytes() == b"old"
+        assert tmp_files(storage) == []
+
+        async def chunks():
+            for part in (b"new ", b"data"):
+                yield part
+
+        await storage.upload_stream(chunks(), "notes/a.jpg")
+        assert path.read_bytes() == b"new data"
+        assert tmp_files(storage) == []
+
+    asyncio.run(main())
+
+
+def test_upload_file_and_sharded_path(storage, tmp_path):
+    async def main():
+        src = tmp_path / "src.bin"
+        src.write_bytes(b"x" * 1000)
+        await storage.upload_file(str(src), "videos/v.mp4")
+        path = storage.object_path("videos/v.mp4")
+        assert path.read_bytes() == src.read_bytes()
+        assert len(path.relative_to(storage.root).parts) == 4
+        assert await storage.object_exists("videos/v.mp4")
+        assert not await storage.object_exists("videos/missing.mp4")
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("name", ["", "/abs", "a/../b", "a//b", "./a", "a\x00b"])
+def test_invalid_object_names(storage, name):
+    with pytest.raises(ValueError):
+        storage.object_path(name)
+
+
+def test_content_addressed_dedup(storage):
+    async def main():
+        png = b"\x89PNG\r\n\x1a\n" + b"0" * 100
+        names = await asyncio.gather(*(storage.upload_content(png, prefix="media") for _ in range(3)))
+        assert len(set(names)) == 1 and names[0].startswith("media/") and names[0].endswith(".png")
+        assert storage.object_path(names[0]).read_bytes() == png
+        assert tmp_files(storage) == []
+
+    asyncio.run(main())
+
+
+def test_signed_urls(storage):
+    async def main():
+        url = await storage.get_file_url("notes/a b.jpg", expires=60)
+        parts = urlsplit(url)
+        assert parts.path == "/api/storage/notes/a%20b.jpg"
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        expires = int(query["expires"])
+        assert storage.verify("notes/a b.jpg", expires, query["signature"])
+        assert not storage.verify("notes/other.jpg", expires, query["signature"])
+        assert not storage.verify("notes/a b.jpg", expires + 1, query["signature"])
+        expired = int(time.time()) - 1
+        assert not storage.verify("notes/a b.jpg", expired, storage.signature("notes/a b.jpg", expired))
+
+    asyncio.run(main())
+
+
+def test_generated_secret_shared_between_instances(tmp_path):
+    root = str(tmp_path / "storage")
+    first, second = LocalStorage(root=root), LocalStorage(root=root)
+    assert first.signature("a", 1) == second.signature("a", 1)
+    assert (tmp_path / "storage" / ".secret").is_file()
+
+
+@pytest.fixture
+def client(storage, monkeypatch):
+    monkeypatch.setattr(router_module, "get_local_storage", lambda: storage)
+    monkeypatch.delenv("STORAGE_LOCAL_ACCEL_REDIRECT", raising=False)
+    monkeypatch.setenv("STORAGE_BACKEND", "local")
+    app = FastAPI()
+    app.include_router(router_module.router)
+    return TestClient(app)
+
+
+def test_route_serves_signed_object(storage, client, monkeypatch):
+    asyncio.run(storage.upload_bytes(b"image", "notes/a.jpg"))
+    url = asyncio.run(storage.get_file_url("notes/a.jpg", expires=60))
+    resp = client.get(url)
+    assert resp.status_code == 200 and resp.content == b"image"
+    assert resp.headers["Cache-Control"].startswith("private, max-age=")
+
+    monkeypatch.setenv("STORAGE_LOCAL_ACCEL_REDIRECT", "/protected/")
+    resp = client.get(url)
+    relative = storage.object_path("notes/a.jpg").relative_to(storage.root).as_posix()
+    assert resp.status_code == 200 and resp.content == b""
+    assert resp.headers["X-Accel-Redirect"] == f"/protected/{relative}"
+
+
+def test_route_rejects_bad_requests(storage, client):
+    expires = int(time.time()) + 60
+    good = storage.signature("notes/missing.jpg", expires)
+    base = "/api/storage/notes/missing.jpg"
+    assert client.get(base, params={"expires": expires, "signature": good}).status_code == 404
+    assert client.get(base, params={"expires": expires, "signature": "0" * 64}).status_code == 403
+    expired = int(time.time()) - 1
+    params = {"expires": expired, "signature": storage.signature("notes/missing.jpg", expired)}
+    assert client.get(base, params=params).status_code == 403
+    assert client.get("/api/storage/notes/a.jpg").status_code == 422
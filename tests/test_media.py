@@ -0,0 +1,84 @@
+"""
+MediaPipeline 感知哈希去重：并发的近重复图片只上传一次
+"""
+
+import asyncio
+
+from app.crawler.media import MediaPipeline
+from app.storage.phash import PerceptualIndex
+
+
+class FakeStorage:
+    def __init__(self, fail_first: bool = False) -> None:
+        self.uploaded = []
+        self.fail_first = fail_first
+
+    async def check_and_create_bucket(self) -> bool:
+        return True
+
+    async def upload_bytes(self, data, object_name, content_type=None):
+        await asyncio.sleep(0.02)
+        if self.fail_first:
+            self.fail_first = False
+            raise ConnectionError("upload failed")
+        self.uploaded.append(object_name)
+        return object_name
+
+
+class FakeProcessor:
+    variants = []
+
+    async def hash(self, data: bytes) -> int:
+        # 测试数据的前 8 字节即为“感知哈希”
+        return int.from_bytes(data[:8], "big")
+
+
+def make_pipeline(storage: FakeStorage) -> MediaPipeline:
+    return MediaPipeline(storage=storage, processor=FakeProcessor(), phash=PerceptualIndex(path="", distance=6))
+
+
+def image(value: int) -> bytes:
+    return value.to_bytes(8, "big") + b"payload"
+
+
+def test_concurrent_near_duplicates_upload_once():
+    async def main():
+        storage = FakeStorage()
+        pipeline = make_pipeline(storage)
+        results = await asyncio.gather(
+            pipeline._store_unique(image(0b1010), "notes/a/0", "image/jpeg"),
+            pipeline._store_unique(image(0b1011), "notes/b/0", "image/jpeg"),
+            pipeline._store_unique(image(0b1010), "notes/c/0", "image/jpeg"),
+            pipeline._store_unique(image(0xFFFF_FFFF_FFFF_0000), "notes/d/0", "image/jpeg"),
+        )
+        assert storage.uploaded == ["notes/a/0.jpg", "notes/d/0.jpg"]
+        assert results == [
+            ("notes/a/0.jpg", False),
+            ("notes/a/0.jpg", True),
+            ("notes/a/0.jpg", True),
+            ("notes/d/0.jpg", False),
+        ]
+        assert pipeline.stats["near_duplicates"] == 2
+        assert pipeline._phash_pending == {}
+
+        # 已登记到索引：之后的近重复直接引用
+        assert await pipeline._store_unique(image(0b1000), "notes/e/0", "image/jpeg") == ("notes/a/0.jpg", True)
+
+    asyncio.run(main())
+
+
+def test_waiter_uploads_when_first_upload_fails():
+    async def main():
+        storage = FakeStorage(fail_first=True)
+        pipeline = make_pipeline(storage)
+        first, second = await asyncio.gather(
+            pipeline._store_unique(image(7), "notes/a/0", "image/jpeg"),
+            pipeline._store_unique(image(7), "notes/b/0", "image/jpeg"),
+            return_exceptions=True,
+        )
+        assert isinstance(first, ConnectionError)
+        assert second == ("notes/b/0.jpg", False)
+        assert storage.uploaded == ["notes/b/0.jpg"]
+        assert pipeline._phash_pending == {}
+
+    asyncio.run(main())
@@ -0,0 +1,165 @@
+"""
+分片上传续传与孤儿上传清理（需本地 moto_server / MinIO，地址由 TEST_S3_ENDPOINT 指定，默认 127.0.0.1:5055）
+"""
+
+import asyncio
+import os
+import socket
+import uuid
+
+import pytest
+
+from app.storage.multipart import MIN_PART_SIZE, MultipartUploader
+from app.storage.s3 import S3Client, S3Error
+
+ENDPOINT = os.getenv("TEST_S3_ENDPOINT", "127.0.0.1:5055")
+
+
+def _reachable() -> bool:
+    host, _, port = ENDPOINT.partition(":")
+    try:
+        socket.create_connection((host, int(port or 80)), timeout=0.5).close()
+        return True
+    except OSError:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not _reachable(), reason=f"S3 endpoint {ENDPOINT} not reachable")
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "video.bin"
+    path.write_bytes(os.urandom(2 * MIN_PART_SIZE + 1024))
+    return path
+
+
+def run(test):
+    async def main():
+        client = S3Client(ENDPOINT, "testing", "testing")
+        bucket = f"test-{uuid.uuid4().hex[:12]}"
+        await client.make_bucket(bucket)
+        try:
+            await test(client, bucket)
+        finally:
+            await client.close()
+
+    asyncio.run(main())
+
+
+def test_resume_uploads_only_missing_parts(source, tmp_path, monkeypatch):
+    async def test(client, bucket):
+        uploader = MultipartUploader(client, bucket, part_size=MIN_PART_SIZE, retries=0, manifest_dir=str(tmp_path / "m"))
+        real_upload_part = client.upload_part
+        sent = []
+        failed = []
+
+        async def flaky(bucket_, key, upload_id, number, data):
+            sent.append(number)
+            if number == 2 and not failed:
+                # 其余分片完成后第 2 片失败
+                await asyncio.sleep(0.3)
+                failed.append(number)
+                raise S3Error("AccessDenied", "injected", status=403)
+            return await real_upload_part(bucket_, key, upload_id, number, data)
+
+        monkeypatch.setattr(client, "upload_part", flaky)
+        with pytest.raises(S3Error):
+            await uploader.upload_file(str(source), "v.bin")
+        assert len(list((tmp_path / "m").glob("*.json"))) == 1
+        uploads = await client.list_multipart_uploads(bucket)
+        assert [u["key"] for u in uploads] == ["v.bin"]
+
+        sent.clear()
+        await uploader.upload_file(str(source), "v.bin")
+        assert sent == [2]
+        assert await client.get_object(bucket, "v.bin") == source.read_bytes()
+        assert list((tmp_path / "m").glob("*.json")) == []
+        assert await client.list_multipart_uploads(bucket) == []
+
+    run(test)
+
+
+def test_changed_source_restarts_upload(source, tmp_path, monkeypatch):
+    async def test(client, bucket):
+        uploader = MultipartUploader(client, bucket, part_size=MIN_PART_SIZE, retries=0, manifest_dir=str(tmp_path / "m"))
+        real_upload_part = client.upload_part
+
+        async def fail_last(bucket_, key, upload_id, number, data):
+            if number == 3:
+                raise S3Error("AccessDenied", "injected", status=403)
+            return await real_upload_part(bucket_, key, upload_id, number, data)
+
+        monkeypatch.setattr(client, "upload_part", fail_last)
+        with pytest.raises(S3Error):
+            await uploader.upload_file(str(source), "v.bin")
+        old = (await client.list_multipart_uploads(bucket))[0]["upload_id"]
+
+        monkeypatch.setattr(client, "upload_part", real_upload_part)
+        source.write_bytes(os.urandom(MIN_PART_SIZE + 10))
+        await uploader.upload_file(str(source), "v.bin")
+        assert await client.get_object(bucket, "v.bin") == source.read_bytes()
+        assert old not in {u["upload_id"] for u in await client.list_multipart_uploads(bucket)}
+
+    run(test)
+
+
+def test_failure_without_manifest_aborts(source, monkeypatch):
+    async def test(client, bucket):
+        uploader = MultipartUploader(client, bucket, part_size=MIN_PART_SIZE, retries=0, manifest_dir="")
+
+        async def fail(*args):
+            raise S3Error("AccessDenied", "injected", status=403)
+
+        monkeypatch.setattr(client, "upload_part", fail)
+        with pytest.raises(S3Error):
+            await uploader.upload_file(str(source), "v.bin")
+        assert await client.list_multipart_uploads(bucket) == []
+
+    run(test)
+
+
+def test_abort_orphaned_keeps_referenced_uploads(tmp_path):
+    async def test(client, bucket):
+        uploader = MultipartUploader(client, bucket, manifest_dir=str(tmp_path / "m"), max_age=0.001)
+        kept = await client.create_multipart_upload(bucket, "kept.bin", "application/octet-stream")
+        uploader._write_manifest(
+            uploader._manifest_path("kept.bin"),
+            {"bucket": bucket, "object_name": "kept.bin", "upload_id": kept, "created_at": 1e12},
+        )
+        await client.create_multipart_upload(bucket, "orphan.bin", "application/octet-stream")
+        await asyncio.sleep(0.01)
+
+        assert await uploader.abort_orphaned() == 1
+        assert [u["upload_id"] for u in await client.list_multipart_uploads(bucket)] == [kept]
+
+    run(test)
+
+
+def test_bucket_check_sweeps_orphans(monkeypatch, tmp_path):
+    from app.storage.minio_client import AsyncMinioClient
+
+    bucket = f"test-{uuid.uuid4().hex[:12]}"
+    for name, value in {
+        "MINIO_ENDPOINT": ENDPOINT,
+        "MINIO_ACCESS_KEY": "testing",
+        "MINIO_SECRET_KEY": "testing",
+        "MINIO_BUCKET_NAME": bucket,
+        "MINIO_MULTIPART_DIR": str(tmp_path / "m"),
+        "MINIO_MULTIPART_MAX_AGE": "0.001",
+        "MINIO_INDEX_PATH": "",
+    }.items():
+        monkeypatch.setenv(name, value)
+
+    async def main():
+        storage = AsyncMinioClient()
+        try:
+            await storage.check_and_create_bucket()
+            await storage.client.create_multipart_upload(bucket, "orphan.bin", "application/octet-stream")
+            await asyncio.sleep(0.01)
+            await storage.check_and_create_bucket()
+            assert await storage.client.list_multipart_uploads(bucket) == []
+        finally:
+            await storage.close()
+
+    asyncio.run(main())
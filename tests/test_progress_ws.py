@@ -0,0 +1,77 @@
+"""
+WebSocket 进度推送：订阅、进度合并、任务结束关闭与断开清理
+"""
+
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.router import router
+from app.task.async_scheduler import InMemoryStore, TaskScheduler, get_scheduler
+
+
+def wait_unsubscribed(hub, timeout: float = 2.0) -> bool:
+    # 服务端在连接关闭后才退订，给它一点时间
+    deadline = time.monotonic() + timeout
+    while hub._subscribers and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return hub._subscribers == {}
+
+
+@pytest.fixture
+def scheduler():
+    return TaskScheduler(store=InMemoryStore())
+
+
+@pytest.fixture
+def client(scheduler):
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_scheduler] = lambda: scheduler
+    with TestClient(app) as client:
+        yield client
+
+
+def test_subscribe_receives_coalesced_progress(scheduler, client):
+    hub = scheduler.events
+    client.portal.call(scheduler.enqueue_keywords, ["kw"], 10)
+    with client.websocket_connect("/api/crawl/ws?keyword=kw") as ws:
+        assert ws.receive_json() == {"event": "status", "keyword": "kw", "status": "pending", "error": None}
+
+        def run_pages():
+            # 同一轮事件循环内连续发布：未送出的进度只保留最新一条
+            hub.publish("kw", {"event": "status", "status": "running"})
+            for page in range(1, 4):
+                hub.publish("kw", {"event": "progress", "pages": page, "notes": page * 10, "comments": page})
+
+        client.portal.call(run_pages)
+        assert ws.receive_json()["status"] == "running"
+        assert ws.receive_json() == {"event": "progress", "keyword": "kw", "pages": 3, "notes": 30, "comments": 3}
+
+        async def finish():
+            await scheduler.store.mark_done("kw", [])
+            hub.publish("kw", {"event": "status", "status": "success"})
+
+        client.portal.call(finish)
+        assert ws.receive_json()["status"] == "success"
+        # 指定关键词时任务结束后服务端关闭连接
+        assert ws.receive()["type"] == "websocket.close"
+    assert wait_unsubscribed(hub)
+
+
+def test_unknown_keyword_is_rejected(client):
+    with client.websocket_connect("/api/crawl/ws?keyword=missing") as ws:
+        assert ws.receive_json() == {"event": "error", "keyword": "missing", "error": "keyword not found"}
+        message = ws.receive()
+        assert message["type"] == "websocket.close" and message["code"] == 1008
+
+
+def test_client_disconnect_unsubscribes(scheduler, client):
+    hub = scheduler.events
+    client.portal.call(scheduler.enqueue_keywords, ["a"], 10)
+    with client.websocket_connect("/api/crawl/ws") as ws:
+        assert ws.receive_json()["keyword"] == "a"
+        assert None in hub._subscribers
+    assert wait_unsubscribed(hub)
@@ -0,0 +1,100 @@
+"""
+RecrawlScheduler：自适应间隔、令牌桶预算与状态持久化
+"""
+
+import asyncio
+
+import pytest
+
+from app.task import recrawl
+from app.task.async_scheduler import InMemoryStore, TaskScheduler
+from app.task.recrawl import FileRecrawlStateStore, RecrawlScheduler
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(recrawl.time, "monotonic", fake)
+    return fake
+
+
+def make_recrawler(**kwargs) -> RecrawlScheduler:
+    kwargs.setdefault("base_interval", 3600)
+    kwargs.setdefault("min_interval", 1000)
+    kwargs.setdefault("max_interval", 10000)
+    return RecrawlScheduler(scheduler=TaskScheduler(store=InMemoryStore()), **kwargs)
+
+
+def test_interval_speeds_up_and_backs_off():
+    recrawler = make_recrawler()
+    assert recrawler.adapt_interval("hot", 0.5) == 1800
+    # 下限截断
+    assert recrawler.adapt_interval("hot", 0.5) == 1000
+    assert recrawler.adapt_interval("cold", 0.0) == 5400
+    assert recrawler.adapt_interval("cold", 0.01) == 8100
+    # 上限截断
+    assert recrawler.adapt_interval("cold", 0.0) == 10000
+    # 变化率居中或未知时保持不变
+    assert recrawler.adapt_interval("mid", 0.1) == 3600
+    assert recrawler.adapt_interval("mid", None) == 3600
+
+
+def test_budget_interval_by_priority():
+    recrawler = make_recrawler(requests_per_hour=3600, max_interval=10**6)
+    cost = recrawler.estimate_cost()
+    # 两个关键词权重 1 和 3：低优先级分得 1/4 预算
+    assert recrawler.budget_interval(0, 4) == pytest.approx(cost / 900 * 3600)
+    assert recrawler.interval_for("kw", 0, 4) == pytest.approx(max(3600, cost / 900 * 3600))
+
+
+def test_budget_starts_empty_and_refills(clock):
+    recrawler = make_recrawler(requests_per_hour=3600)
+    # 启动时令牌桶为空，不会放出一整小时的突发
+    assert not recrawler._take_tokens(50)
+    clock.now += 49
+    assert not recrawler._take_tokens(50)
+    clock.now += 1
+    assert recrawler._take_tokens(50)
+    assert not recrawler._take_tokens(1)
+
+    # 补充量不超过桶容量（一小时预算）
+    clock.now += 10 * 3600
+    assert recrawler._take_tokens(3600)
+    assert not recrawler._take_tokens(1)
+
+
+def test_observe_uses_total_notes_without_snapshot():
+    recrawler = make_recrawler()
+    # 首次爬取：无法判断变化
+    assert recrawler.observe("a", {"n1", "n2"}, total_notes=0) == (None, 2)
+    assert recrawler.observe("a", {"n1", "n2", "n3", "n4"}, total_notes=2) == (0.5, 2)
+
+    # 状态丢失：库中已有 2 条，本轮 4 条中至少 2 条是新增
+    assert recrawler.observe("b", {"n1", "n2", "n3", "n4"}, total_notes=2) == (0.5, 2)
+    # 没有超出历史总数：不能判断为稳定
+    assert recrawler.observe("c", {"n1"}, total_notes=5) == (None, 0)
+
+
+def test_state_survives_restart(tmp_path):
+    async def main():
+        store = FileRecrawlStateStore(str(tmp_path))
+        first = make_recrawler(state_store=store)
+        first.observe("kw", {"n1", "n2"}, total_notes=0)
+        first.adapt_interval("kw", 0.0)
+        await first._save_state("kw")
+
+        second = make_recrawler(state_store=store)
+        await second.load_state()
+        assert second.interval_for("kw", 0, 1) == 5400
+        # 重启后仍以上一轮快照计算变化率
+        assert second.observe("kw", {"n1", "n2", "n3"}, total_notes=2) == (pytest.approx(1 / 3), 1)
+
+    asyncio.run(main())
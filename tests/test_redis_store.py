@@ -0,0 +1,250 @@
+"""
+RedisStore / RedisCheckpointStore（fakeredis）
+"""
+
+import asyncio
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+# 入队/领取/回收脚本需要 fakeredis 的 Lua 支持
+pytest.importorskip("lupa")
+
+from app.task import async_scheduler  # noqa: E402
+from app.task.async_scheduler import TaskScheduler  # noqa: E402
+from app.task.redis_store import RedisCheckpointStore, RedisRecrawlStateStore, RedisStore  # noqa: E402
+
+
+def make_store(server=None, **kwargs) -> RedisStore:
+    kwargs.setdefault("block_timeout", 0)
+    client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    return RedisStore(client=client, prefix="test:", **kwargs)
+
+
+def test_enqueue_and_claim():
+    async def main():
+        store = make_store()
+        created, skipped = await store.add_tasks(["a", "b", "c"], note_limit=10)
+        assert created == ["a", "b", "c"] and skipped == []
+        assert await store.count_pending() == 3
+
+        claimed = await store.get_pending(2)
+        # LPUSH 入队、RPOPLPUSH 领取：先进先出
+        assert [t["keyword"] for t in claimed] == ["a", "b"]
+        assert await store.count_pending() == 1
+        assert await store.client.zscore(store.k_leases, "a") is not None
+
+        await store.mark_running("a")
+        await store.mark_done("a", [{"note_id": "n1"}])
+        assert (await store.get_task("a"))["status"] == "success"
+        assert await store.get_result("a") == [{"note_id": "n1"}]
+        assert await store.client.zscore(store.k_leases, "a") is None
+        assert await store.client.lrange(store.k_processing, 0, -1) == ["b"]
+
+        await store.mark_failed("b", "boom")
+        task = await store.get_task("b")
+        assert task["status"] == "failed" and task["error"] == "boom"
+
+    asyncio.run(main())
+
+
+def test_dedup_inflight_keywords():
+    async def main():
+        store = make_store()
+        await store.add_tasks(["a"], note_limit=10)
+        created, skipped = await store.add_tasks(["a", "b"], note_limit=10)
+        assert created == ["b"] and skipped == ["a"]
+
+        # 处理中仍判重，完成后可以再次入队
+        await store.get_pending(1)
+        assert (await store.add_tasks(["a"], note_limit=10))[1] == ["a"]
+        await store.mark_done("a", [])
+        assert (await store.add_tasks(["a"], note_limit=10))[0] == ["a"]
+
+    asyncio.run(main())
+
+
+def test_requeue_after_lease_expiry():
+    async def main():
+        store = make_store(visibility_timeout=0.05)
+        await store.add_tasks(["a"], note_limit=10)
+        assert [t["keyword"] for t in await store.get_pending(1)] == ["a"]
+        await store.mark_running("a")
+        assert await store.get_pending(1) == []
+
+        # 节点失联：租约到期后被其他节点重新领取
+        await asyncio.sleep(0.1)
+        claimed = await store.get_pending(1)
+        assert [t["keyword"] for t in claimed] == ["a"]
+        assert claimed[0]["status"] == "pending"
+        assert await store.client.lrange(store.k_processing, 0, -1) == ["a"]
+
+    asyncio.run(main())
+
+
+def test_unleased_processing_entry_is_requeued():
+    async def main():
+        store = make_store()
+        await store.add_tasks(["a"], note_limit=10)
+        # 模拟旧版本在出队与加租约之间崩溃：关键词留在 processing 中且没有租约
+        await store.client.rpoplpush(store.k_pending, store.k_processing)
+        assert await store.get_pending(1) != []
+        assert await store.client.lrange(store.k_pending, 0, -1) == []
+        assert await store.client.zscore(store.k_leases, "a") is not None
+
+    asyncio.run(main())
+
+
+def test_blocking_claim_keeps_fifo_order():
+    async def main():
+        store = make_store(block_timeout=0.05)
+        assert await store.get_pending(1) == []
+        await store.add_tasks(["a", "b", "c"], note_limit=10)
+        assert [t["keyword"] for t in await store.get_pending(2)] == ["a", "b"]
+        assert [t["keyword"] for t in await store.get_pending(2)] == ["c"]
+
+    asyncio.run(main())
+
+
+class SlowCrawler:
+    runs = []
+
+    def __init__(self, media=None) -> None:
+        pass
+
+    async def crawl_keywords(self, keywords, per_keyword, checkpoints=None, on_checkpoint=None, on_event=None):
+        SlowCrawler.runs.append(keywords[0])
+        await asyncio.sleep(0.5)
+        return {keywords[0]: []}
+
+
+def test_queued_task_is_not_claimed_while_slots_are_busy(monkeypatch):
+    monkeypatch.setattr(async_scheduler, "AsyncXhsCrawler", SlowCrawler)
+    SlowCrawler.runs = []
+
+    async def main():
+        server = fakeredis.FakeServer()
+        node = make_store(server, visibility_timeout=0.2)
+        other = make_store(server, visibility_timeout=0.2)
+        await node.add_tasks(["a", "b"], note_limit=10)
+        scheduler = TaskScheduler(store=node, concurrency=1, poll_interval=0.01, heartbeat_interval=0.05)
+        await scheduler.start()
+
+        # 第一个任务执行时间超过可见性超时：第二个任务仍在队列中，没有可被其他节点回收的租约
+        await asyncio.sleep(0.35)
+        assert await other.requeue_expired() == []
+        assert await other.count_pending() == 1
+        assert SlowCrawler.runs == ["a"]
+
+        await asyncio.sleep(0.6)
+        assert await other.requeue_expired() == []
+        await scheduler.stop()
+        assert SlowCrawler.runs == ["a", "b"]
+        assert [(await node.get_task(kw))["status"] for kw in ("a", "b")] == ["success", "success"]
+
+    asyncio.run(main())
+
+
+def test_heartbeat_keeps_lease():
+    async def main():
+        store = make_store(visibility_timeout=0.2)
+        await store.add_tasks(["a"], note_limit=10)
+        await store.get_pending(1)
+        await asyncio.sleep(0.15)
+        await store.heartbeat("a")
+        await asyncio.sleep(0.1)
+        assert await store.requeue_expired() == []
+
+    asyncio.run(main())
+
+
+def test_result_ttl():
+    async def main():
+        store = make_store(result_ttl=1)
+        await store.add_tasks(["a"], note_limit=10)
+        await store.get_pending(1)
+        await store.mark_done("a", [{"note_id": "n1"}])
+        assert 0 < await store.client.ttl(store._result_key("a")) <= 1
+        assert 0 < await store.client.ttl(store._orders_key("a")) <= 1
+        assert (await store.get_result_orders("a"))["-liked"] == [0]
+        await asyncio.sleep(1.1)
+        assert await store.get_result("a") is None
+        assert await store.get_result_orders("a") is None
+
+        persistent = make_store(result_ttl=0)
+        await persistent.mark_done("b", [])
+        assert await persistent.client.ttl(persistent._result_key("b")) == -1
+
+    asyncio.run(main())
+
+
+def test_concurrent_updates_do_not_overwrite():
+    async def main():
+        store = make_store()
+        await store.add_tasks(["a"], note_limit=10)
+        await asyncio.gather(*(store._update_task("a", **{f"f{i}": i}) for i in range(20)))
+        task = await store.get_task("a")
+        assert all(task[f"f{i}"] == i for i in range(20))
+
+    asyncio.run(main())
+
+
+def test_version_bumps_on_update():
+    async def main():
+        store = make_store()
+        before = await store.get_version("a")
+        await store.add_tasks(["a"], note_limit=10)
+        after = await store.get_version("a")
+        assert before != after
+        assert await store.get_version() != before.split(".")[0] + ".0"
+
+    asyncio.run(main())
+
+
+def test_checkpoint_store_roundtrip():
+    async def main():
+        checkpoints = RedisCheckpointStore(fakeredis.FakeAsyncRedis(decode_responses=True), prefix="test:")
+        await checkpoints.save("a", 10, {"page": 3})
+        saved = await checkpoints.load("a")
+        assert saved["state"] == {"page": 3} and saved["note_limit"] == 10
+        assert saved["updated_at"] <= time.time()
+        assert [c["keyword"] for c in await checkpoints.list_all()] == ["a"]
+        await checkpoints.clear("a")
+        assert await checkpoints.load("a") is None
+
+    asyncio.run(main())
+
+
+def test_checkpoint_ttl_and_attempt_limit():
+    async def main():
+        client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        checkpoints = RedisCheckpointStore(client, prefix="test:", max_age=600, max_attempts=2)
+        await checkpoints.save("a", 10, {"page": 3})
+        assert 0 < await client.ttl("test:checkpoint:a") <= 600
+
+        # 失败计数不延长 TTL，达到上限后断点被丢弃
+        await client.expire("test:checkpoint:a", 100)
+        assert await checkpoints.record_failure("a") == 1
+        assert 0 < await client.ttl("test:checkpoint:a") <= 100
+        assert (await checkpoints.load("a"))["attempts"] == 1
+        assert await checkpoints.record_failure("a") == 2
+        assert await checkpoints.list_all() == []
+        assert not await client.exists("test:checkpoint:a")
+
+        # 键因 TTL 过期后索引中的残留被清理
+        await checkpoints.save("b", 10, {"page": 2})
+        await client.delete("test:checkpoint:b")
+        assert await checkpoints.list_all() == []
+        assert await client.smembers("test:checkpoint_keys") == set()
+
+    asyncio.run(main())
+
+
+def test_recrawl_state_store_roundtrip():
+    async def main():
+        states = RedisRecrawlStateStore(fakeredis.FakeAsyncRedis(decode_responses=True), prefix="test:")
+        await states.save("a", {"interval": 5400.0, "note_ids": ["n1", "n2"]})
+        assert await states.list_all() == {"a": {"interval": 5400.0, "note_ids": ["n1", "n2"]}}
+
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""
+GET /api/crawl/result 分页、投影与排序
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.router import router
+from app.services.results import DEFAULT_PAGE_SIZE, build_sort_orders, query_notes
+from app.task.async_scheduler import InMemoryStore, TaskScheduler, get_scheduler
+
+NOTES = [
+    {"note_id": f"n{i}", "title": f"t{i}", "liked": liked, "comments": [{"c": i}]}
+    for i, liked in enumerate([5, None, 9, 1, 9, 3])
+]
+
+
+@pytest.fixture
+def client():
+    scheduler = TaskScheduler(store=InMemoryStore())
+
+    async def seed():
+        await scheduler.store.add_tasks(["kw"], 10)
+        await scheduler.store.mark_done("kw", NOTES)
+        await scheduler.store.add_tasks(["big"], 50)
+        await scheduler.store.mark_done("big", [{"note_id": f"b{i}"} for i in range(45)])
+
+    asyncio.run(seed())
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_scheduler] = lambda: scheduler
+    return TestClient(app)
+
+
+def test_default_page_size_and_explicit_full_list(client):
+    data = client.get("/api/crawl/result", params={"keyword": "big"}).json()["data"]
+    assert len(data["notes"]) == DEFAULT_PAGE_SIZE
+    assert data["next_cursor"] == str(DEFAULT_PAGE_SIZE) and data["total"] == 45
+
+    # limit=0 显式取全部笔记
+    data = client.get("/api/crawl/result", params={"keyword": "big", "limit": 0}).json()["data"]
+    assert [n["note_id"] for n in data["notes"]] == [f"b{i}" for i in range(45)]
+    assert data["next_cursor"] is None
+
+
+def test_cursor_pagination(client):
+    seen, cursor = [], None
+    while True:
+        params = {"keyword": "kw", "limit": 4}
+        if cursor:
+            params["cursor"] = cursor
+        data = client.get("/api/crawl/result", params=params).json()["data"]
+        seen += [n["note_id"] for n in data["notes"]]
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [n["note_id"] for n in NOTES]
+
+
+def test_sort_and_projection(client):
+    params = {"keyword": "kw", "sort": "-liked", "fields": "liked", "limit": 3}
+    data = client.get("/api/crawl/result", params=params).json()["data"]
+    assert data["notes"] == [
+        {"note_id": "n2", "liked": 9},
+        {"note_id": "n4", "liked": 9},
+        {"note_id": "n0", "liked": 5},
+    ]
+    data = client.get("/api/crawl/result", params={**params, "cursor": data["next_cursor"]}).json()["data"]
+    # 缺失值排在最后
+    assert [n["note_id"] for n in data["notes"]] == ["n5", "n3", "n1"]
+
+
+@pytest.mark.parametrize("params", [{"sort": "title"}, {"fields": "nope"}, {"cursor": "-1"}])
+def test_invalid_parameters(client, params):
+    assert client.get("/api/crawl/result", params={"keyword": "kw", **params}).status_code == 400
+
+
+def test_unknown_keyword(client):
+    assert client.get("/api/crawl/result", params={"keyword": "missing"}).status_code == 404
+
+
+def test_precomputed_orders_match_inline_sort():
+    notes = NOTES + [
+        {"note_id": "d1", "publish_time": datetime(2024, 1, 2, tzinfo=timezone.utc)},
+        {"note_id": "d2", "publish_time": datetime(2024, 1, 1)},
+    ]
+    orders = build_sort_orders(notes)
+    for sort in ("liked", "-liked", "publish_time", "-publish_time", "-collected"):
+        assert query_notes(notes, sort=sort, orders=orders) == query_notes(notes, sort=sort)
+
+
+def test_page_uses_stored_orders():
+    # 传入的下标序列即为分页依据，不再现场排序
+    page = query_notes(NOTES, limit=2, sort="liked", orders={"liked": [5, 4, 3, 2, 1, 0]})
+    assert [n["note_id"] for n in page["notes"]] == ["n5", "n4"] and page["next_cursor"] == "2"
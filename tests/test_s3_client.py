@@ -0,0 +1,128 @@
+"""
+S3Client 请求重试与载荷摘要：幂等请求遇到 5xx/SlowDown/连接中断时退避重试
+"""
+
+import asyncio
+import hashlib
+
+import pytest
+from aiohttp import web
+
+from app.storage import s3
+from app.storage.s3 import S3Client, S3Error
+
+SLOW_DOWN = b"<Error><Code>SlowDown</Code><Message>Please reduce your request rate.</Message></Error>"
+
+
+class Server:
+    """按脚本返回的 S3 服务端：failures 为依次返回的失败（状态码与响应体，或 "reset" 表示断开连接）"""
+
+    def __init__(self) -> None:
+        self.failures = []
+        self.requests = []
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.read()
+        self.requests.append((request.method, request.headers.get("x-amz-content-sha256"), body))
+        if self.failures:
+            failure = self.failures.pop(0)
+            if failure == "reset":
+                request.transport.close()
+                return web.Response()
+            return web.Response(status=failure[0], body=failure[1])
+        return web.Response(status=200, headers={"ETag": '"e1"'}, body=b"<ok/>")
+
+
+def serve(test):
+    async def main():
+        server = Server()
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", server.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        client = S3Client(f"127.0.0.1:{port}", "key", "secret", retry_backoff=0.01)
+        try:
+            await test(server, client)
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def test_idempotent_request_retries_transient_errors():
+    async def test(server, client):
+        server.failures = [(503, SLOW_DOWN), (500, b""), "reset"]
+        assert await client.put_object("b", "k", b"data") == "e1"
+        assert len(server.requests) == 4
+        assert all(body == b"data" for _, _, body in server.requests)
+
+    serve(test)
+
+
+def test_retries_are_bounded():
+    async def test(server, client):
+        server.failures = [(503, SLOW_DOWN)] * 10
+        with pytest.raises(S3Error) as excinfo:
+            await client.get_object("b", "k")
+        assert excinfo.value.code == "SlowDown"
+        assert len(server.requests) == client.max_retries + 1
+
+    serve(test)
+
+
+def test_client_errors_and_non_idempotent_requests_not_retried():
+    async def test(server, client):
+        server.failures = [(403, b"<Error><Code>AccessDenied</Code></Error>")]
+        with pytest.raises(S3Error):
+            await client.get_object("b", "k")
+        assert len(server.requests) == 1
+
+        # 重复创建分片上传会留下孤儿上传
+        server.failures = [(503, SLOW_DOWN)]
+        with pytest.raises(S3Error):
+            await client.create_multipart_upload("b", "k")
+        assert len(server.requests) == 2
+
+    serve(test)
+
+
+def test_streaming_body_not_retried():
+    async def chunks():
+        yield b"da"
+        yield b"ta"
+
+    async def test(server, client):
+        server.failures = [(503, SLOW_DOWN)]
+        with pytest.raises(S3Error):
+            await client.put_object("b", "k", chunks(), length=4)
+        assert len(server.requests) == 1
+
+    serve(test)
+
+
+def test_large_payload_hashed_off_loop(monkeypatch):
+    offloaded = []
+    to_thread = asyncio.to_thread
+
+    async def spy(func, *args):
+        offloaded.append(func)
+        return await to_thread(func, *args)
+
+    monkeypatch.setattr(s3.asyncio, "to_thread", spy)
+    small, large = b"x" * 10, b"y" * s3.HASH_IN_THREAD_BYTES
+
+    async def test(server, client):
+        await client.put_object("b", "small", small)
+        assert offloaded == []
+        await client.put_object("b", "large", large)
+        assert offloaded == [hashlib.sha256]
+        assert [sha for _, sha, _ in server.requests] == [
+            hashlib.sha256(small).hexdigest(),
+            hashlib.sha256(large).hexdigest(),
+        ]
+
+    serve(test)
@@ -0,0 +1,275 @@
+"""
+WriteBackStorage：刷写、失败重试、重启续刷、LRU 淘汰与内容寻址去重
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import router as router_module
+from app.storage.local import LocalStorage
+from app.storage.writeback import WriteBackStorage
+
+
+class FakeRemote:
+    """内存中的远端存储，available=False 时模拟 MinIO 不可用"""
+
+    def __init__(self, content_addressed: bool = False) -> None:
+        self.content_addressed = content_addressed
+        self.objects = {}
+        self.uploads = []
+        self.available = True
+        self.delay = 0.0
+
+    async def check_and_create_bucket(self) -> bool:
+        if not self.available:
+            raise ConnectionError("remote down")
+        return True
+
+    async def upload_file(self, file_path, object_name=None, content_type=None):
+        if not self.available:
+            raise ConnectionError("remote down")
+        with open(file_path, "rb") as f:
+            data = f.read()
+        await asyncio.sleep(self.delay)
+        self.objects[object_name] = data
+        self.uploads.append(object_name)
+        return object_name
+
+    async def object_exists(self, object_name):
+        return object_name in self.objects
+
+    async def get_file_url(self, object_name, expires=60):
+        return f"http://remote/{object_name}"
+
+    async def get_file_urls(self, object_names, expires=60):
+        return {name: f"http://remote/{name}" for name in object_names}
+
+    async def close(self):
+        pass
+
+
+def make_storage(tmp_path, remote, **kwargs) -> WriteBackStorage:
+    local = LocalStorage(root=str(tmp_path / "local"), base_url="http://testserver", secret="s3cret")
+    kwargs.setdefault("journal_path", str(tmp_path / "journal.db"))
+    return WriteBackStorage(remote=remote, local=local, **kwargs)
+
+
+def test_write_then_flush(tmp_path):
+    async def main():
+        remote = FakeRemote()
+        storage = make_storage(tmp_path, remote)
+        await storage.upload_bytes(b"a" * 10, "notes/a.jpg")
+        assert storage.local.object_path("notes/a.jpg").read_bytes() == b"a" * 10
+        await storage.flush()
+        assert remote.objects == {"notes/a.jpg": b"a" * 10}
+        assert storage.report()["dirty"] == 0 and storage.report()["cached"] == 1
+        # 本地层中的对象返回本地签名地址
+        assert (await storage.get_file_url("notes/a.jpg")).startswith("http://testserver/api/storage/")
+        await storage.close()
+
+    asyncio.run(main())
+
+
+def test_remote_outage_keeps_dirty_and_resumes_after_restart(tmp_path):
+    async def main():
+        remote = FakeRemote()
+        remote.available = False
+        storage = make_storage(tmp_path, remote)
+        await storage.upload_bytes(b"data", "notes/a.jpg")
+        assert await storage.flush() == 0
+        assert storage._dirty["notes/a.jpg"]["attempts"] >= 1
+        assert storage.stats["flush_failures"] >= 1
+        await storage.close(timeout=0.1)
+        assert remote.objects == {}
+
+        # 重启：从日志继续刷写
+        remote.available = True
+        restarted = make_storage(tmp_path, remote)
+        await restarted.flush()
+        assert remote.objects == {"notes/a.jpg": b"data"}
+        assert restarted.report()["dirty"] == 0
+        await restarted.close()
+
+    asyncio.run(main())
+
+
+def test_rewrite_during_flush_is_not_lost(tmp_path):
+    async def main():
+        remote = FakeRemote()
+        remote.delay = 0.05
+        storage = make_storage(tmp_path, remote)
+        await storage.upload_bytes(b"v1", "notes/a.jpg")
+        flushing = asyncio.ensure_future(storage.flush())
+        await asyncio.sleep(0.02)
+        await storage.upload_bytes(b"v2", "notes/a.jpg")
+        await flushing
+        # 旧版本的刷写结果不会把新版本标记为已同步，新版本随后被刷写
+        await storage.flush()
+        assert remote.objects["notes/a.jpg"] == b"v2"
+        assert storage.report()["dirty"] == 0
+        await storage.close()
+
+    asyncio.run(main())
+
+
+def test_lru_eviction_only_removes_flushed_objects(tmp_path):
+    async def main():
+        remote = FakeRemote()
+        remote.available = False
+        storage = make_storage(tmp_path, remote, max_bytes=25)
+        for name in ("a", "b", "c"):
+            await storage.upload_bytes(b"x" * 10, f"notes/{name}.jpg")
+        # 未同步的对象即使超出预算也不淘汰
+        assert all(storage.local.object_path(f"notes/{n}.jpg").is_file() for n in "abc")
+
+        remote.available = True
+        await storage.flush()
+        assert storage.stats["evicted"] == 1
+        assert storage.report()["cached_bytes"] <= 25
+        evicted = [n for n in "abc" if not storage.local.object_path(f"notes/{n}.jpg").is_file()]
+        assert len(evicted) == 1
+        name = f"notes/{evicted[0]}.jpg"
+        assert await storage.get_file_url(name) == f"http://remote/{name}"
+        assert await storage.object_exists(name)
+        await storage.close()
+
+    asyncio.run(main())
+
+
+def test_content_addressed_reupload_after_eviction_is_not_flushed(tmp_path):
+    async def main():
+        remote = FakeRemote(content_addressed=True)
+        storage = make_storage(tmp_path, remote, max_bytes=15)
+        first = await storage.upload_content(b"A" * 10, prefix="media")
+        await storage.flush()
+        await storage.upload_content(b"B" * 10, prefix="media")
+        await storage.flush()
+        assert first not in storage._clean
+
+        again = await storage.upload_content(b"A" * 10, prefix="media")
+        assert again == first
+        assert first not in storage._dirty
+        await storage.flush()
+        assert remote.uploads.count(first) == 1
+        await storage.close()
+
+    asyncio.run(main())
+
+
+def journal_rows(storage):
+    return storage._connect().execute("SELECT object_name, dirty FROM objects ORDER BY object_name").fetchall()
+
+
+def test_journal_written_before_local_publish(tmp_path):
+    async def main():
+        storage = make_storage(tmp_path, FakeRemote())
+        write = storage.local.upload_bytes
+        seen = []
+
+        async def checked_write(data, object_name, content_type=None):
+            # 落盘前日志中已有脏对象行：落盘后崩溃也会在重启时刷写
+            seen.append(journal_rows(storage))
+            return await write(data, object_name, content_type)
+
+        storage.local.upload_bytes = checked_write
+        await storage.upload_bytes(b"data", "notes/a.jpg")
+        assert seen == [[("notes/a.jpg", 1)]]
+        await storage.close(timeout=0.1)
+
+    asyncio.run(main())
+
+
+def test_journal_failure_fails_upload(tmp_path):
+    async def main():
+        storage = make_storage(tmp_path, FakeRemote())
+
+        def broken(sql, params):
+            raise sqlite3.OperationalError("disk I/O error")
+
+        storage._journal = broken
+        with pytest.raises(sqlite3.OperationalError):
+            await storage.upload_bytes(b"data", "notes/a.jpg")
+        assert not storage.local.object_path("notes/a.jpg").exists()
+        assert storage.report()["dirty"] == 0
+        await storage.close(timeout=0.1)
+
+    asyncio.run(main())
+
+
+def test_failed_local_write_reverts_journal(tmp_path):
+    async def main():
+        remote = FakeRemote()
+        remote.available = False
+        storage = make_storage(tmp_path, remote)
+        await storage.upload_bytes(b"v1", "notes/a.jpg")
+
+        async def broken(*args, **kwargs):
+            raise OSError("disk full")
+
+        storage.local.upload_bytes = broken
+        with pytest.raises(OSError):
+            await storage.upload_bytes(b"v2", "notes/b.jpg")
+        with pytest.raises(OSError):
+            await storage.upload_bytes(b"v2", "notes/a.jpg")
+        # 新对象的日志行被删除，已有对象恢复为旧版本的行
+        assert journal_rows(storage) == [("notes/a.jpg", 1)]
+        assert storage._connect().execute("SELECT generation FROM objects").fetchone()[0] == (
+            storage._dirty["notes/a.jpg"]["generation"]
+        )
+        await storage.close(timeout=0.1)
+
+    asyncio.run(main())
+
+
+def test_restart_drops_unpublished_journal_rows(tmp_path):
+    async def main():
+        remote = FakeRemote()
+        remote.available = False
+        storage = make_storage(tmp_path, remote)
+        await storage.upload_bytes(b"data", "notes/a.jpg")
+        # 模拟写日志后、落盘前崩溃
+        await storage._journal_dirty("notes/b.jpg", 4, None)
+        await storage.close(timeout=0.1)
+
+        remote.available = True
+        restarted = make_storage(tmp_path, remote)
+        await restarted.flush()
+        assert remote.objects == {"notes/a.jpg": b"data"}
+        assert journal_rows(restarted) == [("notes/a.jpg", 0)]
+        await restarted.close()
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def route_client(tmp_path, monkeypatch):
+    remote = FakeRemote()
+    storage = make_storage(tmp_path, remote, max_bytes=5)
+    monkeypatch.setenv("STORAGE_BACKEND", "writeback")
+    monkeypatch.delenv("STORAGE_LOCAL_ACCEL_REDIRECT", raising=False)
+    monkeypatch.setattr(router_module, "get_local_storage", lambda: storage.local)
+    monkeypatch.setattr(router_module, "get_storage", lambda: storage)
+    app = FastAPI()
+    app.include_router(router_module.router)
+    return storage, TestClient(app)
+
+
+def test_route_redirects_evicted_object_to_remote(route_client):
+    storage, client = route_client
+
+    async def write():
+        await storage.upload_bytes(b"x" * 10, "notes/a.jpg")
+        url = await storage.get_file_url("notes/a.jpg")
+        await storage.flush()
+        await storage.close()
+        return url
+
+    url = asyncio.run(write())
+    assert not storage.local.object_path("notes/a.jpg").exists()
+    resp = client.get(url, follow_redirects=False)
+    assert resp.status_code == 307
+    assert resp.headers["location"] == "http://remote/notes/a.jpg"